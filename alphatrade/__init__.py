@@ -1,7 +1,16 @@
 from __future__ import unicode_literals, absolute_import
 
 from .alphatrade import AlphaTrade, TransactionType, OrderType, ProductType, LiveFeedType, Instrument
+from .aio import AsyncAlphaTrade
+from .bars import BarBuilder
+from .depth import DepthBook
+from .dispatch import OverflowPolicy
+from .reconnect import ConnectionState, ReconnectPolicy
+from .sharding import ShardedFeed
+from .shm import TickPublisher, TickSubscriber
 from alphatrade import exceptions
 
 __all__ = ['AlphaTrade', 'TransactionType', 'OrderType',
-           'ProductType', 'LiveFeedType', 'Instrument', 'exceptions']
+           'ProductType', 'LiveFeedType', 'Instrument', 'OverflowPolicy',
+           'AsyncAlphaTrade', 'BarBuilder', 'DepthBook', 'ConnectionState', 'ReconnectPolicy',
+           'ShardedFeed', 'TickPublisher', 'TickSubscriber', 'exceptions']
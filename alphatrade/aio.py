@@ -0,0 +1,224 @@
+# -*- coding: utf-8 -*-
+"""
+    aio.py
+
+    asyncio live feed. Uses the session of a logged in `AlphaTrade` object,
+    the same frame decoding and the same subscription messages, but reads the
+    websocket, sends heartbeats and reconnects as tasks on the running event
+    loop instead of threads.
+
+    Needs the `websockets` package, `pip install alphatrade[asyncio]`.
+
+    :license: see LICENSE for details.
+"""
+import asyncio
+import json
+import logging
+
+from alphatrade.alphatrade import LIVE_FEED_MODES
+from alphatrade.decoder import TICK_MODES
+from alphatrade.reconnect import ReconnectPolicy
+from alphatrade.subscriptions import SubscriptionManager
+from alphatrade.ticks import Tick
+
+try:
+    import websockets
+except ImportError:  # pragma: no cover - optional dependency
+    websockets = None
+
+logger = logging.getLogger(__name__)
+
+_HEARTBEAT = json.dumps({"a": "h", "v": [], "m": ""})
+
+
+class AsyncAlphaTrade(object):
+    """ asyncio live feed of an `AlphaTrade` object
+
+        async with AsyncAlphaTrade(sas) as feed:
+            await feed.subscribe(instrument, LiveFeedType.COMPACT)
+            async for tick in feed.ticks():
+                print(tick.ltp)
+
+        Reconnects back off as set by `reconnect_policy` (ReconnectPolicy),
+        once it gives up the tick iterator ends. Subscriptions are sent in
+        messages of at most `subscription_chunk_size` tokens,
+        `subscription_pace` seconds apart
+    """
+
+    def __init__(self, alpha_trade, heartbeat_interval=5, reconnect_policy=None, max_queue=10000,
+                 subscription_chunk_size=500, subscription_pace=0.01):
+        if websockets is None:
+            raise ImportError(
+                "AsyncAlphaTrade needs the websockets package, pip install websockets")
+        self.__alpha_trade = alpha_trade
+        self.__heartbeat_interval = heartbeat_interval
+        self.__reconnect_policy = reconnect_policy if reconnect_policy is not None else ReconnectPolicy()
+        self.__max_queue = max_queue
+        self.__subscriptions = SubscriptionManager(subscription_chunk_size, subscription_pace)
+        self.__send_lock = None
+        self.__websocket = None
+        self.__connected = None
+        self.__ticks = None
+        self.__run_task = None
+        self.__closed = False
+
+    @property
+    def connected(self):
+        return self.__connected is not None and self.__connected.is_set()
+
+    async def connect(self, timeout=None):
+        """ start the feed and wait till the websocket is open. Raises
+            asyncio.TimeoutError when it is not open after timeout seconds and
+            ConnectionError when the reconnect policy gave up, the feed is
+            closed then
+        """
+        if self.__run_task is None or self.__run_task.done():
+            self.__closed = False
+            self.__reconnect_policy.reset()
+            self.__connected = asyncio.Event()
+            self.__send_lock = asyncio.Lock()
+            self.__ticks = asyncio.Queue(self.__max_queue)
+            self.__run_task = asyncio.ensure_future(self.__run())
+        if self.__connected.is_set():
+            return
+        waiter = asyncio.ensure_future(self.__connected.wait())
+        try:
+            await asyncio.wait((waiter, self.__run_task), timeout=timeout,
+                               return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            waiter.cancel()
+        if self.__connected.is_set():
+            return
+        gave_up = self.__run_task.done()
+        await self.close()
+        if gave_up:
+            raise ConnectionError(
+                f"websocket not connected after {self.__reconnect_policy.attempt} attempts")
+        raise asyncio.TimeoutError(f"websocket not connected within {timeout} seconds")
+
+    async def close(self):
+        """ stop reconnecting and close the websocket """
+        self.__closed = True
+        if self.__websocket is not None:
+            await self.__websocket.close()
+        if self.__run_task is not None:
+            # the run task ends by itself once the socket is closed, unless
+            # it is sleeping before a reconnect
+            self.__run_task.cancel()
+            try:
+                await self.__run_task
+            except asyncio.CancelledError:
+                pass
+            self.__run_task = None
+        self.__end_ticks()
+
+    def __end_ticks(self):
+        if self.__ticks is not None:
+            # wake up consumers waiting in ticks(), making room if needed
+            if self.__ticks.full():
+                self.__ticks.get_nowait()
+            self.__ticks.put_nowait(None)
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def __sync_subscriptions(self, ws):
+        # sends the difference to what this connection has, chunked and paced
+        async with self.__send_lock:
+            pace = self.__subscriptions.pace
+            for i, data in enumerate(self.__subscriptions.delta()):
+                if i and pace:
+                    await asyncio.sleep(pace)
+                await ws.send(data)
+
+    async def subscribe(self, instrument, live_feed_type):
+        """ subscribe to the current feed of an instrument """
+        mode, entries = self.__alpha_trade.subscription_entries(instrument, live_feed_type)
+        self.__subscriptions.add(mode, entries)
+        # while disconnected the subscriptions are sent on reconnect
+        ws = self.__websocket
+        if self.connected and ws is not None:
+            await self.__sync_subscriptions(ws)
+
+    async def unsubscribe(self, instrument, live_feed_type):
+        """ unsubscribe to the current feed of an instrument """
+        mode, entries = self.__alpha_trade.subscription_entries(instrument, live_feed_type)
+        self.__alpha_trade.forget_tokens(self.__subscriptions.remove(mode, entries))
+        ws = self.__websocket
+        if self.connected and ws is not None:
+            await self.__sync_subscriptions(ws)
+
+    def get_all_subscriptions(self):
+        """ get the all subscribed instruments """
+        desired = self.__subscriptions.desired()
+        subscribers = {}
+        for live_feed_type, mode in LIVE_FEED_MODES.items():
+            for _instrument in desired.get(mode, {}).values():
+                subscribers[_instrument] = live_feed_type
+        return subscribers
+
+    async def ticks(self):
+        """ async iterator over decoded market data ticks (TICK_MODES), ends
+            when the feed is closed. DPR and open interest records are left out
+        """
+        while True:
+            tick = await self.__ticks.get()
+            if tick is None:
+                return
+            yield tick
+
+    async def __heartbeat(self, ws):
+        while True:
+            await asyncio.sleep(self.__heartbeat_interval)
+            await ws.ping(_HEARTBEAT)
+
+    async def __receive(self, ws):
+        process = self.__alpha_trade.process_frame
+        async for message in ws:
+            if isinstance(message, str):
+                continue
+            _, res = process(message)
+            if isinstance(res, Tick) and res.mode in TICK_MODES:
+                await self.__ticks.put(res)
+
+    async def __run(self):
+        loop = asyncio.get_running_loop()
+        while not self.__closed:
+            heartbeat = None
+            connected_at = None
+            try:
+                async with websockets.connect(self.__alpha_trade.websocket_url(),
+                                              ping_interval=None) as ws:
+                    self.__websocket = ws
+                    connected_at = loop.time()
+                    # a new connection has no subscriptions, send them all
+                    self.__subscriptions.reset()
+                    self.__connected.set()
+                    await self.__sync_subscriptions(ws)
+                    heartbeat = asyncio.ensure_future(self.__heartbeat(ws))
+                    await self.__receive(ws)
+            except asyncio.CancelledError:
+                raise
+            except Exception as exp:
+                logger.warning(f"async websocket ended in exception, {exp}")
+            finally:
+                self.__connected.clear()
+                self.__websocket = None
+                if heartbeat is not None:
+                    heartbeat.cancel()
+            if self.__closed:
+                return
+            if connected_at is not None:
+                self.__reconnect_policy.connection_lost(loop.time() - connected_at)
+            delay = self.__reconnect_policy.next_delay()
+            if delay is None:
+                logger.error(f"async websocket not reconnected after "
+                             f"{self.__reconnect_policy.attempt} attempts")
+                self.__closed = True
+                self.__end_ticks()
+                return
+            await asyncio.sleep(delay)
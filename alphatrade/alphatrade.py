@@ -1,23 +1,52 @@
-from collections import namedtuple, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from protlib import CUInt, CStruct, CULong, CUChar, CArray, CUShort, CString
 
+from alphatrade.bars import INTERVAL_SECONDS
+from alphatrade.batch import TickBatcher
+from alphatrade.contracts import DEFAULT_CONTRACT_CACHE, ContractCache, stream_contract_rows
+from alphatrade.dispatch import OverflowPolicy, TickDispatcher
+from alphatrade.decoder import WsFrameMode, TICK_MODES, decode_frame
+from alphatrade.depth import DEPTH_MODES, DepthBook
+from alphatrade.instruments import Instrument, InstrumentTable
+from alphatrade.messages import MessageStore
+from alphatrade.quotes import QuoteStore
+from alphatrade.reconnect import ConnectionEvent, ConnectionState, GapTracker, ReconnectPolicy
+from alphatrade.recorder import FrameRecorder, FrameReplayer
+from alphatrade.sender import WebSocketSender
+from alphatrade.shm import TickPublisher
+from alphatrade.stats import FeedStats
+from alphatrade.subscriptions import SubscriptionManager
+from alphatrade.ticks import (EXCHANGE_CODES, EXCHANGE_NAMES, EXCHANGE_PRICE_MULTIPLIERS, Tick,
+                              decode_integer_tick, decode_tick)
 import alphatrade.exceptions as ex
 import enum
 import logging
+import numbers
+import os
 import json
 import pandas as pd
 import pyotp
 import pytz
-from time import sleep
+import queue
+import time
+from time import perf_counter, sleep
 import requests
+import sqlite3
 import threading
 import websocket
 
-Instrument = namedtuple('Instrument', ['exchange', 'token', 'symbol',
-                                       'name', 'expiry', 'lot_size'])
 logger = logging.getLogger(__name__)
 
+# contracts.json is read in chunks of this many bytes while it downloads,
+# exchanges not in the cache are downloaded by up to this many threads
+CONTRACTS_CHUNK_SIZE = 64 * 1024
+CONTRACTS_DOWNLOAD_THREADS = 6
+# exchanges with a contracts.json, loaded the first time they are used, and
+# how many seconds a failed load is not tried again on demand
+MASTER_CONTRACT_EXCHANGES = ('NSE', 'NFO', 'CDS', 'BSE', 'BFO', 'MCX')
+CONTRACTS_RETRY_INTERVAL = 60
+
 
 class Requests(enum.Enum):
     """ Enum for all requests """
@@ -53,19 +82,15 @@ class LiveFeedType(enum.Enum):
     FULL_SNAPQUOTE = 4
 
 
-class WsFrameMode(enum.IntEnum):
-    MARKETDATA = 1
-    COMPACT_MARKETDATA = 2
-    SNAPQUOTE = 3
-    FULL_SNAPQUOTE = 4
-    SPREADDATA = 5
-    SPREAD_SNAPQUOTE = 6
-    DPR = 7
-    OI = 8
-    MARKET_STATUS = 9
-    EXCHANGE_MESSAGES = 10
+# mode names used by the websocket protocol
+LIVE_FEED_MODES = {LiveFeedType.MARKET_DATA: 'marketdata',
+                   LiveFeedType.COMPACT: 'compact_marketdata',
+                   LiveFeedType.SNAPQUOTE: 'snapquote',
+                   LiveFeedType.FULL_SNAPQUOTE: 'full_snapquote'}
 
 
+# protlib definitions of the feed frames, `alphatrade.decoder` holds the
+# equivalent precompiled layouts which are used for decoding
 class MarketData(CStruct):
     exchange = CUChar()
     token = CUInt()
@@ -190,9 +215,12 @@ class AlphaTrade(object):
             'contract': '/api/v1/contract/{exchange}',
             'search': '/api/v1/search?key={symbol}',
             'positions': '/api/v1/positions?type={position_type}',
+            'charts': '/api/v1/charts',
+            'charts_tdv': '/api/v1/charts/tdv',
         },
         # 'socket_endpoint': 'wss://alpha.sasonline.in/socket/websocket?token={access_token}&login_id={login_id}'
-        'socket_endpoint': 'wss://alpha.sasonline.in/hydrasocket/v2/websocket?access_token={access_token}'
+        'socket_endpoint': 'wss://alpha.sasonline.in/hydrasocket/v2/websocket?access_token={access_token}',
+        'socket_path': '/hydrasocket/v2/websocket?access_token={access_token}'
     }
 
     _candle_type = {1: 1, 2: 1, 3: 1, 5: 1, 10: 1, 15: 1,
@@ -201,8 +229,28 @@ class AlphaTrade(object):
     _data_duration = {1: 1, 2: 2, 3: 3, 5: 5, 10: 10, 15: 15,
                       30: 30, 45: 45, '1H': None, '2H': 2, '3H': 2, '4H': 2, '1D': None, 'D': None, 'W': None, 'M': None}
 
-    def __init__(self, login_id, password, twofa, access_token=None, master_contracts_to_download=None):
-        """ logs in and gets enabled exchanges and products for user """
+    def __init__(self, login_id, password, twofa, access_token=None, master_contracts_to_download=None,
+                 host=None, socket_endpoint=None, integer_prices=False,
+                 contract_cache=DEFAULT_CONTRACT_CACHE, prefetch_master_contracts=False):
+        """ logs in and gets enabled exchanges and products for user
+            host (like 'http://127.0.0.1:8080') and socket_endpoint point the
+            client to another server, see alphatrade.simulator. Without
+            socket_endpoint the websocket of host is used
+
+            With integer_prices ticks and candles keep prices as integers in
+            the exchange's unit (paise, 1e-7 rupee on CDS), the scale being
+            tick.price_multiplier and DataFrame.attrs['price_multiplier'], and
+            orders take integer prices in the same unit
+
+            Master contracts are kept in the SQLite file contract_cache, by
+            default master_contracts.db in the user's cache directory, and
+            downloaded once per trading day. None always downloads them, as
+            does a cache file that cannot be opened
+
+            The master contract of an exchange is loaded the first time it is
+            used. master_contracts_to_download loads those exchanges right
+            away, prefetch_master_contracts loads the others in the background
+        """
         if len(twofa) != 6:
             pin = pyotp.TOTP(twofa).now()
             twofa = f"{int(pin):06d}" if len(pin) <= 5 else pin
@@ -211,9 +259,15 @@ class AlphaTrade(object):
         self.__login_id = login_id
         self.__password = password
         self.__twofa = twofa
+        self.__host = (host or self.__service_config['host']).rstrip('/')
+        if socket_endpoint is None:
+            if host is None:
+                socket_endpoint = self.__service_config['socket_endpoint']
+            else:
+                socket_endpoint = 'ws' + self.__host[len('http'):] + self.__service_config['socket_path']
+        self.__socket_endpoint = socket_endpoint
         self.__websocket = None
-        self.__websocket_connected = False
-        self.__ws_mutex = threading.Lock()
+        self.__ws_running = False
         self.__on_error = None
         self.__on_disconnect = None
         self.__on_open = None
@@ -223,21 +277,34 @@ class AlphaTrade(object):
         self.__exchange_messages_callback = None
         self.__oi_callback = None
         self.__dpr_callback = None
-        self.__subscribers = {}
-        self.__market_status_messages = []
-        self.__exchange_messages = []
-        self.__exchange_codes = {'NSE': 1,
-                                 'NFO': 2,
-                                 'CDS': 3,
-                                 'MCX': 4,
-                                 'BSE': 6,
-                                 'BFO': 7}
-        self.__exchange_price_multipliers = {1: 100,
-                                             2: 100,
-                                             3: 10000000,
-                                             4: 100,
-                                             6: 100,
-                                             7: 100}
+        self.__tick_batcher = None
+        self.__ticks_batch_callback = None
+        self.__dispatcher = None
+        self.__frame_recorder = None
+        self.__feed_stats = None
+        self.__quotes = QuoteStore()
+        self.__depth = DepthBook()
+        self.__publisher = None
+        self.__publisher_lock = threading.Lock()
+        self.__enrich_instruments = True
+        self.__subscriptions = SubscriptionManager()
+        self.__sender = WebSocketSender(self.__subscriptions)
+        self.__reconnect_policy = ReconnectPolicy()
+        self.__connection_state_callback = None
+        self.__disconnected_at = None
+        self.__connected_at = None
+        self.__gaps = GapTracker()
+        self.__gap_callback = None
+        self.__backfill_callback = None
+        self.__backfill_interval = 1
+        self.__backfill_queue = None
+        self.__market_status_messages = MessageStore()
+        self.__exchange_messages = MessageStore()
+        self.__messages_log_dir = None
+        self.__exchange_codes = EXCHANGE_CODES
+        self.__exchange_price_multipliers = EXCHANGE_PRICE_MULTIPLIERS
+        self.__integer_prices = integer_prices
+        self.__decode_tick = decode_integer_tick if integer_prices else decode_tick
 
         self.__headers = {
             'user-agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/85.0.4183.102 Safari/537.36'
@@ -264,15 +331,23 @@ class AlphaTrade(object):
             else:
                 raise ex.PermissionException(
                     f"Couldn't get profile info '{profile['message']}'")
-        self.__master_contracts_by_token = {}
-        self.__master_contracts_by_symbol = {}
-        if (master_contracts_to_download is None):
-            # for e in self.__enabled_exchanges:
-            for e in ['NSE', 'NFO', 'CDS', 'BSE', 'BFO', 'MCX']:
-                self.__get_master_contract(e)
-        else:
-            for e in master_contracts_to_download:
-                self.__get_master_contract(e)
+        # exchange -> InstrumentTable, and by exchange code
+        self.__master_contracts = {}
+        self.__master_contracts_by_code = {}
+        self.__contract_cache = None
+        if contract_cache is not None:
+            self.__contract_cache = self.__open_contract_cache(contract_cache)
+        # (exchange code, token) -> Instrument of the tokens looked up so far
+        self.__instruments_by_code_token = {}
+        self.__exchange_names = {code: name for name, code in EXCHANGE_CODES.items()}
+        self.__contracts_lock = threading.Lock()
+        self.__exchange_locks = {}
+        self.__contract_failures = {}
+        self.__prefetching = set()
+        if (master_contracts_to_download is not None):
+            self.__load_master_contracts([e.upper() for e in master_contracts_to_download])
+        if prefetch_master_contracts:
+            self.prefetch_master_contracts()
         self.ws_thread = None
 
     def __is_token_valid(self):
@@ -285,7 +360,7 @@ class AlphaTrade(object):
                 self.__access_token = None
                 return False
         self.__headers['X-Authorization-Token'] = self.__access_token
-        profile_url = 'https://alpha.sasonline.in/api/v1/user/profile'
+        profile_url = self.__url('profile')
         resp = self.session.get(profile_url, headers=self.__headers)
         return resp.status_code == 200 and resp.json()['status'] == 'success'
 
@@ -296,7 +371,7 @@ class AlphaTrade(object):
             'password': self.__password
         }
         response = self.session.post(
-            'https://alpha.sasonline.in/api/v3/user/login', json=login_body)
+            self.__url('login'), json=login_body)
 
         if response.status_code != 200:
             raise requests.HTTPError(response.text)
@@ -310,7 +385,7 @@ class AlphaTrade(object):
                       "twofa_token": self.__twofa_token,
                       "totp": self.__twofa}
         response = self.session.post(
-            'https://alpha.sasonline.in/api/v3/user/validatetotp', json=twofa_body)
+            self.__url('validatetotp'), json=twofa_body)
         if response.status_code != 200:
             raise requests.HTTPError(response.text)
         if 'error' in response.text:
@@ -353,17 +428,20 @@ class AlphaTrade(object):
         df['date'] = df['date'].apply(
             pd.Timestamp, unit='s', tzinfo=pytz.timezone('Asia/Kolkata'))
         # df['datetime'] = df['datetime'].astype(str).str[:-6]
-        df[['open', 'high', 'low', 'close']] = df[[
-            'open', 'high', 'low', 'close']].astype(float).div(divider)
+        if self.__integer_prices:
+            df[['open', 'high', 'low', 'close']] = df[[
+                'open', 'high', 'low', 'close']].astype(float).round().astype('int64')
+            df.attrs['price_multiplier'] = int(divider)
+        else:
+            df[['open', 'high', 'low', 'close']] = df[[
+                'open', 'high', 'low', 'close']].astype(float).div(divider)
         df['volume'] = df['volume'].astype(int)
         df.set_index('date', inplace=True)
         return df
 
     def __convert_exchanges(self, dictionary):
         if ('exchange' in dictionary):
-            d = self.__exchange_codes
-            dictionary['exchange'] = list(d.keys())[list(
-                d.values()).index(dictionary['exchange'])]
+            dictionary['exchange'] = EXCHANGE_NAMES[dictionary['exchange']]
         return dictionary
 
     def __convert_instrument(self, dictionary):
@@ -373,72 +451,193 @@ class AlphaTrade(object):
         return dictionary
 
     def __modify_human_readable_values(self, dictionary):
-        dictionary = self.__convert_prices(
-            dictionary, self.__exchange_price_multipliers[dictionary['exchange']])
+        if not self.__integer_prices:
+            dictionary = self.__convert_prices(
+                dictionary, self.__exchange_price_multipliers[dictionary['exchange']])
         dictionary = self.__convert_exchanges(dictionary)
         dictionary = self.__convert_instrument(dictionary)
         return dictionary
 
-    def __on_data_callback(self, ws=None, message=None):
+    def process_frame(self, message):
+        """ decode a raw websocket frame and bring it into human readable form,
+            returns a tuple of (mode, tick or message) and (mode, None) for unknown frames.
+            It updates the quotes, the depth book, the shared memory ring and the
+            gap tracker of the client, feed it from one thread at a time
+        """
+        res = self.__decode_tick(message)
+        if res is not None:
+            return res.mode, self.__convert_tick(res)
+        mode, p = decode_frame(message)
+        return mode, self.__convert_message(mode, p)
+
+    def __convert_tick(self, res):
+        if self.__enrich_instruments:
+            # never waits for a download on the receive thread, the ticks of
+            # an exchange still loading come without instrument
+            res.instrument = (self.__instruments_by_code_token.get((res.exchange_code, res.token)) or
+                              self.__find_instrument(res.exchange_code, res.token, wait=False))
+        self.__quotes.update(res)
+        if res.mode in DEPTH_MODES:
+            self.__depth.update(res, time.time())
+        publisher = self.__publisher
+        if publisher is not None:
+            # stop_publishing closes the ring under the same lock
+            with self.__publisher_lock:
+                if publisher is self.__publisher:
+                    publisher.publish(res)
+        gap = self.__gaps.update(res)
+        if gap is not None:
+            self.__on_gap(gap)
+        return res
+
+    def __convert_message(self, mode, p):
+        if p is None:
+            return None
+        res = self.__modify_human_readable_values(p)
+        if (mode == WsFrameMode.MARKET_STATUS):
+            self.__market_status_messages.append(res)
+        elif (mode == WsFrameMode.EXCHANGE_MESSAGES):
+            self.__exchange_messages.append(res)
+        return res
+
+    def __on_data_callback(self, ws=None, message=None, data_type=None, continue_flag=None):
         # This workaround is to solve the websocket_client's compatibility
         # issue of older versions. ie.0.40.0 which is used in Upstox.
         # Now this will work in both 0.40.0 & newer version of websocket_client
         if not isinstance(ws, websocket.WebSocketApp):
             message = ws
-        if (message[0] == WsFrameMode.MARKETDATA):
-            p = MarketData.parse(message[1:]).__dict__
-            res = self.__modify_human_readable_values(p)
-            if (self.__subscribe_callback is not None):
-                self.__subscribe_callback(res)
-        elif (message[0] == WsFrameMode.COMPACT_MARKETDATA):
-            p = CompactData.parse(message[1:]).__dict__
-            res = self.__modify_human_readable_values(p)
-            if (self.__subscribe_callback is not None):
-                self.__subscribe_callback(res)
-        elif (message[0] == WsFrameMode.SNAPQUOTE):
-            p = SnapQuote.parse(message[1:]).__dict__
-            res = self.__modify_human_readable_values(p)
-            if (self.__subscribe_callback is not None):
-                self.__subscribe_callback(res)
-        elif (message[0] == WsFrameMode.FULL_SNAPQUOTE):
-            p = FullSnapQuote.parse(message[1:]).__dict__
-            res = self.__modify_human_readable_values(p)
+        if self.__frame_recorder is not None:
+            self.__frame_recorder.record(message)
+        self.__handle_frame(message)
+
+    def __handle_frame(self, message):
+        if self.__feed_stats is not None:
+            self.__handle_frame_timed(message)
+            return
+        if (self.__tick_batcher is not None) and (message[0] in TICK_MODES):
+            self.__tick_batcher.add(message)
+            return
+        mode, res = self.process_frame(message)
+        if res is not None:
+            self.__deliver(mode, res)
+
+    def __handle_frame_timed(self, message):
+        received_at = time.time()
+        started = perf_counter()
+        if (self.__tick_batcher is not None) and (message[0] in TICK_MODES):
+            self.__tick_batcher.add(message)
+            self.__feed_stats.record(message[0], None, 0.0, 0.0, perf_counter() - started)
+            return
+        res = self.__decode_tick(message)
+        if res is not None:
+            mode = res.mode
+            decoded = perf_counter()
+            res = self.__convert_tick(res)
+        else:
+            mode, p = decode_frame(message)
+            decoded = perf_counter()
+            res = self.__convert_message(mode, p)
+        converted = perf_counter()
+        if res is not None:
+            self.__deliver(mode, res)
+        delivered = perf_counter()
+        key = None
+        exchange_lag = None
+        if isinstance(res, Tick):
+            key = (res.exchange_code, res.token)
+            time_stamp = getattr(res, 'exchange_time_stamp', None)
+            if time_stamp:
+                exchange_lag = received_at - time_stamp
+        self.__feed_stats.record(mode, key, decoded - started, converted - decoded,
+                                 delivered - converted, exchange_lag)
+
+    def __deliver(self, mode, res):
+        if (mode in TICK_MODES):
             if (self.__subscribe_callback is not None):
-                self.__subscribe_callback(res)
-        elif (message[0] == WsFrameMode.DPR):
-            p = DPR.parse(message[1:]).__dict__
-            res = self.__modify_human_readable_values(p)
+                self.__dispatch(self.__subscribe_callback, res, (mode, res.exchange_code, res.token))
+        elif (mode == WsFrameMode.DPR):
+            # low rate records, never conflated
             if (self.__dpr_callback is not None):
-                self.__dpr_callback(res)
-        elif (message[0] == WsFrameMode.OI):
-            p = OpenInterest.parse(message[1:]).__dict__
-            res = self.__modify_human_readable_values(p)
+                self.__dispatch(self.__dpr_callback, res)
+        elif (mode == WsFrameMode.OI):
             if (self.__oi_callback is not None):
-                self.__oi_callback(res)
-        elif (message[0] == WsFrameMode.MARKET_STATUS):
-            p = MarketStatus.parse(message[1:]).__dict__
-            res = self.__modify_human_readable_values(p)
-            self.__market_status_messages.append(res)
+                self.__dispatch(self.__oi_callback, res)
+        elif (mode == WsFrameMode.MARKET_STATUS):
             if (self.__market_status_messages_callback is not None):
-                self.__market_status_messages_callback(res)
-        elif (message[0] == WsFrameMode.EXCHANGE_MESSAGES):
-            p = ExchangeMessage.parse(message[1:]).__dict__
-            res = self.__modify_human_readable_values(p)
-            self.__exchange_messages.append(res)
+                self.__dispatch(self.__market_status_messages_callback, res)
+        elif (mode == WsFrameMode.EXCHANGE_MESSAGES):
             if (self.__exchange_messages_callback is not None):
-                self.__exchange_messages_callback(res)
+                self.__dispatch(self.__exchange_messages_callback, res)
 
-    def __on_close_callback(self, ws=None):
-        self.__websocket_connected = False
+    def __dispatch(self, callback, message, key=None):
+        if self.__dispatcher is None:
+            callback(message)
+        else:
+            self.__dispatcher.put(callback, message, key)
+
+    def __connection_event(self, state, delay=None):
+        downtime = 0.0
+        if self.__disconnected_at is not None:
+            downtime = time.time() - self.__disconnected_at
+        if self.__connection_state_callback is not None:
+            self.__connection_state_callback(ConnectionEvent(
+                state, self.__reconnect_policy.attempt, delay, downtime))
+
+    def __mark_disconnected(self):
+        self.__sender.on_close()
+        if self.__disconnected_at is None:
+            self.__disconnected_at = time.time()
+            if self.__connected_at is not None:
+                self.__reconnect_policy.connection_lost(
+                    self.__disconnected_at - self.__connected_at)
+                self.__connected_at = None
+            self.__gaps.disconnected()
+            self.__connection_event(ConnectionState.DISCONNECTED)
+
+    def __on_close_callback(self, ws=None, close_status_code=None, close_msg=None):
+        self.__mark_disconnected()
         if self.__on_disconnect:
             self.__on_disconnect()
 
     def __on_open_callback(self, ws=None):
-        self.__websocket_connected = True
-        self.__resubscribe()
+        self.__sender.on_open(self.__websocket)
+        self.__connection_event(ConnectionState.CONNECTED)
+        self.__disconnected_at = None
+        self.__connected_at = time.time()
         if self.__on_open:
             self.__on_open()
 
+    def __on_gap(self, gap):
+        if self.__gap_callback is not None:
+            self.__dispatch(self.__gap_callback, gap)
+        if self.__backfill_callback is None:
+            return
+        if gap.first_after - gap.last_before < INTERVAL_SECONDS.get(self.__backfill_interval, 60):
+            return
+        if self.__backfill_queue is None:
+            # a single worker, a reconnect with thousands of gaps must not
+            # turn into thousands of concurrent history requests
+            self.__backfill_queue = queue.Queue()
+            th = threading.Thread(target=self.__backfill_worker)
+            th.daemon = True
+            th.start()
+        self.__backfill_queue.put(gap)
+
+    def __backfill_worker(self):
+        while True:
+            gap = self.__backfill_queue.get()
+            instrument = gap.instrument or self.get_instrument_by_token(gap.exchange, gap.token)
+            if instrument is None:
+                continue
+            try:
+                candles = self.history(instrument,
+                                       start_time=datetime.fromtimestamp(gap.last_before),
+                                       end_time=datetime.fromtimestamp(gap.first_after),
+                                       interval=self.__backfill_interval)
+                self.__backfill_callback(gap, candles)
+            except Exception as exp:
+                logger.warning(f"backfill of {instrument.symbol} failed, {exp}")
+
     def __on_error_callback(self, ws=None, error=None):
         # This workaround is to solve the websocket_client's compatibility issue of older versions. ie.0.40.0 which is used in upstox. Now this will work in both 0.40.0 & newer version of websocket_client
         if (isinstance(ws, websocket.WebSocketApp) is not True):
@@ -446,40 +645,57 @@ class AlphaTrade(object):
         if self.__on_error:
             self.__on_error(error)
 
-    def __send_heartbeat(self):
-        heart_beat = {"a": "h", "v": [], "m": ""}
-        while True:
-            sleep(5)
-            self.__ws_send(json.dumps(heart_beat),
-                           opcode=websocket._abnf.ABNF.OPCODE_PING)
-
     def __ws_run_forever(self):
-        while True:
-            try:
-                self.__websocket.run_forever()
-            except Exception as exp:
-                logger.warning(
-                    f"websocket run forever ended in exception, {exp}")
-            sleep(0.1)  # Sleep for 100ms between reconnection.
-
-    def __ws_send(self, *args, **kwargs):
-        while self.__websocket_connected == False:
-            # sleep for 50ms if websocket is not connected, wait for reconnection
-            sleep(0.05)
-        with self.__ws_mutex:
-            self.__websocket.send(*args, **kwargs)
-
-    def start_websocket(self, subscribe_callback=None,
-                        order_update_callback=None,
-                        socket_open_callback=None,
-                        socket_close_callback=None,
-                        socket_error_callback=None,
-                        run_in_background=False,
-                        market_status_messages_callback=None,
-                        exchange_messages_callback=None,
-                        oi_callback=None,
-                        dpr_callback=None):
-        """ Start a websocket connection for getting live data """
+        self.__ws_running = True
+        try:
+            while True:
+                try:
+                    self.__websocket.run_forever()
+                except Exception as exp:
+                    logger.warning(
+                        f"websocket run forever ended in exception, {exp}")
+                self.__mark_disconnected()
+                delay = self.__reconnect_policy.next_delay()
+                if delay is None:
+                    logger.error(
+                        f"websocket not reconnected after {self.__reconnect_policy.attempt} attempts")
+                    return
+                self.__connection_event(ConnectionState.RECONNECTING, delay)
+                sleep(delay)
+        finally:
+            self.__ws_running = False
+
+    def __ws_send(self, data, opcode=websocket.ABNF.OPCODE_TEXT):
+        # queued for the writer thread, sent once the websocket is open
+        self.__sender.send(data, opcode)
+
+    def __configure_feed(self, subscribe_callback=None,
+                         order_update_callback=None,
+                         socket_open_callback=None,
+                         socket_close_callback=None,
+                         socket_error_callback=None,
+                         market_status_messages_callback=None,
+                         exchange_messages_callback=None,
+                         oi_callback=None,
+                         dpr_callback=None,
+                         ticks_batch_callback=None,
+                         batch_max_frames=1000,
+                         batch_interval_ms=100,
+                         enrich_instruments=True,
+                         dispatch_threads=0,
+                         dispatch_queue_size=10000,
+                         dispatch_policy=OverflowPolicy.BLOCK,
+                         subscription_chunk_size=500,
+                         subscription_pace=0.01,
+                         reconnect_policy=None,
+                         connection_state_callback=None,
+                         gap_callback=None,
+                         backfill_callback=None,
+                         backfill_interval=1,
+                         feed_stats=False,
+                         feed_stats_log_interval=None,
+                         messages_maxlen=1000,
+                         messages_log_dir=None):
         self.__on_open = socket_open_callback
         self.__on_disconnect = socket_close_callback
         self.__on_error = socket_error_callback
@@ -489,17 +705,161 @@ class AlphaTrade(object):
         self.__exchange_messages_callback = exchange_messages_callback
         self.__oi_callback = oi_callback
         self.__dpr_callback = dpr_callback
+        self.__enrich_instruments = enrich_instruments
+        self.__subscriptions.chunk_size = subscription_chunk_size
+        self.__subscriptions.pace = subscription_pace
+        if reconnect_policy is not None:
+            self.__reconnect_policy = reconnect_policy
+        self.__connection_state_callback = connection_state_callback
+        self.__gap_callback = gap_callback
+        self.__backfill_callback = backfill_callback
+        self.__backfill_interval = backfill_interval
+        if self.__feed_stats is not None:
+            self.__feed_stats.stop_logger()
+        self.__feed_stats = FeedStats() if feed_stats else None
+        self.__messages_log_dir = messages_log_dir
+        self.__market_status_messages.configure(
+            messages_maxlen,
+            None if messages_log_dir is None else os.path.join(messages_log_dir, 'market_status.jsonl'))
+        self.__exchange_messages.configure(
+            messages_maxlen,
+            None if messages_log_dir is None else os.path.join(messages_log_dir, 'exchange_messages.jsonl'))
+        if self.__feed_stats is not None and feed_stats_log_interval:
+            self.__feed_stats.start_logger(feed_stats_log_interval)
+        self.__stop_feed_workers()
+        if dispatch_threads > 0:
+            self.__dispatcher = TickDispatcher(maxsize=dispatch_queue_size,
+                                               threads=dispatch_threads,
+                                               policy=dispatch_policy,
+                                               on_error=self.__on_error)
+            self.__dispatcher.start()
+        self.__ticks_batch_callback = ticks_batch_callback
+        if ticks_batch_callback is not None:
+            self.__tick_batcher = TickBatcher(self.__on_tick_batch,
+                                              self.__exchange_price_multipliers,
+                                              max_frames=batch_max_frames,
+                                              interval_ms=batch_interval_ms,
+                                              integer=self.__integer_prices)
+            self.__tick_batcher.start()
+
+    def __on_tick_batch(self, batch):
+        # the batch path keeps the same stores as __convert_tick
+        received_at = time.time()
+        publisher = self.__publisher
+        for mode, ticks in batch.items():
+            self.__quotes.update_batch(mode, ticks)
+            if mode in DEPTH_MODES:
+                self.__depth.update_batch(ticks, received_at)
+            if publisher is not None:
+                with self.__publisher_lock:
+                    if publisher is self.__publisher:
+                        publisher.publish_batch(mode, ticks, received_at)
+            for gap in self.__gaps.update_batch(mode, ticks):
+                self.__on_gap(gap)
+        self.__ticks_batch_callback(batch)
+
+    def __stop_feed_workers(self):
+        # delivers whatever is pending in the batcher and the dispatcher
+        if self.__tick_batcher is not None:
+            self.__tick_batcher.stop()
+            self.__tick_batcher = None
+        if self.__dispatcher is not None:
+            self.__dispatcher.stop()
+            self.__dispatcher = None
 
-        url = self.__service_config['socket_endpoint'].format(
-            access_token=self.__access_token)
+    def start_websocket(self, subscribe_callback=None,
+                        order_update_callback=None,
+                        socket_open_callback=None,
+                        socket_close_callback=None,
+                        socket_error_callback=None,
+                        run_in_background=False,
+                        market_status_messages_callback=None,
+                        exchange_messages_callback=None,
+                        oi_callback=None,
+                        dpr_callback=None,
+                        ticks_batch_callback=None,
+                        batch_max_frames=1000,
+                        batch_interval_ms=100,
+                        enrich_instruments=True,
+                        dispatch_threads=0,
+                        dispatch_queue_size=10000,
+                        dispatch_policy=OverflowPolicy.BLOCK,
+                        subscription_chunk_size=500,
+                        subscription_pace=0.01,
+                        reconnect_policy=None,
+                        connection_state_callback=None,
+                        gap_callback=None,
+                        backfill_callback=None,
+                        backfill_interval=1,
+                        feed_stats=False,
+                        feed_stats_log_interval=None,
+                        messages_maxlen=1000,
+                        messages_log_dir=None):
+        """ Start a websocket connection for getting live data
+            When ticks_batch_callback is given, ticks are delivered to it instead of
+            subscribe_callback, once per window of batch_max_frames frames or
+            batch_interval_ms milliseconds, as a dictionary of
+            {WsFrameMode: numpy structured array}. Batched ticks still update the
+            quotes, the depth book, the shared memory ring and the gap tracker,
+            once per batch, but carry no instrument
+            Set enrich_instruments to False to skip the instrument lookup on
+            every tick, the instrument of each tick is None then
+            With dispatch_threads > 0 callbacks run on that many dispatcher threads
+            fed through ring buffers of dispatch_queue_size messages, so slow
+            callbacks don't stall the socket. dispatch_policy (OverflowPolicy)
+            decides what happens when a ring buffer is full, CONFLATE only
+            replaces queued market data ticks of a token then, never DPR or
+            open interest records
+            Subscriptions are sent in messages of at most subscription_chunk_size
+            tokens, subscription_pace seconds apart
+            reconnect_policy (ReconnectPolicy) sets the backoff between reconnects,
+            connection_state_callback receives a ConnectionEvent on every connect,
+            disconnect and reconnect attempt. After a reconnect gap_callback gets a
+            Gap with the last exchange time stamp before and the first after the
+            outage of each token, and with backfill_callback the candles of the
+            gap are fetched through history() and passed as backfill_callback(gap, df)
+            With feed_stats the decode, convert and callback time of every frame and
+            the lag behind its exchange time stamp are kept in histograms, read them
+            with get_feed_stats() or log them every feed_stats_log_interval seconds
+            The last messages_maxlen market status and exchange messages are kept,
+            with messages_log_dir all of them are also appended to JSON lines files
+            in that directory
+        """
+        self.__configure_feed(subscribe_callback=subscribe_callback,
+                              order_update_callback=order_update_callback,
+                              socket_open_callback=socket_open_callback,
+                              socket_close_callback=socket_close_callback,
+                              socket_error_callback=socket_error_callback,
+                              market_status_messages_callback=market_status_messages_callback,
+                              exchange_messages_callback=exchange_messages_callback,
+                              oi_callback=oi_callback,
+                              dpr_callback=dpr_callback,
+                              ticks_batch_callback=ticks_batch_callback,
+                              batch_max_frames=batch_max_frames,
+                              batch_interval_ms=batch_interval_ms,
+                              enrich_instruments=enrich_instruments,
+                              dispatch_threads=dispatch_threads,
+                              dispatch_queue_size=dispatch_queue_size,
+                              dispatch_policy=dispatch_policy,
+                              subscription_chunk_size=subscription_chunk_size,
+                              subscription_pace=subscription_pace,
+                              reconnect_policy=reconnect_policy,
+                              connection_state_callback=connection_state_callback,
+                              gap_callback=gap_callback,
+                              backfill_callback=backfill_callback,
+                              backfill_interval=backfill_interval,
+                              feed_stats=feed_stats,
+                              feed_stats_log_interval=feed_stats_log_interval,
+                              messages_maxlen=messages_maxlen,
+                              messages_log_dir=messages_log_dir)
+
+        url = self.websocket_url()
         self.__websocket = websocket.WebSocketApp(url,
                                                   on_data=self.__on_data_callback,
                                                   on_error=self.__on_error_callback,
                                                   on_close=self.__on_close_callback,
                                                   on_open=self.__on_open_callback)
-        th = threading.Thread(target=self.__send_heartbeat)
-        th.daemon = True
-        th.start()
+        self.__sender.start()
         if run_in_background is True:
             self.__ws_thread = threading.Thread(target=self.__ws_run_forever)
             self.__ws_thread.daemon = True
@@ -507,6 +867,100 @@ class AlphaTrade(object):
         else:
             self.__ws_run_forever()
 
+    def get_feed_stats(self):
+        """ Latency statistics of the live feed in microseconds, per frame type
+            and per (exchange code, token), None unless started with feed_stats.
+            With dispatch_threads the callback time is the time to queue a message
+        """
+        if self.__feed_stats is None:
+            return None
+        return self.__feed_stats.snapshot()
+
+    def reset_feed_stats(self):
+        """ Start the latency statistics over """
+        if self.__feed_stats is not None:
+            self.__feed_stats.reset()
+
+    def get_gaps(self):
+        """ Gaps in the live feed detected after reconnects, oldest first """
+        return list(self.__gaps.gaps)
+
+    def wait_connected(self, timeout=None):
+        """ wait till the websocket is open, returns False on timeout """
+        return self.__sender.connected.wait(timeout)
+
+    def start_recording(self, path):
+        """ Append every raw frame received on the websocket, with its receive time,
+            to the frame log at path, see alphatrade.recorder
+        """
+        self.stop_recording()
+        self.__frame_recorder = FrameRecorder(path)
+
+    def stop_recording(self):
+        """ Stop recording raw frames, returns the number of frames recorded """
+        recorder, self.__frame_recorder = self.__frame_recorder, None
+        if recorder is None:
+            return 0
+        recorder.close()
+        return recorder.frames
+
+    def start_publishing(self, name=None, capacity=65536):
+        """ Write every tick of the live feed into a shared memory ring, other
+            processes read them with alphatrade.shm.TickSubscriber(name).
+            Returns the name of the ring
+        """
+        self.stop_publishing()
+        publisher = TickPublisher(name, capacity)
+        with self.__publisher_lock:
+            self.__publisher = publisher
+        return publisher.name
+
+    def stop_publishing(self):
+        """ Stop publishing ticks and remove the ring, returns the number of
+            ticks published
+        """
+        with self.__publisher_lock:
+            publisher, self.__publisher = self.__publisher, None
+            if publisher is None:
+                return 0
+            publisher.close()
+        return publisher.sequence
+
+    def replay_frames(self, path, speed=1.0, **kwargs):
+        """ Replay a frame log through the same decode, convert and callback pipeline
+            as the live feed. speed 1.0 keeps the recorded pacing, 2.0 is twice as
+            fast and None as fast as possible. Other keyword arguments are the
+            callbacks and options of start_websocket. Returns replay statistics
+            Replayed ticks go into the quotes, depth book and gaps of the client,
+            which start empty, so replaying while the websocket runs raises
+            RuntimeError. The message stores keep their size and log directory
+            unless messages_maxlen or messages_log_dir are given
+        """
+        if self.__ws_running:
+            raise RuntimeError(
+                "replay_frames can't run next to the live feed, both use the same callbacks and quotes")
+        self.__quotes.clear()
+        self.__depth.clear()
+        self.__gaps.clear()
+        kwargs.setdefault('messages_maxlen', self.__market_status_messages.maxlen)
+        kwargs.setdefault('messages_log_dir', self.__messages_log_dir)
+        self.__configure_feed(**kwargs)
+        try:
+            return FrameReplayer(path).replay(self.__handle_frame, speed)
+        finally:
+            self.__stop_feed_workers()
+
+    def websocket_url(self):
+        """ url of the live feed websocket for the current access token """
+        return self.__socket_endpoint.format(
+            access_token=self.__access_token)
+
+    def get_dispatch_stats(self):
+        """ Get queue depth, drop and conflation counters of the callback dispatcher """
+        if self.__dispatcher is None:
+            return None
+        return self.__dispatcher.stats()
+
     def get_profile(self):
         """ Get profile """
         profile = self.__api_call_helper('profile', Requests.GET, None, None)
@@ -595,13 +1049,21 @@ class AlphaTrade(object):
             prod_type = None
         return prod_type
 
+    def __order_price(self, value, instrument):
+        # integer prices are in the exchange's unit with integer_prices, the
+        # api takes rupees, other values are left to the type checks
+        if self.__integer_prices and isinstance(value, numbers.Integral) and not isinstance(value, bool):
+            return int(value) / self.__exchange_price_multipliers[self.__exchange_codes[instrument.exchange]]
+        return value
+
     def place_order(self, transaction_type, instrument, quantity, order_type,
                     product_type, price=0.0, trigger_price=None,
                     stop_loss=None, square_off=None, trailing_sl=None,
                     is_amo=False,
                     order_tag='python'):
         """ placing an order, many fields are optional and are not required
-            for all order types
+            for all order types. With integer_prices, prices can be integers
+            in the exchange's unit
         """
         if transaction_type is None:
             raise TypeError(
@@ -622,6 +1084,11 @@ class AlphaTrade(object):
             raise TypeError(
                 "Required parameter product_type not of type ProductType")
 
+        price = self.__order_price(price, instrument)
+        trigger_price = self.__order_price(trigger_price, instrument)
+        stop_loss = self.__order_price(stop_loss, instrument)
+        square_off = self.__order_price(square_off, instrument)
+
         if price is not None and not isinstance(price, float):
             raise TypeError("Optional parameter price not of type float")
 
@@ -715,6 +1182,9 @@ class AlphaTrade(object):
                 if type(i[s]) is not value:
                     raise TypeError(
                         f"Element '{s}' in orders should be of type {keys[s]}")
+            for key in ('price', 'trigger_price'):
+                if key in i:
+                    i[key] = self.__order_price(i[key], i['instrument'])
             if i['order_type'] == OrderType.Limit:
                 if "price" not in i:
                     raise TypeError(
@@ -772,6 +1242,7 @@ class AlphaTrade(object):
                      trigger_price=0.0):
         """ modify an order, transaction_type, instrument, product_type, order_id & order_type is required, 
             rest are optional, use only when when you want to change that attribute.
+            With integer_prices, prices can be integers in the exchange's unit
         """
         if not isinstance(instrument, Instrument):
             raise TypeError(
@@ -791,6 +1262,9 @@ class AlphaTrade(object):
             raise TypeError(
                 "Required parameter product_type not of type ProductType")
 
+        price = self.__order_price(price, instrument)
+        trigger_price = self.__order_price(trigger_price, instrument)
+
         if price is not None and not isinstance(price, float):
             raise TypeError("Optional parameter price not of type float")
 
@@ -857,131 +1331,143 @@ class AlphaTrade(object):
         """ Subscribe to market messages """
         return self.__ws_send(json.dumps({"a": "subscribe", "v": [1, 2, 3, 4, 6], "m": "market_status"}))
 
-    def get_market_status_messages(self):
-        """ Get market messages """
-        return self.__market_status_messages
+    def get_market_status_messages(self, exchange=None, since=None):
+        """ Get stored market messages, oldest first, optionally only of an
+            exchange and / or received after since (epoch seconds)
+        """
+        return self.__market_status_messages.messages(exchange, since)
+
+    def get_latest_market_status(self, exchange=None):
+        """ Get the latest market message of an exchange, or of every exchange
+            as a dictionary {exchange: message}
+        """
+        return self.__market_status_messages.latest(exchange)
 
     def subscribe_exchange_messages(self):
         """ Subscribe to exchange messages """
         return self.__ws_send(json.dumps({"a": "subscribe", "v": [1, 2, 3, 4, 6], "m": "exchange_messages"}))
 
-    def get_exchange_messages(self):
-        """ Get stored exchange messages """
-        return self.__exchange_messages
+    def get_exchange_messages(self, exchange=None, since=None):
+        """ Get stored exchange messages, oldest first, optionally only of an
+            exchange and / or received after since (epoch seconds)
+        """
+        return self.__exchange_messages.messages(exchange, since)
 
-    def subscribe(self, instrument, live_feed_type):
-        """ subscribe to the current feed of an instrument """
+    def get_latest_exchange_message(self, exchange=None):
+        """ Get the latest exchange message of an exchange, or of every exchange
+            as a dictionary {exchange: message}
+        """
+        return self.__exchange_messages.latest(exchange)
+
+    def __subscription_entries(self, instrument, live_feed_type):
         if (type(live_feed_type) is not LiveFeedType):
             raise TypeError(
                 "Required parameter live_feed_type not of type LiveFeedType")
-        arr = []
-        if (isinstance(instrument, list)):
-            for _instrument in instrument:
-                if not isinstance(_instrument, Instrument):
-                    raise TypeError(
-                        "Required parameter instrument not of type Instrument")
-                exchange = self.__exchange_codes[_instrument.exchange]
-                arr.append([exchange, int(_instrument.token)])
-                self.__subscribers[_instrument] = live_feed_type
-        else:
-            if not isinstance(instrument, Instrument):
+        instruments = instrument if isinstance(instrument, list) else [instrument]
+        entries = {}
+        for _instrument in instruments:
+            if not isinstance(_instrument, Instrument):
                 raise TypeError(
                     "Required parameter instrument not of type Instrument")
-            exchange = self.__exchange_codes[instrument.exchange]
-            arr = [[exchange, int(instrument.token)]]
-            self.__subscribers[instrument] = live_feed_type
-        if (live_feed_type == LiveFeedType.MARKET_DATA):
-            mode = 'marketdata'
-        elif (live_feed_type == LiveFeedType.COMPACT):
-            mode = 'compact_marketdata'
-        elif (live_feed_type == LiveFeedType.SNAPQUOTE):
-            mode = 'snapquote'
-        elif (live_feed_type == LiveFeedType.FULL_SNAPQUOTE):
-            mode = 'full_snapquote'
-        data = json.dumps({'a': 'subscribe', 'v': arr, 'm': mode})
-        return self.__ws_send(data)
+            entries[(self.__exchange_codes[_instrument.exchange], int(_instrument.token))] = _instrument
+        return LIVE_FEED_MODES[live_feed_type], entries
+
+    def forget_tokens(self, keys):
+        """ drop the feed gap tracking of (exchange code, token) keys, for feeds
+            decoding through process_frame when they unsubscribe
+        """
+        self.__gaps.forget(keys)
+
+    def subscription_entries(self, instrument, live_feed_type):
+        """ validate instrument(s), returns the feed mode and a dictionary
+            {(exchange code, token): instrument} to keep in a SubscriptionManager
+        """
+        return self.__subscription_entries(instrument, live_feed_type)
+
+    def subscribe(self, instrument, live_feed_type):
+        """ subscribe to the current feed of an instrument """
+        mode, entries = self.__subscription_entries(instrument, live_feed_type)
+        self.__subscriptions.add(mode, entries)
+        self.__sender.sync_subscriptions()
 
     def unsubscribe(self, instrument, live_feed_type):
         """ unsubscribe to the current feed of an instrument """
-        if (type(live_feed_type) is not LiveFeedType):
-            raise TypeError(
-                "Required parameter live_feed_type not of type LiveFeedType")
-        arr = []
-        if (isinstance(instrument, list)):
-            for _instrument in instrument:
-                if not isinstance(_instrument, Instrument):
-                    raise TypeError(
-                        "Required parameter instrument not of type Instrument")
-                exchange = self.__exchange_codes[_instrument.exchange]
-                arr.append([exchange, int(_instrument.token)])
-                if (_instrument in self.__subscribers):
-                    del self.__subscribers[_instrument]
-        else:
-            if not isinstance(instrument, Instrument):
-                raise TypeError(
-                    "Required parameter instrument not of type Instrument")
-            exchange = self.__exchange_codes[instrument.exchange]
-            arr = [[exchange, int(instrument.token)]]
-            if (instrument in self.__subscribers):
-                del self.__subscribers[instrument]
-        if (live_feed_type == LiveFeedType.MARKET_DATA):
-            mode = 'marketdata'
-        elif (live_feed_type == LiveFeedType.COMPACT):
-            mode = 'compact_marketdata'
-        elif (live_feed_type == LiveFeedType.SNAPQUOTE):
-            mode = 'snapquote'
-        elif (live_feed_type == LiveFeedType.FULL_SNAPQUOTE):
-            mode = 'full_snapquote'
-
-        data = json.dumps({'a': 'unsubscribe', 'v': arr, 'm': mode})
-        return self.__ws_send(data)
+        mode, entries = self.__subscription_entries(instrument, live_feed_type)
+        self.__gaps.forget(self.__subscriptions.remove(mode, entries))
+        self.__sender.sync_subscriptions()
+
+    def switch_feed_type(self, instrument, live_feed_type):
+        """ move an instrument, or a list of instruments, to another feed type,
+            unsubscribing it from the feed types it had
+        """
+        mode, entries = self.__subscription_entries(instrument, live_feed_type)
+        self.__subscriptions.switch(mode, entries)
+        self.__sender.sync_subscriptions()
 
     def get_all_subscriptions(self):
         """ get the all subscribed instruments """
-        return self.__subscribers
-
-    def __resubscribe(self):
-        market = []
-        compact = []
-        snap = []
-        full = []
-        for key, value in self.get_all_subscriptions().items():
-            if (value == LiveFeedType.MARKET_DATA):
-                market.append(key)
-            elif (value == LiveFeedType.COMPACT):
-                compact.append(key)
-            elif (value == LiveFeedType.SNAPQUOTE):
-                snap.append(key)
-            elif (value == LiveFeedType.FULL_SNAPQUOTE):
-                full.append(key)
-        if market:
-            self.subscribe(market, LiveFeedType.MARKET_DATA)
-        if compact:
-            self.subscribe(compact, LiveFeedType.COMPACT)
-        if snap:
-            self.subscribe(snap, LiveFeedType.SNAPQUOTE)
-        if full:
-            self.subscribe(full, LiveFeedType.FULL_SNAPQUOTE)
+        desired = self.__subscriptions.desired()
+        subscribers = {}
+        for live_feed_type, mode in LIVE_FEED_MODES.items():
+            for _instrument in desired.get(mode, {}).values():
+                subscribers[_instrument] = live_feed_type
+        return subscribers
+
+    def __quote_key(self, instrument):
+        if not isinstance(instrument, Instrument):
+            raise TypeError(
+                "Required parameter instrument not of type Instrument")
+        return (self.__exchange_codes[instrument.exchange], int(instrument.token))
+
+    def get_ltp(self, instrument):
+        """ Get the last traded price of an instrument from the live feed,
+            None until a tick of the instrument is received
+        """
+        return self.__quotes.get_ltp(*self.__quote_key(instrument))
+
+    def get_quote(self, instrument):
+        """ Get the latest Quote of an instrument from the live feed, combining
+            ltp, best bid/ask, volume, open interest and depth of every feed type subscribed
+        """
+        return self.__quotes.get_quote(*self.__quote_key(instrument))
+
+    def get_quotes(self, instruments):
+        """ Get the latest quotes of a list of instruments as a numpy structured array """
+        return self.__quotes.get_quotes([self.__quote_key(i) for i in instruments])
+
+    def get_depth_book(self):
+        """ DepthBook holding the five level depth of every SNAPQUOTE and
+            FULL_SNAPQUOTE subscription, for spread, mid, microprice,
+            imbalance and cumulative depth across all tokens at once
+        """
+        return self.__depth
+
+    def get_depth_rows(self, instruments):
+        """ rows of a list of instruments in the depth book, -1 for instruments
+            without depth yet, to pass to the DepthBook queries
+        """
+        return self.__depth.rows([self.__quote_key(i) for i in instruments])
 
     def get_instrument_by_symbol(self, exchange, symbol):
         """ get instrument by providing symbol """
         # get instrument given exchange and symbol
         exchange = exchange.upper()
         # check if master contract exists
-        if exchange not in self.__master_contracts_by_symbol:
+        master_contract = self.__master_contract(exchange)
+        if master_contract is None:
             logger.warning(f"Cannot find exchange {exchange} in master contract. "
                            "Please ensure if that exchange is enabled in your profile and downloaded the master contract for the same")
             return None
-        master_contract = self.__master_contracts_by_symbol[exchange]
-        if symbol not in master_contract:
+        row = master_contract.row_of_symbol(symbol)
+        if row < 0:
             logger.warning(
                 f"Cannot find symbol {exchange} {symbol} in master contract")
             return None
-        return master_contract[symbol]
+        return master_contract.instrument(row)
 
     def get_instrument_for_fno(self, symbol, expiry_date, is_fut=False, strike=None, is_call=False, exchange='NFO'):
         """ get instrument for FNO """
-        res = self.search_instruments(exchange, symbol)
+        res = self.search_instruments(exchange, symbol, match='exact')
         if (res == None):
             return
         matches = []
@@ -1005,79 +1491,209 @@ class AlphaTrade(object):
                             if (sp[-1] == 'PE'):
                                 return i
 
-    def search_instruments(self, exchange, symbol):
-        """ Search instrument by symbol match """
+    def search_instruments(self, exchange, symbol, match='contains'):
+        """ Search instrument by symbol match, match being 'contains',
+            'prefix', 'exact' or 'fuzzy' on the underlying of the symbol
+        """
         # search instrument given exchange and symbol
         exchange = exchange.upper()
-        matches = []
         # check if master contract exists
-        if exchange not in self.__master_contracts_by_token:
+        master_contract = self.__master_contract(exchange)
+        if master_contract is None:
             logger.warning(f"Cannot find exchange {exchange} in master contract. "
                            "Please ensure if that exchange is enabled in your profile and downloaded the master contract for the same")
             return None
-        master_contract = self.__master_contracts_by_token[exchange]
-        for contract in master_contract:
-            if (isinstance(symbol, list)):
-                for sym in symbol:
-                    if sym.lower() in master_contract[contract].symbol.split(' ')[0].lower():
-                        matches.append(master_contract[contract])
-            else:
-                if symbol.lower() in master_contract[contract].symbol.split(' ')[0].lower():
-                    matches.append(master_contract[contract])
-        return matches
+        return master_contract.instruments(master_contract.underlying_rows(symbol, match))
 
     def get_instrument_by_token(self, exchange, token):
-        """ Get instrument by providing token """
+        """ Get instrument by providing token, exchange can be the exchange name or its code """
         # get instrument given exchange and token
-        exchange = exchange.upper()
+        if isinstance(exchange, str):
+            exchange = exchange.upper()
+            code = self.__exchange_codes.get(exchange)
+        else:
+            code = exchange
         token = int(token)
-        
+        instrument = (self.__instruments_by_code_token.get((code, token)) or
+                      self.__find_instrument(code, token))
+        if instrument is None:
+            logger.warning(
+                f"Cannot find token {exchange} {token} in master contract")
+        return instrument
+
+    def __find_instrument(self, code, token, wait=True):
+        # Instrument of a token from the table of its exchange, kept for the
+        # next lookup
+        master_contract = self.__master_contracts_by_code.get(code)
+        if master_contract is None:
+            exchange = self.__exchange_names.get(code)
+            if exchange is None:
+                return None
+            master_contract = self.__master_contract(exchange, wait)
+            if master_contract is None:
+                return None
+        instrument = master_contract.by_token(token)
+        if instrument is not None:
+            self.__instruments_by_code_token[(code, token)] = instrument
+        return instrument
 
     def get_master_contract(self, exchange):
-        """ Get master contract """
-        return self.__master_contracts_by_symbol[exchange]
+        """ Get master contract, an InstrumentTable which maps symbols to
+            instruments
+        """
+        master_contract = self.__master_contract(exchange)
+        if master_contract is None:
+            raise KeyError(exchange)
+        return master_contract
+
+    def __master_contract(self, exchange, wait=True):
+        """ InstrumentTable of an exchange, loaded the first time it is asked
+            for. None when the exchange has no master contract or it couldn't
+            be loaded, and with wait=False while it is still loading
+        """
+        master_contract = self.__master_contracts.get(exchange)
+        if master_contract is not None or exchange not in MASTER_CONTRACT_EXCHANGES:
+            return master_contract
+        failed_at = self.__contract_failures.get(exchange)
+        if failed_at is not None and time.monotonic() - failed_at < CONTRACTS_RETRY_INTERVAL:
+            return None
+        if not wait:
+            self.prefetch_master_contracts([exchange])
+            return None
+        try:
+            return self.__ensure_master_contract(exchange)
+        except Exception as exp:
+            logger.error(f"Couldn't load the master contract of {exchange} :: {exp}")
+            return None
+
+    def __ensure_master_contract(self, exchange, refresh=False):
+        """ InstrumentTable of an exchange, loading it if needed. A single
+            thread loads an exchange at a time, the others asking for it wait
+            and share the result, None when that load failed
+        """
+        asked_at = time.monotonic()
+        with self.__contracts_lock:
+            lock = self.__exchange_locks.setdefault(exchange, threading.Lock())
+        with lock:
+            master_contract = self.__master_contracts.get(exchange)
+            if master_contract is not None and not refresh:
+                return master_contract
+            if not refresh and self.__contract_failures.get(exchange, 0) >= asked_at:
+                return None
+            try:
+                master_contract = self.__fetch_master_contract(exchange, refresh)
+            except Exception:
+                self.__contract_failures[exchange] = time.monotonic()
+                raise
+            self.__contract_failures.pop(exchange, None)
+            self.__install_master_contract(exchange, master_contract)
+            return master_contract
+
+    def __get_master_contract(self, exchange, refresh=False):
+        """ loads all the tradable contracts of an exchange into an
+            InstrumentTable
+        """
+        self.__ensure_master_contract(exchange, refresh)
 
-    def __get_master_contract(self, exchange):
-        """ returns all the tradable contracts of an exchange
-            placed in an OrderedDict and the key is the token
+    def __open_contract_cache(self, path):
+        # a cache that cannot be opened is not worth failing the login for
+        try:
+            return ContractCache(path)
+        except (OSError, sqlite3.Error) as exp:
+            logger.warning(f"master contracts cache {path} not usable, downloading without it, {exp}")
+            return None
+
+    def __fetch_master_contract(self, exchange, refresh=False):
+        """ InstrumentTable of the contracts of an exchange, read from the cache
+            or streamed from contracts.json
         """
+        rows = None
+        if self.__contract_cache is not None and not refresh:
+            try:
+                rows = self.__contract_cache.load(exchange, self.__host)
+            except sqlite3.Error as exp:
+                logger.warning(f"master contracts of {exchange} not read from the cache, {exp}")
+        if rows is not None:
+            return InstrumentTable.from_rows(rows)
         print(f'Downloading master contracts for exchange: {exchange}')
-        body = self.__api_call_helper(
-            'master_contract', Requests.GET, {'exchange': exchange}, None)
-        master_contract_by_token = OrderedDict()
-        master_contract_by_symbol = OrderedDict()
-        for sub in body:
-            for scrip in body[sub]:
-                # convert token
-                token = int(scrip['code'])
-
-                # convert symbol to upper
-                symbol = scrip['symbol']
-
-                # convert expiry to none if it's non-existent
-                if ('expiry' in scrip):
-                    expiry = datetime.fromtimestamp(
-                        scrip['expiry']).date()
-                else:
-                    expiry = None
-
-                # convert lot size to int
-                lot_size = scrip['lotSize'] if ('lotSize' in scrip) else None
-                # Name & Exchange
-                name = scrip['company']
-                exch = scrip['exchange']
-
-                instrument = Instrument(
-                    exch, token, symbol, name, expiry, lot_size)
-                master_contract_by_token[token] = instrument
-                master_contract_by_symbol[symbol] = instrument
-        self.__master_contracts_by_token[exchange] = master_contract_by_token
-        self.__master_contracts_by_symbol[exchange] = master_contract_by_symbol
+        response = self.__api_stream('master_contract', {'exchange': exchange})
+        try:
+            master_contract = InstrumentTable.from_rows(
+                stream_contract_rows(response.iter_content(chunk_size=CONTRACTS_CHUNK_SIZE)))
+        finally:
+            response.close()
+        if self.__contract_cache is not None:
+            try:
+                self.__contract_cache.store(exchange, self.__host, master_contract.contract_rows())
+            except sqlite3.Error as exp:
+                logger.warning(f"master contracts of {exchange} not cached, {exp}")
+        return master_contract
+
+    def __install_master_contract(self, exchange, master_contract):
+        code = self.__exchange_codes.get(exchange)
+        if code is not None:
+            # instruments of an earlier download are looked up again
+            for key in [key for key in list(self.__instruments_by_code_token) if key[0] == code]:
+                del self.__instruments_by_code_token[key]
+            self.__master_contracts_by_code[code] = master_contract
+        self.__master_contracts[exchange] = master_contract
+
+    def __load_master_contracts(self, exchanges, refresh=False):
+        """ __get_master_contract of several exchanges, the downloads run in
+            parallel over the pooled session and every exchange is parsed
+            while it streams in
+        """
+        exchanges = list(dict.fromkeys(exchanges))
+        if len(exchanges) < 2:
+            for exchange in exchanges:
+                self.__get_master_contract(exchange, refresh)
+            return
+        with ThreadPoolExecutor(max_workers=min(len(exchanges), CONTRACTS_DOWNLOAD_THREADS),
+                                thread_name_prefix='contracts') as pool:
+            # the first failure is raised once all are done
+            list(pool.map(lambda exchange: self.__get_master_contract(exchange, refresh), exchanges))
+
+    def prefetch_master_contracts(self, exchanges=None):
+        """ Load the master contracts of exchanges, all not loaded yet by
+            default, in a background thread. Returns the thread, None when
+            there is nothing to load
+        """
+        if exchanges is None:
+            exchanges = [e for e in MASTER_CONTRACT_EXCHANGES if e not in self.__master_contracts]
+        with self.__contracts_lock:
+            exchanges = [e for e in dict.fromkeys(e.upper() for e in exchanges)
+                         if e not in self.__prefetching]
+            self.__prefetching.update(exchanges)
+        if not exchanges:
+            return None
+        thread = threading.Thread(target=self.__prefetch, args=(exchanges,),
+                                  name='contracts-prefetch', daemon=True)
+        thread.start()
+        return thread
+
+    def __prefetch(self, exchanges):
+        try:
+            self.__load_master_contracts(exchanges)
+        except Exception as exp:
+            logger.error(f"Couldn't prefetch master contracts {exchanges} :: {exp}")
+        finally:
+            with self.__contracts_lock:
+                self.__prefetching.difference_update(exchanges)
+
+    def refresh_master_contracts(self, exchanges=None):
+        """ Download the master contracts of exchanges, all loaded ones by
+            default, again and update the contract cache
+        """
+        if exchanges is None:
+            exchanges = list(self.__master_contracts)
+        self.__load_master_contracts([exchange.upper() for exchange in exchanges], refresh=True)
+
+    def __url(self, name):
+        return f"{self.__host}{self.__service_config['routes'][name]}"
 
     def __api_call_helper(self, name, http_method, params, data):
         # helper formats the url and reads error codes nicely
-        config = self.__service_config
-        url = f"{config['host']}{config['routes'][name]}"
+        url = self.__url(name)
         if params is not None:
             url = url.format(**params)
 
@@ -1086,7 +1702,18 @@ class AlphaTrade(object):
             raise requests.HTTPError(response.text)
         return json.loads(response.text)
 
-    def __api_call(self, url, http_method, data):
+    def __api_stream(self, name, params):
+        # GET whose body is read as it arrives, the caller closes the response
+        url = self.__url(name).format(**params)
+        response = self.__api_call(url, Requests.GET, None, stream=True)
+        if response.status_code != 200:
+            try:
+                raise requests.HTTPError(response.text)
+            finally:
+                response.close()
+        return response
+
+    def __api_call(self, url, http_method, data, stream=False):
         # logger.debug('url:: %s http_method:: %s data:: %s headers:: %s', url, http_method, data, headers)
         headers = {"Content-Type": "application/json"}
         if (len(self.__access_token) > 100):
@@ -1106,7 +1733,7 @@ class AlphaTrade(object):
                 url, data=json.dumps(data), headers=headers)
         elif http_method is Requests.GET:
             params = {'client_id': self.__login_id}
-            r = self.session.get(url, params=params, headers=headers)
+            r = self.session.get(url, params=params, headers=headers, stream=stream)
         return r
 
     def get_historical_candles(self, exchange, symbol, start_time, end_time, interval=5, is_index=False):
@@ -1132,7 +1759,7 @@ class AlphaTrade(object):
         }
 
         r = self.session.get(
-            'https://alpha.sasonline.in/api/v1/charts', params=PARAMS, headers=self.__headers)
+            self.__url('charts'), params=PARAMS, headers=self.__headers)
         data = r.json()
         return self.__format_candles(data, divider)
 
@@ -1164,7 +1791,7 @@ class AlphaTrade(object):
         }
 
         r = self.session.get(
-            'https://alpha.sasonline.in/api/v1/charts', params=PARAMS, headers=self.__headers)
+            self.__url('charts'), params=PARAMS, headers=self.__headers)
         data = r.json()
         return self.__format_candles(data, divider)
 
@@ -1202,7 +1829,10 @@ class AlphaTrade(object):
                 ',', '').astype(float)
             return float(positions['m2m'].sum())
 
-    def _format_candles(self, data, interval):
+    def _format_candles(self, data, interval, price_multiplier=None):
+        """ candles of a chart response as a DataFrame, prices in rupees or, with
+            price_multiplier, integers in units of 1 / price_multiplier rupee
+        """
         records = data['data']['candles']
         df = pd.DataFrame(records, columns=[
             'datetime', 'open', 'high', 'low', 'close', 'volume'])  # , index=0)
@@ -1218,6 +1848,10 @@ class AlphaTrade(object):
                 interval = 'W-Mon'
             df = df.resample(interval, origin='start').agg({'open': 'first', 'high': 'max',
                                                             'low': 'min', 'close': 'last', 'volume': 'sum'}).dropna()
+        if price_multiplier is not None:
+            df[['open', 'high', 'low', 'close']] = df[[
+                'open', 'high', 'low', 'close']].mul(price_multiplier).round().astype('int64')
+            df.attrs['price_multiplier'] = price_multiplier
         df.index = df.index.astype(str).str[:-6]
         return df
 
@@ -1250,6 +1884,10 @@ class AlphaTrade(object):
             'Accept': 'application/json'
         }
         r = requests.get(
-            'https://alpha.sasonline.in/api/v1/charts/tdv', params=PARAMS, headers=headers)
+            self.__url('charts_tdv'), params=PARAMS, headers=headers)
         data = r.json()
-        return self._format_candles(data, interval)
+        price_multiplier = None
+        if self.__integer_prices:
+            price_multiplier = self.__exchange_price_multipliers[
+                self.__exchange_codes[instrument.exchange]]
+        return self._format_candles(data, interval, price_multiplier)
@@ -0,0 +1,223 @@
+# -*- coding: utf-8 -*-
+"""
+    bars.py
+
+    Live OHLCV bars built from the tick stream. Every tick updates the open
+    bar of each interval of its token in place, a bar is closed, stored and
+    handed to the callback when the first tick of the next bar arrives or
+    when `advance` is called by a timer.
+
+    Bars are aligned the way the charts API aligns them, in IST and anchored
+    to the 09:15 session start, so `get_bars` joins the output of `history()`
+    without gaps or shifted candles.
+
+    :license: see LICENSE for details.
+"""
+from collections import namedtuple
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from alphatrade.ticks import EXCHANGE_CODES, EXCHANGE_NAMES, EXCHANGE_PRICE_MULTIPLIERS
+
+BAR_DTYPE = np.dtype([('time', 'i8'), ('open', 'f8'), ('high', 'f8'), ('low', 'f8'),
+                      ('close', 'f8'), ('volume', 'i8')])
+# prices in the exchange's unit, for ticks of a client with integer_prices
+INTEGER_BAR_DTYPE = np.dtype([('time', 'i8'), ('open', 'i8'), ('high', 'i8'), ('low', 'i8'),
+                              ('close', 'i8'), ('volume', 'i8')])
+
+Bar = namedtuple('Bar', ['exchange', 'token', 'interval', 'time',
+                         'open', 'high', 'low', 'close', 'volume'])
+
+# same keys as AlphaTrade.history, in seconds
+INTERVAL_SECONDS = {1: 60, 2: 120, 3: 180, 5: 300, 10: 600, 15: 900,
+                    30: 1800, 45: 2700, '1H': 3600}
+
+IST_OFFSET = 19800
+
+# positions in the list of an open bar
+_START, _END, _OPEN, _HIGH, _LOW, _CLOSE, _VOLUME, _CLOSED = range(8)
+
+
+def session_anchor(session_start='09:15'):
+    """ epoch seconds of the session start (HH:MM IST) on 1970-01-01 """
+    hours, minutes = session_start.split(':')
+    return int(hours) * 3600 + int(minutes) * 60 - IST_OFFSET
+
+
+def bar_start(timestamp, seconds, anchor=session_anchor()):
+    """ start, in epoch seconds, of the bar of length seconds holding timestamp """
+    return timestamp - (timestamp - anchor) % seconds
+
+
+class BarBuilder(object):
+    """ OHLCV bars of several intervals for every token in the tick stream
+
+        bars = BarBuilder(intervals=(1, 5, '1H'), callback=on_bar)
+        sas.start_websocket(subscribe_callback=bars.update)
+
+        `callback` receives a Bar each time a bar closes. The last `history`
+        closed bars of each token and interval are kept. Ticks are timed by
+        their exchange time stamp, or by the local clock with
+        use_exchange_time=False. Set integer_prices for the ticks of a client
+        with integer_prices, bars then keep int64 prices (INTEGER_BAR_DTYPE)
+    """
+
+    def __init__(self, intervals=(1, 3, 5, 15, '1H'), callback=None, history=400,
+                 capacity=256, session_start='09:15', use_exchange_time=True,
+                 integer_prices=False):
+        for interval in intervals:
+            if interval not in INTERVAL_SECONDS:
+                raise ValueError(
+                    f'Interval {interval} not supported, use one of {list(INTERVAL_SECONDS)}')
+        if history <= 0:
+            raise ValueError('history should be greater than 0')
+        self.intervals = tuple(intervals)
+        self.__seconds = tuple(INTERVAL_SECONDS[interval] for interval in self.intervals)
+        self.__index = {interval: i for i, interval in enumerate(self.intervals)}
+        self.__callback = callback
+        self.__history = history
+        self.__anchor = session_anchor(session_start)
+        self.__use_exchange_time = use_exchange_time
+        self.__dtype = INTEGER_BAR_DTYPE if integer_prices else BAR_DTYPE
+        self.__lock = threading.Lock()
+        self.__slots = {}
+        self.__keys = []
+        self.__current = []
+        self.__last_volume = []
+        self.__capacity = max(1, capacity)
+        self.__bars = [np.zeros((self.__capacity, history), dtype=self.__dtype)
+                       for _ in self.intervals]
+        self.__counts = [np.zeros(self.__capacity, dtype=np.int64) for _ in self.intervals]
+
+    def __add(self, key):
+        with self.__lock:
+            slot = len(self.__keys)
+            if slot == self.__capacity:
+                self.__grow()
+            self.__keys.append(key)
+            self.__current.append([None] * len(self.intervals))
+            self.__last_volume.append(None)
+            self.__slots[key] = slot
+        return slot
+
+    def __grow(self):
+        capacity = self.__capacity * 2
+        for i in range(len(self.intervals)):
+            bars = np.zeros((capacity, self.__history), dtype=self.__dtype)
+            bars[:self.__capacity] = self.__bars[i]
+            counts = np.zeros(capacity, dtype=np.int64)
+            counts[:self.__capacity] = self.__counts[i]
+            self.__bars[i] = bars
+            self.__counts[i] = counts
+        self.__capacity = capacity
+
+    def __close(self, slot, index, bar):
+        with self.__lock:
+            count = self.__counts[index][slot]
+            self.__bars[index][slot, count % self.__history] = (
+                bar[_START], bar[_OPEN], bar[_HIGH], bar[_LOW], bar[_CLOSE], bar[_VOLUME])
+            self.__counts[index][slot] = count + 1
+        if self.__callback is not None:
+            exchange_code, token = self.__keys[slot]
+            self.__callback(Bar(EXCHANGE_NAMES[exchange_code], token, self.intervals[index],
+                                bar[_START], bar[_OPEN], bar[_HIGH], bar[_LOW], bar[_CLOSE],
+                                bar[_VOLUME]))
+
+    def update(self, tick):
+        """ add a tick, ticks without a last traded price are ignored """
+        ltp = getattr(tick, 'ltp', None)
+        if ltp is None:
+            return
+        key = (tick.exchange_code, tick.token)
+        slot = self.__slots.get(key)
+        if slot is None:
+            slot = self.__add(key)
+        timestamp = tick.exchange_time_stamp if self.__use_exchange_time else 0
+        if not timestamp:
+            timestamp = int(time.time())
+        # the feed carries the day's cumulative volume
+        volume = tick.volume
+        last_volume = self.__last_volume[slot]
+        if last_volume is None:
+            traded = 0
+        elif volume >= last_volume:
+            traded = volume - last_volume
+        else:
+            # a new session restarted the cumulative volume
+            traded = volume
+        self.__last_volume[slot] = volume
+        current = self.__current[slot]
+        for index, seconds in enumerate(self.__seconds):
+            bar = current[index]
+            if bar is None or timestamp >= bar[_END]:
+                if bar is not None and not bar[_CLOSED]:
+                    self.__close(slot, index, bar)
+                start = timestamp - (timestamp - self.__anchor) % seconds
+                current[index] = [start, start + seconds, ltp, ltp, ltp, ltp, traded, False]
+            elif not bar[_CLOSED]:
+                if ltp > bar[_HIGH]:
+                    bar[_HIGH] = ltp
+                elif ltp < bar[_LOW]:
+                    bar[_LOW] = ltp
+                bar[_CLOSE] = ltp
+                bar[_VOLUME] += traded
+
+    def advance(self, now=None):
+        """ close the bars that ended by now (epoch seconds, defaults to the
+            local clock), so bars of instruments without trades close on time
+        """
+        if now is None:
+            now = time.time()
+        for slot in range(len(self.__keys)):
+            current = self.__current[slot]
+            for index, bar in enumerate(current):
+                if bar is not None and not bar[_CLOSED] and bar[_END] <= now:
+                    self.__close(slot, index, bar)
+                    bar[_CLOSED] = True
+
+    def __slot(self, exchange, token):
+        if isinstance(exchange, str):
+            exchange = EXCHANGE_CODES[exchange.upper()]
+        return self.__slots.get((exchange, int(token)))
+
+    def get_bars_array(self, exchange, token, interval, include_current=False):
+        """ closed bars, oldest first, as a structured array of BAR_DTYPE, or
+            INTEGER_BAR_DTYPE, with the bar start time in epoch seconds
+        """
+        index = self.__index[interval]
+        slot = self.__slot(exchange, token)
+        if slot is None:
+            return np.zeros(0, dtype=self.__dtype)
+        with self.__lock:
+            count = int(self.__counts[index][slot])
+            ring = self.__bars[index][slot]
+            if count <= self.__history:
+                bars = ring[:count].copy()
+            else:
+                position = count % self.__history
+                bars = np.concatenate((ring[position:], ring[:position]))
+        bar = self.__current[slot][index]
+        if include_current and bar is not None and not bar[_CLOSED]:
+            bars = np.append(bars, np.array([(bar[_START], bar[_OPEN], bar[_HIGH], bar[_LOW],
+                                              bar[_CLOSE], bar[_VOLUME])], dtype=self.__dtype))
+        return bars
+
+    def get_bars(self, exchange, token, interval, include_current=False):
+        """ closed bars as a DataFrame with the columns and datetime index of
+            AlphaTrade.history
+        """
+        bars = self.get_bars_array(exchange, token, interval, include_current)
+        df = pd.DataFrame({'open': bars['open'], 'high': bars['high'], 'low': bars['low'],
+                           'close': bars['close'], 'volume': bars['volume'].astype(int)},
+                          index=pd.to_datetime(bars['time'], unit='s', utc=True)
+                          .tz_convert('Asia/Kolkata'))
+        df.index = df.index.astype(str).str[:-6]
+        df.index.name = 'datetime'
+        if self.__dtype is INTEGER_BAR_DTYPE:
+            if isinstance(exchange, str):
+                exchange = EXCHANGE_CODES[exchange.upper()]
+            df.attrs['price_multiplier'] = int(EXCHANGE_PRICE_MULTIPLIERS[exchange])
+        return df
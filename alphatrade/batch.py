@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+"""
+    batch.py
+
+    Micro-batched tick delivery. Frames are collected over a window of N
+    frames or T milliseconds and decoded in one vectorized pass into NumPy
+    structured arrays, one array per frame mode.
+
+    :license: see LICENSE for details.
+"""
+import logging
+import threading
+
+import numpy as np
+
+from alphatrade.decoder import LAYOUTS, PRICE_FIELDS, TICK_MODES
+from alphatrade.ticks import EXCHANGE_PRICE_MULTIPLIERS
+
+logger = logging.getLogger(__name__)
+
+_WIRE_TYPES = {'B': 'u1', 'H': '>u2', 'I': '>u4', 'Q': '>u8'}
+_NATIVE_TYPES = {'B': 'u1', 'H': 'u2', 'I': 'u4', 'Q': 'u8'}
+
+
+def wire_dtype(mode):
+    """ packed big-endian dtype of a whole frame, including the mode byte """
+    fields = [('mode', 'u1')]
+    for name, code, count in LAYOUTS[mode].fields:
+        fields.append((name, _WIRE_TYPES[code]) if count is None
+                      else (name, _WIRE_TYPES[code], (count,)))
+    return np.dtype(fields)
+
+
+def tick_dtype(mode, integer=False):
+    """ native dtype of decoded ticks, prices are float64 in rupees, or int64
+        in exchange units with integer, and `exchange` keeps the numeric
+        exchange code
+    """
+    price = 'i8' if integer else 'f8'
+    fields = []
+    for name, code, count in LAYOUTS[mode].fields:
+        kind = price if name in PRICE_FIELDS else _NATIVE_TYPES[code]
+        fields.append((name, kind) if count is None else (name, kind, (count,)))
+    return np.dtype(fields)
+
+
+WIRE_DTYPES = {mode: wire_dtype(mode) for mode in TICK_MODES}
+TICK_DTYPES = {mode: tick_dtype(mode) for mode in TICK_MODES}
+INTEGER_TICK_DTYPES = {mode: tick_dtype(mode, integer=True) for mode in TICK_MODES}
+
+
+def multiplier_table(price_multipliers):
+    """ lookup array of price multipliers indexed by exchange code """
+    table = np.ones(256, dtype='f8')
+    for code, multiplier in price_multipliers.items():
+        table[code] = multiplier
+    return table
+
+
+_RUPEE_MULTIPLIERS = multiplier_table(EXCHANGE_PRICE_MULTIPLIERS)
+
+
+def rupee_prices(ticks, name):
+    """ float64 rupees of a price field of decoded ticks, scaled or not """
+    values = ticks[name]
+    if values.dtype.kind == 'f':
+        return values
+    divider = _RUPEE_MULTIPLIERS[ticks['exchange']]
+    return values / (divider if values.ndim == 1 else divider[:, None])
+
+
+def decode_batch(mode, frames, multipliers, integer=False):
+    """ decode a list of raw frames of the same mode into a structured array
+        of `TICK_DTYPES[mode]`, `multipliers` is a `multiplier_table`. With
+        integer prices are not scaled, see `INTEGER_TICK_DTYPES`
+    """
+    wire = WIRE_DTYPES[mode]
+    size = wire.itemsize
+    buffer = b''.join(frames)
+    if len(buffer) != size * len(frames):
+        # frames carrying trailing bytes, keep only the known layout
+        if any(len(frame) < size for frame in frames):
+            raise ValueError(f'Frame shorter than {size} bytes for mode {mode}')
+        buffer = b''.join([frame[:size] for frame in frames])
+    raw = np.frombuffer(buffer, dtype=wire)
+    ticks = np.empty(len(raw), dtype=(INTEGER_TICK_DTYPES if integer else TICK_DTYPES)[mode])
+    divider = None
+    for name in ticks.dtype.names:
+        if name in PRICE_FIELDS and not integer:
+            if divider is None:
+                divider = multipliers[raw['exchange']]
+            values = raw[name]
+            ticks[name] = values / (divider if values.ndim == 1 else divider[:, None])
+        else:
+            ticks[name] = raw[name]
+    return ticks
+
+
+class TickBatcher(object):
+    """ Collects tick frames and hands them to `callback` once per window as a
+        dictionary of {WsFrameMode: structured array}. A window closes after
+        `max_frames` frames or `interval_ms` milliseconds, whichever comes first.
+    """
+
+    def __init__(self, callback, price_multipliers, max_frames=1000, interval_ms=100,
+                 integer=False):
+        if max_frames is not None and max_frames <= 0:
+            raise ValueError('max_frames should be greater than 0')
+        if interval_ms is not None and interval_ms <= 0:
+            raise ValueError('interval_ms should be greater than 0')
+        self.__callback = callback
+        self.__multipliers = multiplier_table(price_multipliers)
+        self.__integer = integer
+        self.__max_frames = max_frames
+        self.__interval = interval_ms / 1000.0 if interval_ms is not None else None
+        self.__frames = {}
+        self.__count = 0
+        self.__lock = threading.Lock()
+        self.__flush_lock = threading.Lock()
+        self.__stopped = threading.Event()
+        self.__thread = None
+
+    def add(self, message):
+        """ queue a raw frame, flushes when the window is full """
+        with self.__lock:
+            frames = self.__frames.get(message[0])
+            if frames is None:
+                frames = self.__frames[message[0]] = []
+            frames.append(message)
+            self.__count += 1
+            full = self.__max_frames is not None and self.__count >= self.__max_frames
+        if full:
+            self.flush()
+
+    def flush(self):
+        """ decode the pending frames and call the batch callback """
+        with self.__flush_lock:
+            with self.__lock:
+                pending, self.__frames = self.__frames, {}
+                self.__count = 0
+            if not pending:
+                return
+            batch = {}
+            for mode, frames in pending.items():
+                try:
+                    batch[mode] = decode_batch(mode, frames, self.__multipliers, self.__integer)
+                except ValueError as exp:
+                    logger.warning(f"Dropping {len(frames)} frames of mode {mode}, {exp}")
+            if batch:
+                self.__callback(batch)
+
+    def __run(self):
+        while not self.__stopped.wait(self.__interval):
+            try:
+                self.flush()
+            except Exception as exp:
+                logger.warning(f"tick batch callback ended in exception, {exp}")
+
+    def start(self):
+        """ start the timer thread closing windows every `interval_ms` """
+        if self.__interval is None or self.__thread is not None:
+            return
+        self.__stopped.clear()
+        self.__thread = threading.Thread(target=self.__run)
+        self.__thread.daemon = True
+        self.__thread.start()
+
+    def stop(self):
+        """ stop the timer thread and deliver whatever is pending """
+        self.__stopped.set()
+        if self.__thread is not None:
+            self.__thread.join()
+            self.__thread = None
+        self.flush()
@@ -0,0 +1,253 @@
+# -*- coding: utf-8 -*-
+"""
+    contracts.py
+
+    On-disk cache of the master contracts. Every exchange's contracts are
+    kept in an SQLite file together with the trading date (IST) and the host
+    they were downloaded for, so a restart during the same session reads
+    them back instead of downloading contracts.json again. A cache of an
+    earlier day, or of another host, is stale and downloaded afresh.
+
+    A download is parsed as it streams in, one scrip at a time, so the
+    whole contracts.json never has to be held in memory.
+
+    :license: see LICENSE for details.
+"""
+from datetime import date, datetime, timedelta, timezone
+import codecs
+import functools
+import json
+import os
+import sqlite3
+import threading
+import time
+
+IST = timezone(timedelta(hours=5, minutes=30))
+
+
+def default_cache_path():
+    """ master_contracts.db in the user's cache directory, %LOCALAPPDATA% on
+        Windows and $XDG_CACHE_HOME or ~/.cache elsewhere
+    """
+    if os.name == 'nt':
+        root = os.environ.get('LOCALAPPDATA') or os.path.expanduser('~')
+    else:
+        root = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(root, 'alphatrade', 'master_contracts.db')
+
+
+DEFAULT_CONTRACT_CACHE = default_cache_path()
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS contracts (
+    download TEXT NOT NULL,
+    exchange TEXT NOT NULL,
+    token INTEGER NOT NULL,
+    symbol TEXT NOT NULL,
+    name TEXT,
+    expiry INTEGER,
+    lot_size INTEGER,
+    PRIMARY KEY (download, token)
+);
+CREATE TABLE IF NOT EXISTS downloads (
+    exchange TEXT PRIMARY KEY,
+    trading_date TEXT NOT NULL,
+    host TEXT NOT NULL,
+    downloaded_at REAL NOT NULL,
+    contracts INTEGER NOT NULL
+);
+'''
+
+
+def trading_date(now=None):
+    """ date in India of now (epoch seconds), the contracts change once a day """
+    return datetime.fromtimestamp(time.time() if now is None else now, IST).date()
+
+
+@functools.lru_cache(maxsize=1024)
+def _expiry_date(expiry):
+    # an exchange has a few dozen expiries over thousands of scrips, every
+    # scrip of an expiry shares one date
+    return datetime.fromtimestamp(expiry).date()
+
+
+def _contract_row(scrip):
+    # convert expiry to none if it's non-existent
+    if ('expiry' in scrip):
+        expiry = _expiry_date(scrip['expiry'])
+    else:
+        expiry = None
+    return (scrip['exchange'], int(scrip['code']), scrip['symbol'], scrip['company'],
+            expiry, scrip.get('lotSize'))
+
+
+def contract_rows(body):
+    """ (exchange, token, symbol, name, expiry date or None, lot size or None)
+        of every scrip of a contracts.json response
+    """
+    for sub in body:
+        for scrip in body[sub]:
+            yield _contract_row(scrip)
+
+
+def stream_contract_rows(chunks):
+    """ contract_rows of a contracts.json response arriving as an iterable of
+        byte chunks, like `response.iter_content()`, yielded as soon as each
+        scrip is complete
+    """
+    decode = codecs.getincrementaldecoder('utf-8')().decode
+    raw_decode = json.JSONDecoder().raw_decode
+    loads = json.loads
+    text = ''
+    position = 0
+    # the body is {"<segment>": [{scrip}, ...], ...}, depth 1 is inside the
+    # object, 2 inside a segment's list
+    depth = 0
+    chunks = iter(chunks)
+    finished = False
+    batch = True
+    while True:
+        length = len(text)
+        while position < length and text[position] in ' \t\r\n,:':
+            position += 1
+        if position < length:
+            char = text[position]
+            if char == '{' and depth == 0 or char == '[' and depth == 1:
+                depth += 1
+                position += 1
+                continue
+            if char == '}' and depth == 1 or char == ']' and depth == 2:
+                depth -= 1
+                position += 1
+                if depth == 0:
+                    return
+                continue
+            if depth == 2 and char == '{' and batch:
+                # the complete scrips of the buffer in one go, up to the last
+                # '}' before the end of the list, else one by one below
+                stop = text.find(']', position)
+                end = text.rfind('}', position, length if stop < 0 else stop) + 1
+                if end:
+                    try:
+                        scrips = loads(f'[{text[position:end]}]')
+                    except ValueError:
+                        batch = False
+                    else:
+                        position = end
+                        for scrip in scrips:
+                            yield _contract_row(scrip)
+                        continue
+            if depth:
+                # a segment name or a scrip, both need the whole value
+                try:
+                    value, end = raw_decode(text, position)
+                except ValueError:
+                    if finished:
+                        raise
+                else:
+                    position = end
+                    if depth == 2:
+                        yield _contract_row(value)
+                    continue
+            else:
+                raise ValueError(f"contracts.json should be an object, got {text[position:position + 20]!r}")
+        if finished:
+            if depth:
+                raise ValueError('contracts.json ended before it was complete')
+            return
+        chunk = next(chunks, None)
+        if chunk is None:
+            finished = True
+            chunk = b''
+        text = text[position:] + (decode(chunk, final=finished) if isinstance(chunk, bytes) else chunk)
+        position = 0
+        batch = True
+
+
+class ContractCache(object):
+    """ Master contracts per exchange in an SQLite file, shared by processes.
+        The directory of the file is created when missing
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.__lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.__connection = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        with self.__lock, self.__connection:
+            self.__connection.execute('PRAGMA journal_mode=WAL')
+            self.__connection.executescript(_SCHEMA)
+
+    def info(self, exchange):
+        """ {'trading_date', 'host', 'downloaded_at', 'contracts'} of the cached
+            download of an exchange, None if there is none
+        """
+        with self.__lock:
+            row = self.__connection.execute(
+                'SELECT trading_date, host, downloaded_at, contracts FROM downloads '
+                'WHERE exchange = ?', (exchange,)).fetchone()
+        if row is None:
+            return None
+        return {'trading_date': date.fromisoformat(row[0]), 'host': row[1],
+                'downloaded_at': row[2], 'contracts': row[3]}
+
+    def is_fresh(self, exchange, host, day=None):
+        """ the cache holds the contracts of exchange from host for day, today
+            in India by default
+        """
+        info = self.info(exchange)
+        return (info is not None and info['host'] == host and
+                info['trading_date'] == (day or trading_date()))
+
+    def load(self, exchange, host, day=None):
+        """ rows as yielded by contract_rows, in download order, None when the
+            cache of the exchange is stale or missing
+        """
+        if not self.is_fresh(exchange, host, day):
+            return None
+        with self.__lock:
+            rows = self.__connection.execute(
+                'SELECT exchange, token, symbol, name, expiry, lot_size FROM contracts '
+                'WHERE download = ? ORDER BY rowid', (exchange,)).fetchall()
+        fromordinal = date.fromordinal
+        return [(exch, token, symbol, name, None if expiry is None else fromordinal(expiry), lot_size)
+                for exch, token, symbol, name, expiry, lot_size in rows]
+
+    def store(self, exchange, host, rows, day=None):
+        """ replace the cached contracts of exchange, stamped with day, rows
+            being any iterable of contract_rows
+        """
+        day = day or trading_date()
+        records = ((exchange, exch, token, symbol, name,
+                    None if expiry is None else expiry.toordinal(), lot_size)
+                   for exch, token, symbol, name, expiry, lot_size in rows)
+        with self.__lock, self.__connection:
+            self.__connection.execute('DELETE FROM contracts WHERE download = ?', (exchange,))
+            # the same token can be listed twice, the last one wins like in the
+            # in-memory index
+            self.__connection.executemany(
+                'INSERT OR REPLACE INTO contracts VALUES (?, ?, ?, ?, ?, ?, ?)', records)
+            count, = self.__connection.execute(
+                'SELECT COUNT(*) FROM contracts WHERE download = ?', (exchange,)).fetchone()
+            self.__connection.execute(
+                'INSERT OR REPLACE INTO downloads VALUES (?, ?, ?, ?, ?)',
+                (exchange, day.isoformat(), host, time.time(), count))
+
+    def invalidate(self, exchange=None):
+        """ mark the cache of an exchange, or of all, stale """
+        with self.__lock, self.__connection:
+            if exchange is None:
+                self.__connection.execute('DELETE FROM downloads')
+            else:
+                self.__connection.execute('DELETE FROM downloads WHERE exchange = ?', (exchange,))
+
+    def clear(self):
+        with self.__lock, self.__connection:
+            self.__connection.execute('DELETE FROM downloads')
+            self.__connection.execute('DELETE FROM contracts')
+
+    def close(self):
+        with self.__lock:
+            self.__connection.close()
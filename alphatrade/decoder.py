@@ -0,0 +1,226 @@
+# -*- coding: utf-8 -*-
+"""
+    decoder.py
+
+    Binary websocket frame decoder built on precompiled `struct.Struct`
+    layouts. Every frame starts with a one byte mode (see `WsFrameMode`)
+    followed by a big-endian, packed payload. The decoded dictionaries are
+    identical to the ones produced by the protlib `CStruct` definitions in
+    `alphatrade.alphatrade`.
+
+    :license: see LICENSE for details.
+"""
+import enum
+import struct
+
+
+class WsFrameMode(enum.IntEnum):
+    MARKETDATA = 1
+    COMPACT_MARKETDATA = 2
+    SNAPQUOTE = 3
+    FULL_SNAPQUOTE = 4
+    SPREADDATA = 5
+    SPREAD_SNAPQUOTE = 6
+    DPR = 7
+    OI = 8
+    MARKET_STATUS = 9
+    EXCHANGE_MESSAGES = 10
+
+
+# struct format codes used by the feed, protlib equivalents in comments
+UCHAR = 'B'     # CUChar
+USHORT = 'H'    # CUShort
+UINT = 'I'      # CUInt
+ULONG = 'Q'     # CULong
+
+DEPTH = 5
+
+# fields holding prices in the exchange's smallest unit (paise for most)
+PRICE_FIELDS = ('ltp', 'best_bid_price', 'best_ask_price', 'atp', 'open', 'high',
+                'low', 'close', 'yearly_high', 'yearly_low', 'bid_prices', 'ask_prices')
+
+# frame modes carrying ticks for subscribed instruments
+TICK_MODES = frozenset((WsFrameMode.MARKETDATA, WsFrameMode.COMPACT_MARKETDATA,
+                        WsFrameMode.SNAPQUOTE, WsFrameMode.FULL_SNAPQUOTE))
+
+# (field name, struct code, array length or None) in wire order
+FRAME_FIELDS = {
+    WsFrameMode.MARKETDATA: (
+        ('exchange', UCHAR, None),
+        ('token', UINT, None),
+        ('ltp', UINT, None),
+        ('ltt', UINT, None),
+        ('ltq', UINT, None),
+        ('volume', UINT, None),
+        ('best_bid_price', UINT, None),
+        ('best_bid_quantity', UINT, None),
+        ('best_ask_price', UINT, None),
+        ('best_ask_quantity', UINT, None),
+        ('total_buy_quantity', ULONG, None),
+        ('total_sell_quantity', ULONG, None),
+        ('atp', UINT, None),
+        ('exchange_time_stamp', UINT, None),
+        ('open', UINT, None),
+        ('high', UINT, None),
+        ('low', UINT, None),
+        ('close', UINT, None),
+        ('yearly_high', UINT, None),
+        ('yearly_low', UINT, None),
+    ),
+    WsFrameMode.COMPACT_MARKETDATA: (
+        ('exchange', UCHAR, None),
+        ('token', UINT, None),
+        ('ltp', UINT, None),
+        ('change', UINT, None),
+        ('exchange_time_stamp', UINT, None),
+        ('volume', UINT, None),
+    ),
+    WsFrameMode.SNAPQUOTE: (
+        ('exchange', UCHAR, None),
+        ('token', UINT, None),
+        ('buyers', UINT, DEPTH),
+        ('bid_prices', UINT, DEPTH),
+        ('bid_quantities', UINT, DEPTH),
+        ('sellers', UINT, DEPTH),
+        ('ask_prices', UINT, DEPTH),
+        ('ask_quantities', UINT, DEPTH),
+        ('exchange_time_stamp', UINT, None),
+    ),
+    WsFrameMode.FULL_SNAPQUOTE: (
+        ('exchange', UCHAR, None),
+        ('token', UINT, None),
+        ('buyers', UINT, DEPTH),
+        ('bid_prices', UINT, DEPTH),
+        ('bid_quantities', UINT, DEPTH),
+        ('sellers', UINT, DEPTH),
+        ('ask_prices', UINT, DEPTH),
+        ('ask_quantities', UINT, DEPTH),
+        ('atp', UINT, None),
+        ('open', UINT, None),
+        ('high', UINT, None),
+        ('low', UINT, None),
+        ('close', UINT, None),
+        ('total_buy_quantity', ULONG, None),
+        ('total_sell_quantity', ULONG, None),
+        ('volume', UINT, None),
+    ),
+    WsFrameMode.DPR: (
+        ('exchange', UCHAR, None),
+        ('token', UINT, None),
+        ('exchange_time_stamp', UINT, None),
+        ('high', UINT, None),
+        ('low', UINT, None),
+    ),
+    WsFrameMode.OI: (
+        ('exchange', UCHAR, None),
+        ('token', UINT, None),
+        ('current_open_interest', UCHAR, None),
+        ('initial_open_interest', UCHAR, None),
+        ('exchange_time_stamp', UINT, None),
+    ),
+}
+
+
+class FrameLayout(object):
+    """ Precompiled layout of a fixed size frame payload """
+
+    __slots__ = ('mode', 'fields', 'names', 'struct', 'size', '_arrays')
+
+    def __init__(self, mode, fields):
+        self.mode = mode
+        self.fields = fields
+        self.names = tuple(name for name, _, _ in fields)
+        fmt = '>'
+        arrays = []
+        index = 0
+        for name, code, count in fields:
+            if count is None:
+                fmt += code
+                arrays.append((name, index, None))
+                index += 1
+            else:
+                fmt += f'{count}{code}'
+                arrays.append((name, index, index + count))
+                index += count
+        self.struct = struct.Struct(fmt)
+        self.size = self.struct.size
+        # plain layouts are decoded with a single zip, no regrouping needed
+        self._arrays = tuple(arrays) if len(arrays) != index else None
+
+    def unpack(self, buffer, offset=1):
+        """ unpack the flat tuple of values of a frame, no copies are made """
+        return self.struct.unpack_from(buffer, offset)
+
+    def decode(self, buffer, offset=1):
+        """ decode a frame payload into a dictionary """
+        values = self.struct.unpack_from(buffer, offset)
+        if self._arrays is None:
+            return dict(zip(self.names, values))
+        result = {}
+        for name, start, end in self._arrays:
+            result[name] = values[start] if end is None else list(values[start:end])
+        return result
+
+
+LAYOUTS = {mode: FrameLayout(mode, fields)
+           for mode, fields in FRAME_FIELDS.items()}
+
+_EXCHANGE_LENGTH = struct.Struct('>BH')
+_LENGTH = struct.Struct('>H')
+_TIME_STAMP = struct.Struct('>I')
+
+
+def _read_string(view, offset, length):
+    # protlib CString drops everything after the first null byte
+    value = bytes(view[offset:offset + length])
+    if length > len(value):
+        raise struct.error(
+            f'unpack requires a buffer of at least {offset + length} bytes')
+    return value.split(b'\0', 1)[0]
+
+
+def decode_market_status(buffer, offset=1):
+    """ decode a variable length market status frame """
+    view = memoryview(buffer)
+    exchange, length_of_market_type = _EXCHANGE_LENGTH.unpack_from(view, offset)
+    offset += _EXCHANGE_LENGTH.size
+    market_type = _read_string(view, offset, length_of_market_type)
+    offset += length_of_market_type
+    length_of_status, = _LENGTH.unpack_from(view, offset)
+    offset += _LENGTH.size
+    status = _read_string(view, offset, length_of_status)
+    return {'exchange': exchange,
+            'length_of_market_type': length_of_market_type,
+            'market_type': market_type,
+            'length_of_status': length_of_status,
+            'status': status}
+
+
+def decode_exchange_message(buffer, offset=1):
+    """ decode a variable length exchange message frame """
+    view = memoryview(buffer)
+    exchange, length = _EXCHANGE_LENGTH.unpack_from(view, offset)
+    offset += _EXCHANGE_LENGTH.size
+    message = _read_string(view, offset, length)
+    offset += length
+    exchange_time_stamp, = _TIME_STAMP.unpack_from(view, offset)
+    return {'exchange': exchange,
+            'length': length,
+            'message': message,
+            'exchange_time_stamp': exchange_time_stamp}
+
+
+_DECODERS = {mode: layout.decode for mode, layout in LAYOUTS.items()}
+_DECODERS[WsFrameMode.MARKET_STATUS] = decode_market_status
+_DECODERS[WsFrameMode.EXCHANGE_MESSAGES] = decode_exchange_message
+
+
+def decode_frame(message):
+    """ decode a raw websocket frame, returns a tuple of (mode, dictionary)
+        the dictionary is None for frame modes which are not supported
+    """
+    mode = message[0]
+    decoder = _DECODERS.get(mode)
+    if decoder is None:
+        return mode, None
+    return mode, decoder(message)
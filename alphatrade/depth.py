@@ -0,0 +1,219 @@
+# -*- coding: utf-8 -*-
+"""
+    depth.py
+
+    Five level order books of many tokens in preallocated NumPy arrays, one
+    row per (exchange code, token) and one column per level. SNAPQUOTE and
+    FULL_SNAPQUOTE ticks, or batches of them, overwrite their row in place,
+    and spread, mid, microprice, imbalance and cumulative depth are worked
+    out for every token, or a chosen set of rows, in one array operation.
+
+    :license: see LICENSE for details.
+"""
+import threading
+
+import numpy as np
+
+from alphatrade.batch import rupee_prices
+from alphatrade.decoder import DEPTH, WsFrameMode
+from alphatrade.ticks import EXCHANGE_NAMES, PRICE_MULTIPLIERS
+
+DEPTH_MODES = frozenset((WsFrameMode.SNAPQUOTE, WsFrameMode.FULL_SNAPQUOTE))
+_NAN = float('nan')
+
+
+class DepthBook(object):
+    """ Latest depth of every token, prices in rupees and NaN on empty levels
+
+        The arrays `bid_prices`, `bid_quantities`, `bid_orders` and their ask
+        counterparts are (capacity, levels), rows past `len(book)` are unused.
+        They are reallocated with twice the rows when full, so hold on to
+        `rows()` / `keys()` rather than to the arrays themselves
+    """
+
+    def __init__(self, capacity=1024, levels=DEPTH):
+        self.levels = levels
+        self.__lock = threading.Lock()
+        self.__rows = {}
+        self.__allocate(capacity)
+
+    def __allocate(self, capacity):
+        levels = self.levels
+        previous = getattr(self, 'exchange_codes', None)
+        arrays = {'exchange_codes': np.zeros(capacity, dtype='u1'),
+                  'tokens': np.zeros(capacity, dtype='u4'),
+                  'exchange_time_stamps': np.zeros(capacity, dtype='u4'),
+                  'updated_at': np.zeros(capacity, dtype='f8'),
+                  'bid_prices': np.full((capacity, levels), np.nan),
+                  'ask_prices': np.full((capacity, levels), np.nan),
+                  'bid_quantities': np.zeros((capacity, levels), dtype='i8'),
+                  'ask_quantities': np.zeros((capacity, levels), dtype='i8'),
+                  'bid_orders': np.zeros((capacity, levels), dtype='i8'),
+                  'ask_orders': np.zeros((capacity, levels), dtype='i8')}
+        size = len(self.__rows)
+        for name, array in arrays.items():
+            if previous is not None:
+                array[:size] = getattr(self, name)[:size]
+            setattr(self, name, array)
+        self.capacity = capacity
+
+    def __row(self, exchange_code, token):
+        # called with the lock held
+        key = (exchange_code, token)
+        row = self.__rows.get(key)
+        if row is None:
+            row = len(self.__rows)
+            if row == self.capacity:
+                self.__allocate(self.capacity * 2)
+            self.__rows[key] = row
+            self.exchange_codes[row] = exchange_code
+            self.tokens[row] = token
+        return row
+
+    def update(self, tick, received_at=None):
+        """ overwrite the book of a SNAPQUOTE or FULL_SNAPQUOTE tick, other
+            ticks are ignored
+        """
+        if tick.mode not in DEPTH_MODES:
+            return
+        multiplier = PRICE_MULTIPLIERS[tick.exchange_code]
+        levels = self.levels
+        with self.__lock:
+            row = self.__row(tick.exchange_code, tick.token)
+            bid_quantities = tick.bid_quantities[:levels]
+            ask_quantities = tick.ask_quantities[:levels]
+            # an empty level is sent as price 0 and quantity 0
+            self.bid_prices[row] = [price / multiplier if quantity else _NAN for price, quantity
+                                    in zip(tick.raw_bid_prices, bid_quantities)]
+            self.ask_prices[row] = [price / multiplier if quantity else _NAN for price, quantity
+                                    in zip(tick.raw_ask_prices, ask_quantities)]
+            self.bid_quantities[row] = bid_quantities
+            self.ask_quantities[row] = ask_quantities
+            self.bid_orders[row] = tick.buyers[:levels]
+            self.ask_orders[row] = tick.sellers[:levels]
+            time_stamp = getattr(tick, 'exchange_time_stamp', None)
+            if time_stamp is not None:
+                self.exchange_time_stamps[row] = time_stamp
+            if received_at is not None:
+                self.updated_at[row] = received_at
+
+    def update_batch(self, ticks, received_at=None):
+        """ overwrite the books of a structured array of SNAPQUOTE or
+            FULL_SNAPQUOTE ticks as delivered to ticks_batch_callback, scaled
+            or integer prices, the last tick of a token wins
+        """
+        if not len(ticks):
+            return
+        levels = self.levels
+        with self.__lock:
+            row = self.__row
+            rows = np.fromiter((row(int(code), int(token))
+                                for code, token in zip(ticks['exchange'], ticks['token'])),
+                               dtype=np.intp, count=len(ticks))
+            bid_quantities = ticks['bid_quantities'][:, :levels]
+            ask_quantities = ticks['ask_quantities'][:, :levels]
+            self.bid_prices[rows] = np.where(bid_quantities > 0,
+                                             rupee_prices(ticks, 'bid_prices')[:, :levels], np.nan)
+            self.ask_prices[rows] = np.where(ask_quantities > 0,
+                                             rupee_prices(ticks, 'ask_prices')[:, :levels], np.nan)
+            self.bid_quantities[rows] = bid_quantities
+            self.ask_quantities[rows] = ask_quantities
+            self.bid_orders[rows] = ticks['buyers'][:, :levels]
+            self.ask_orders[rows] = ticks['sellers'][:, :levels]
+            if 'exchange_time_stamp' in ticks.dtype.names:
+                self.exchange_time_stamps[rows] = ticks['exchange_time_stamp']
+            if received_at is not None:
+                self.updated_at[rows] = received_at
+
+    def clear(self):
+        with self.__lock:
+            self.__rows = {}
+            self.__allocate(self.capacity)
+
+    def __len__(self):
+        return len(self.__rows)
+
+    def __contains__(self, key):
+        return key in self.__rows
+
+    def keys(self):
+        """ (exchange code, token) of every row, in row order """
+        with self.__lock:
+            return list(self.__rows)
+
+    def rows(self, keys):
+        """ row indices of a list of (exchange code, token), -1 for tokens
+            without a book yet
+        """
+        rows = self.__rows
+        return np.array([rows.get(key, -1) for key in keys], dtype=np.intp)
+
+    def book(self, exchange_code, token):
+        """ dictionary of the depth of a token, None without a book """
+        row = self.__rows.get((exchange_code, token))
+        if row is None:
+            return None
+        with self.__lock:
+            return {'exchange': EXCHANGE_NAMES[exchange_code],
+                    'token': token,
+                    'bid_prices': self.bid_prices[row].tolist(),
+                    'bid_quantities': self.bid_quantities[row].tolist(),
+                    'bid_orders': self.bid_orders[row].tolist(),
+                    'ask_prices': self.ask_prices[row].tolist(),
+                    'ask_quantities': self.ask_quantities[row].tolist(),
+                    'ask_orders': self.ask_orders[row].tolist(),
+                    'exchange_time_stamp': int(self.exchange_time_stamps[row])}
+
+    def __select(self, rows, *names):
+        # copies of the requested arrays for rows (None for every token), rows
+        # of -1 come back as empty books
+        with self.__lock:
+            size = len(self.__rows)
+            if rows is None:
+                return [getattr(self, name)[:size].copy() for name in names]
+            rows = np.asarray(rows, dtype=np.intp)
+            missing = rows < 0
+            selected = [getattr(self, name)[rows] for name in names]
+        if missing.any():
+            for array in selected:
+                array[missing] = np.nan if array.dtype.kind == 'f' else 0
+        return selected
+
+    def best(self, rows=None):
+        """ (best bid, best ask, best bid quantity, best ask quantity) arrays """
+        bid_prices, ask_prices, bid_quantities, ask_quantities = self.__select(
+            rows, 'bid_prices', 'ask_prices', 'bid_quantities', 'ask_quantities')
+        return bid_prices[:, 0], ask_prices[:, 0], bid_quantities[:, 0], ask_quantities[:, 0]
+
+    def spread(self, rows=None):
+        """ best ask - best bid, NaN when a side is empty """
+        bid, ask, _, _ = self.best(rows)
+        return ask - bid
+
+    def mid(self, rows=None):
+        bid, ask, _, _ = self.best(rows)
+        return (bid + ask) / 2
+
+    def microprice(self, rows=None):
+        """ mid weighted by the quantity on the opposite side of the best level """
+        bid, ask, bid_quantity, ask_quantity = self.best(rows)
+        total = (bid_quantity + ask_quantity).astype('f8')
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return (bid * ask_quantity + ask * bid_quantity) / total
+
+    def imbalance(self, rows=None, levels=None):
+        """ (bid quantity - ask quantity) / (bid quantity + ask quantity) over the
+            first `levels` levels, between -1 (all asks) and 1 (all bids)
+        """
+        bid_quantities, ask_quantities = self.__select(rows, 'bid_quantities', 'ask_quantities')
+        bid = bid_quantities[:, :levels].sum(axis=1)
+        ask = ask_quantities[:, :levels].sum(axis=1)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return (bid - ask) / (bid + ask).astype('f8')
+
+    def cumulative_depth(self, rows=None, side='bid'):
+        """ (rows, levels) running total of the quantity from the best level out """
+        if side not in ('bid', 'ask'):
+            raise ValueError("side should be 'bid' or 'ask'")
+        quantities, = self.__select(rows, f'{side}_quantities')
+        return np.cumsum(quantities, axis=1)
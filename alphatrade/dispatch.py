@@ -0,0 +1,208 @@
+# -*- coding: utf-8 -*-
+"""
+    dispatch.py
+
+    Decouples the websocket receive thread from user callbacks. Messages are
+    put in bounded ring buffers and a pool of dispatcher threads calls the
+    callbacks. Messages carrying the same key (ticks of one token) always go
+    to the same dispatcher thread, so they are delivered in order.
+
+    :license: see LICENSE for details.
+"""
+from collections import deque
+import enum
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class OverflowPolicy(enum.Enum):
+    """ what happens when a full ring buffer receives another message
+
+        BLOCK waits for room, DROP_OLDEST drops the oldest message. CONFLATE
+        replaces the queued tick of the same token with the new one, or drops
+        the older ticks of tokens queued more than once, and only drops the
+        oldest message when every queued tick is of a distinct token. Below
+        the size of the ring buffer every message is delivered
+    """
+    BLOCK = 'block'
+    DROP_OLDEST = 'drop_oldest'
+    CONFLATE = 'conflate'
+
+
+class _DispatchQueue(object):
+    """ Ring buffer feeding one dispatcher thread """
+
+    def __init__(self, maxsize, policy):
+        self.maxsize = maxsize
+        self.policy = policy
+        self.entries = deque()
+        # key -> [callback, message] of the newest queued message of a key,
+        # stale counts the queued messages superseded by a newer one
+        self.pending = {}
+        self.stale = 0
+        self.lock = threading.Lock()
+        self.not_empty = threading.Condition(self.lock)
+        self.not_full = threading.Condition(self.lock)
+        self.stopped = False
+        self.enqueued = 0
+        self.dispatched = 0
+        self.dropped = 0
+        self.conflated = 0
+        self.errors = 0
+        self.max_depth = 0
+
+    def put(self, callback, message, key):
+        with self.lock:
+            if self.policy is not OverflowPolicy.CONFLATE:
+                key = None
+            if len(self.entries) >= self.maxsize:
+                if self.policy is OverflowPolicy.BLOCK:
+                    while len(self.entries) >= self.maxsize and not self.stopped:
+                        self.not_full.wait()
+                    if self.stopped:
+                        self.dropped += 1
+                        return
+                else:
+                    if key is not None:
+                        entry = self.pending.get(key)
+                        if entry is not None and entry[0] is callback:
+                            # replace the queued message in place, keeps its position
+                            entry[1] = message
+                            self.conflated += 1
+                            return
+                    if self.stale:
+                        self.__compact()
+                    if len(self.entries) >= self.maxsize:
+                        self.__forget(*self.entries.popleft())
+                        self.dropped += 1
+            entry = [callback, message]
+            if key is not None:
+                if key in self.pending:
+                    self.stale += 1
+                self.pending[key] = entry
+            self.entries.append((key, entry))
+            self.enqueued += 1
+            if len(self.entries) > self.max_depth:
+                self.max_depth = len(self.entries)
+            self.not_empty.notify()
+
+    def get(self):
+        """ next [callback, message] or None once stopped and drained """
+        with self.lock:
+            while not self.entries:
+                if self.stopped:
+                    return None
+                self.not_empty.wait()
+            key, entry = self.entries.popleft()
+            self.__forget(key, entry)
+            self.not_full.notify()
+            return entry
+
+    def __forget(self, key, entry):
+        # an entry left the ring buffer
+        if key is None:
+            return
+        if self.pending.get(key) is entry:
+            del self.pending[key]
+        else:
+            self.stale -= 1
+
+    def __compact(self):
+        # drop the messages superseded by a newer one of the same key
+        pending = self.pending
+        entries = deque((key, entry) for key, entry in self.entries
+                        if key is None or pending.get(key) is entry)
+        self.conflated += len(self.entries) - len(entries)
+        self.entries = entries
+        self.stale = 0
+
+    def stop(self):
+        with self.lock:
+            self.stopped = True
+            self.not_empty.notify_all()
+            self.not_full.notify_all()
+
+
+class TickDispatcher(object):
+    """ Calls callbacks on `threads` dispatcher threads, each with its own
+        ring buffer of `maxsize` messages handled according to `policy`
+    """
+
+    def __init__(self, maxsize=10000, threads=1, policy=OverflowPolicy.BLOCK, on_error=None):
+        if type(policy) is not OverflowPolicy:
+            raise TypeError(
+                "Required parameter policy not of type OverflowPolicy")
+        if maxsize <= 0:
+            raise ValueError('maxsize should be greater than 0')
+        if threads <= 0:
+            raise ValueError('threads should be greater than 0')
+        self.__queues = [_DispatchQueue(maxsize, policy) for _ in range(threads)]
+        self.__policy = policy
+        self.__on_error = on_error
+        self.__threads = []
+
+    def put(self, callback, message, key=None):
+        """ queue a call of callback(message), messages with the same key are
+            delivered in order and conflated by the CONFLATE policy once the
+            ring buffer is full
+        """
+        queues = self.__queues
+        queue = queues[hash(key) % len(queues)] if key is not None else queues[0]
+        queue.put(callback, message, key)
+
+    def __run(self, queue):
+        while True:
+            entry = queue.get()
+            if entry is None:
+                return
+            callback, message = entry
+            try:
+                callback(message)
+            except Exception as exp:
+                with queue.lock:
+                    queue.errors += 1
+                logger.warning(f"dispatched callback ended in exception, {exp}")
+                if self.__on_error is not None:
+                    self.__on_error(exp)
+            with queue.lock:
+                queue.dispatched += 1
+
+    def start(self):
+        """ start the dispatcher threads """
+        if self.__threads:
+            return
+        for queue in self.__queues:
+            queue.stopped = False
+            th = threading.Thread(target=self.__run, args=(queue,))
+            th.daemon = True
+            th.start()
+            self.__threads.append(th)
+
+    def stop(self, timeout=None):
+        """ deliver what is queued and stop the dispatcher threads """
+        for queue in self.__queues:
+            queue.stop()
+        for th in self.__threads:
+            th.join(timeout)
+        self.__threads = []
+
+    def stats(self):
+        """ counters summed over all ring buffers """
+        stats = {'policy': self.__policy.value,
+                 'threads': len(self.__queues),
+                 'depth': 0,
+                 'max_depth': 0,
+                 'enqueued': 0,
+                 'dispatched': 0,
+                 'dropped': 0,
+                 'conflated': 0,
+                 'errors': 0}
+        for queue in self.__queues:
+            with queue.lock:
+                stats['depth'] += len(queue.entries)
+                stats['max_depth'] = max(stats['max_depth'], queue.max_depth)
+                for name in ('enqueued', 'dispatched', 'dropped', 'conflated', 'errors'):
+                    stats[name] += getattr(queue, name)
+        return stats
@@ -0,0 +1,340 @@
+# -*- coding: utf-8 -*-
+"""
+    instruments.py
+
+    Master contracts of an exchange as columns. Tokens, expiries (as date
+    ordinals) and lot sizes are NumPy integer arrays, symbols a fixed width
+    byte array, and the exchange, company name and underlying of every
+    contract a code into a list of distinct strings, so an exchange of a
+    hundred thousand contracts takes a few megabytes instead of a few
+    hundred thousand Python objects. `Instrument` tuples are only built when
+    a contract is looked up.
+
+    Searches by underlying go through an index of the distinct underlyings:
+    a dictionary of the normalised (lower case) names for exact matches, the
+    sorted names for prefixes and a suffix array of the names, built with the
+    table on the loading thread, for matches anywhere in the name. Matching names
+    give their contracts through the rows grouped by underlying, so a query
+    never looks at every contract.
+
+    :license: see LICENSE for details.
+"""
+from array import array
+from bisect import bisect_left
+from collections import namedtuple
+from collections.abc import Mapping
+from datetime import date
+import difflib
+import functools
+
+import numpy as np
+
+Instrument = namedtuple('Instrument', ['exchange', 'token', 'symbol',
+                                       'name', 'expiry', 'lot_size'])
+
+# expiry ordinal of contracts without an expiry, lot size of contracts without
+# a lot size
+NO_EXPIRY = 0
+NO_LOT_SIZE = -1
+
+MATCHES = ('contains', 'prefix', 'exact', 'fuzzy')
+# fuzzy searches return the contracts of up to this many underlyings at least
+# this similar to the query, by difflib's ratio
+FUZZY_MATCHES = 5
+FUZZY_CUTOFF = 0.6
+# above this many matching underlyings their rows are picked with a mask of
+# the whole table rather than slice by slice
+_SLICED_UNDERLYINGS = 64
+
+
+@functools.lru_cache(maxsize=4096)
+def _expiry_date(ordinal):
+    return None if ordinal == NO_EXPIRY else date.fromordinal(ordinal)
+
+
+def _intern(values, codes, value):
+    # code of value in the list of distinct values
+    code = codes.get(value)
+    if code is None:
+        code = codes[value] = len(values)
+        values.append(value)
+    return code
+
+
+class InstrumentTable(Mapping):
+    """ Contracts of an exchange in columns, a read-only mapping of symbol to
+        Instrument in download order
+
+        `tokens`, `symbols` (utf-8 bytes), `expiries` (date ordinals,
+        NO_EXPIRY without one), `lot_sizes` (NO_LOT_SIZE without one) and
+        `exchange_codes`, `name_codes`, `underlying_codes` into the lists
+        `exchanges`, `names` and `underlyings` are one row per contract. A
+        token listed twice keeps its first row and its last values
+    """
+
+    def __init__(self, tokens, symbols, expiries, lot_sizes, exchange_codes, exchanges,
+                 name_codes, names, underlying_codes, underlyings):
+        self.tokens = tokens
+        self.symbols = symbols
+        self.expiries = expiries
+        self.lot_sizes = lot_sizes
+        self.exchange_codes = exchange_codes
+        self.exchanges = exchanges
+        self.name_codes = name_codes
+        self.names = names
+        self.underlying_codes = underlying_codes
+        self.underlyings = underlyings
+        # tokens are unique, symbols are looked up through their sort order
+        # rather than a sorted copy
+        self.__token_order = np.argsort(tokens, kind='stable').astype('i4')
+        self.__sorted_tokens = tokens[self.__token_order]
+        self.__symbol_order = np.argsort(symbols, kind='stable').astype('i4')
+        # a symbol listed twice maps to its last row, like a dict would, the
+        # rows of the mapping are all rows unless that happens
+        sorted_symbols = symbols[self.__symbol_order]
+        last = np.ones(len(symbols), dtype=bool)
+        last[:-1] = sorted_symbols[1:] != sorted_symbols[:-1]
+        self.__symbol_rows = None if last.all() else np.sort(self.__symbol_order[last])
+        # rows of every underlying code are __underlying_rows[offsets[code]:
+        # offsets[code + 1]], in row order
+        self.__underlying_rows = np.argsort(underlying_codes, kind='stable').astype('i4')
+        self.__underlying_offsets = np.zeros(len(underlyings) + 1, dtype='i8')
+        np.cumsum(np.bincount(underlying_codes, minlength=len(underlyings)),
+                  out=self.__underlying_offsets[1:])
+        # normalised name -> codes, names differing in case only share one
+        self.__normalised = {}
+        for code, name in enumerate(underlyings):
+            self.__normalised.setdefault(name.lower(), []).append(code)
+        self.__names = sorted(self.__normalised)
+        # built here rather than on the first search, tables are built by the
+        # threads loading the master contracts
+        self.__suffixes = self.__suffix_array()
+
+    @classmethod
+    def from_rows(cls, rows):
+        """ table of (exchange, token, symbol, name, expiry date or None, lot
+            size or None) rows, as yielded by contracts.contract_rows
+        """
+        exchanges, names, underlyings = [], [], []
+        exchange_index, name_index, underlying_index = {}, {}, {}
+        row_by_token = {}
+        tokens, symbols, expiries, lot_sizes = [], [], [], []
+        exchange_codes, name_codes, underlying_codes = [], [], []
+        for exchange, token, symbol, name, expiry, lot_size in rows:
+            values = (token, symbol.encode('utf-8'),
+                      NO_EXPIRY if expiry is None else expiry.toordinal(),
+                      NO_LOT_SIZE if lot_size is None else lot_size,
+                      _intern(exchanges, exchange_index, exchange),
+                      _intern(names, name_index, name),
+                      _intern(underlyings, underlying_index, symbol.split(' ')[0]))
+            row = row_by_token.get(token)
+            if row is None:
+                row_by_token[token] = len(tokens)
+                for column, value in zip((tokens, symbols, expiries, lot_sizes, exchange_codes,
+                                          name_codes, underlying_codes), values):
+                    column.append(value)
+            else:
+                for column, value in zip((tokens, symbols, expiries, lot_sizes, exchange_codes,
+                                          name_codes, underlying_codes), values):
+                    column[row] = value
+        return cls(np.array(tokens, dtype='u4'),
+                   np.array(symbols, dtype='S') if symbols else np.empty(0, dtype='S1'),
+                   np.array(expiries, dtype='i4'),
+                   np.array(lot_sizes, dtype='i4'),
+                   np.array(exchange_codes, dtype='u1'), exchanges,
+                   np.array(name_codes, dtype='i4'), names,
+                   np.array(underlying_codes, dtype='i4'), underlyings)
+
+    @property
+    def nbytes(self):
+        """ bytes taken by the columns and their indexes, the distinct strings
+            not included
+        """
+        return sum(array.nbytes for array in (
+            self.tokens, self.symbols, self.expiries, self.lot_sizes, self.exchange_codes,
+            self.name_codes, self.underlying_codes, self.__token_order, self.__sorted_tokens,
+            self.__symbol_order, self.__underlying_rows, self.__underlying_offsets) +
+            self.__suffixes +
+            (() if self.__symbol_rows is None else (self.__symbol_rows,)))
+
+    def row_of_token(self, token):
+        """ row of a token, -1 when the exchange doesn't list it """
+        sorted_tokens = self.__sorted_tokens
+        if not 0 <= token < 1 << 32:
+            return -1
+        position = sorted_tokens.searchsorted(token)
+        if position < len(sorted_tokens) and sorted_tokens[position] == token:
+            return int(self.__token_order[position])
+        return -1
+
+    def row_of_symbol(self, symbol):
+        """ row of a symbol, -1 when the exchange doesn't list it """
+        key = symbol.encode('utf-8')
+        order = self.__symbol_order
+        position = self.symbols.searchsorted(key, side='right', sorter=order) - 1
+        if position >= 0 and self.symbols[order[position]] == key:
+            return int(order[position])
+        return -1
+
+    def instrument(self, row):
+        """ Instrument of a row """
+        return Instrument(self.exchanges[self.exchange_codes[row]], int(self.tokens[row]),
+                          self.symbols[row].decode('utf-8'), self.names[self.name_codes[row]],
+                          _expiry_date(int(self.expiries[row])),
+                          None if self.lot_sizes[row] == NO_LOT_SIZE else int(self.lot_sizes[row]))
+
+    def instruments(self, rows=None):
+        """ list of the Instruments of an array of rows, all by default """
+        if rows is None:
+            rows = slice(None)
+        exchanges, names = self.exchanges, self.names
+        return list(map(Instrument._make, zip(
+            [exchanges[code] for code in self.exchange_codes[rows].tolist()],
+            self.tokens[rows].tolist(),
+            [symbol.decode('utf-8') for symbol in self.symbols[rows].tolist()],
+            [names[code] for code in self.name_codes[rows].tolist()],
+            map(_expiry_date, self.expiries[rows].tolist()),
+            [None if lot_size == NO_LOT_SIZE else lot_size for lot_size in self.lot_sizes[rows].tolist()])))
+
+    def by_token(self, token):
+        """ Instrument of a token, None when the exchange doesn't list it """
+        row = self.row_of_token(token)
+        return None if row < 0 else self.instrument(row)
+
+    def underlying_rows(self, underlying, match='contains'):
+        """ rows of the contracts whose underlying (the symbol up to the first
+            space) matches underlying, case insensitive, in row order
+
+            match is 'contains', 'prefix' or 'exact', or 'fuzzy' for the
+            underlyings most similar to underlying, best first. A list matches
+            any of its items in one pass, a row coming once per item it
+            matches (fuzzy gives the rows of every item in turn)
+        """
+        if match not in MATCHES:
+            raise ValueError(f"match should be one of {', '.join(MATCHES)}")
+        queries = underlying if isinstance(underlying, list) else [underlying]
+        if match == 'fuzzy':
+            return np.concatenate([self.__fuzzy_rows(query.lower()) for query in queries] +
+                                  [np.empty(0, dtype='i4')])
+        find = {'contains': self.__containing, 'prefix': self.__starting, 'exact': self.__exactly}[match]
+        # how many of the queries every distinct name matches
+        counts = {}
+        for query in queries:
+            for name in find(query.lower()):
+                counts[name] = counts.get(name, 0) + 1
+        return self.__rows_of_names(counts)
+
+    def __exactly(self, query):
+        return (query,) if query in self.__normalised else ()
+
+    def __starting(self, query):
+        names = self.__names
+        return names[bisect_left(names, query):bisect_left(names, query + '\U0010ffff')]
+
+    def __containing(self, query):
+        if not query:
+            return self.__names
+        name_indexes, offsets = self.__suffixes
+        names = self.__names
+        size = len(query)
+
+        def bound(after):
+            # first suffix starting with something greater than query, or not
+            # less with after=False
+            low, high = 0, len(offsets)
+            while low < high:
+                middle = (low + high) // 2
+                offset = offsets[middle]
+                prefix = names[name_indexes[middle]][offset:offset + size]
+                if prefix < query or after and prefix == query:
+                    low = middle + 1
+                else:
+                    high = middle
+            return low
+
+        return [names[index] for index in set(name_indexes[bound(False):bound(True)])]
+
+    def __suffix_array(self):
+        # every suffix of every distinct name, sorted, as (name index, offset)
+        # pairs
+        names = self.__names
+        suffixes = [(index, offset) for index, name in enumerate(names) for offset in range(len(name))]
+        suffixes.sort(key=lambda suffix: names[suffix[0]][suffix[1]:])
+        return array('i', [index for index, _ in suffixes]), array('i', [offset for _, offset in suffixes])
+
+    def __fuzzy_rows(self, query):
+        ranked = difflib.get_close_matches(query, self.__names, FUZZY_MATCHES, FUZZY_CUTOFF)
+        return np.concatenate([self.__rows_of_names({name: 1}) for name in ranked] +
+                              [np.empty(0, dtype='i4')])
+
+    def __rows_of_names(self, counts):
+        # rows of the underlyings of {normalised name: count}, every row
+        # repeated count times
+        codes = [(code, count) for name, count in counts.items() for code in self.__normalised[name]]
+        if not codes:
+            return np.empty(0, dtype='i4')
+        if len(codes) > _SLICED_UNDERLYINGS:
+            per_code = np.zeros(len(self.underlyings), dtype='i4')
+            for code, count in codes:
+                per_code[code] = count
+            repeats = per_code[self.underlying_codes]
+            rows = np.flatnonzero(repeats).astype('i4')
+            repeats = repeats[rows]
+        else:
+            offsets = self.__underlying_offsets
+            rows = np.concatenate([self.__underlying_rows[offsets[code]:offsets[code + 1]]
+                                   for code, _ in codes])
+            if len(codes) > 1:
+                rows.sort()
+            if all(count == 1 for _, count in codes):
+                return rows
+            per_code = dict(codes)
+            repeats = np.array([per_code[code] for code in self.underlying_codes[rows].tolist()])
+        return rows if (repeats == 1).all() else np.repeat(rows, repeats)
+
+    def contract_rows(self):
+        """ the table as rows of contracts.contract_rows, for ContractCache """
+        return map(tuple, self.instruments())
+
+    def to_frame(self):
+        """ pandas DataFrame of the table, one row per contract """
+        import pandas as pd
+        expiries = (self.expiries.astype('i8') - date(1970, 1, 1).toordinal()).astype('datetime64[D]')
+        expiries[self.expiries == NO_EXPIRY] = np.datetime64('NaT')
+        lot_sizes = pd.array(self.lot_sizes, dtype='Int64')
+        lot_sizes[self.lot_sizes == NO_LOT_SIZE] = pd.NA
+        return pd.DataFrame({
+            'exchange': pd.Categorical.from_codes(self.exchange_codes, self.exchanges),
+            'token': self.tokens,
+            'symbol': np.char.decode(self.symbols, 'utf-8').astype(object),
+            'name': pd.Categorical.from_codes(self.name_codes, self.names),
+            'underlying': pd.Categorical.from_codes(self.underlying_codes, self.underlyings),
+            'expiry': expiries,
+            'lot_size': lot_sizes})
+
+    # Mapping of symbol to Instrument, like the OrderedDict it replaces
+
+    def __getitem__(self, symbol):
+        row = self.row_of_symbol(symbol)
+        if row < 0:
+            raise KeyError(symbol)
+        return self.instrument(row)
+
+    def __contains__(self, symbol):
+        return isinstance(symbol, str) and self.row_of_symbol(symbol) >= 0
+
+    def __iter__(self):
+        symbols = self.symbols if self.__symbol_rows is None else self.symbols[self.__symbol_rows]
+        return (symbol.decode('utf-8') for symbol in symbols.tolist())
+
+    def __len__(self):
+        return len(self.symbols if self.__symbol_rows is None else self.__symbol_rows)
+
+    def values(self):
+        return self.instruments(self.__symbol_rows)
+
+    def items(self):
+        return [(instrument.symbol, instrument) for instrument in self.values()]
+
+    def __repr__(self):
+        return f'<InstrumentTable of {len(self.tokens)} contracts>'
@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+"""
+    messages.py
+
+    Bounded store for market status and exchange messages. The newest
+    `maxlen` messages are kept overall and per exchange together with their
+    receive time, the latest message of each exchange is indexed, and every
+    message can optionally be appended to a JSON lines file so nothing is
+    lost when the rings wrap in long running processes.
+
+    :license: see LICENSE for details.
+"""
+from collections import deque
+import json
+import threading
+import time
+
+
+class MessageStore(object):
+    """ Ring buffer of message dictionaries, indexed by exchange and receive time """
+
+    def __init__(self, maxlen=1000, spill_path=None):
+        self.__lock = threading.Lock()
+        self.__messages = deque(maxlen=maxlen)
+        self.__by_exchange = {}
+        self.__latest = {}
+        self.__spill = None
+        self.maxlen = maxlen
+        self.total = 0
+        self.set_spill_path(spill_path)
+
+    def configure(self, maxlen=None, spill_path=None):
+        """ change the ring size, keeping the newest messages, and the spill file """
+        with self.__lock:
+            if maxlen is not None and maxlen != self.maxlen:
+                self.maxlen = maxlen
+                self.__messages = deque(self.__messages, maxlen=maxlen)
+                self.__by_exchange = {exchange: deque(messages, maxlen=maxlen)
+                                      for exchange, messages in self.__by_exchange.items()}
+        self.set_spill_path(spill_path)
+
+    def set_spill_path(self, spill_path):
+        """ append every message from now on as a JSON line to spill_path,
+            None stops spilling
+        """
+        with self.__lock:
+            if self.__spill is not None:
+                self.__spill.close()
+                self.__spill = None
+            if spill_path is not None:
+                self.__spill = open(spill_path, 'a', encoding='utf-8')
+
+    def append(self, message, received_at=None):
+        if received_at is None:
+            received_at = time.time()
+        entry = (received_at, message)
+        exchange = message.get('exchange')
+        with self.__lock:
+            self.__messages.append(entry)
+            messages = self.__by_exchange.get(exchange)
+            if messages is None:
+                messages = self.__by_exchange[exchange] = deque(maxlen=self.maxlen)
+            messages.append(entry)
+            self.__latest[exchange] = entry
+            self.total += 1
+            if self.__spill is not None:
+                self.__spill.write(json.dumps({'received_at': received_at, **message},
+                                              default=_json_default) + '\n')
+                self.__spill.flush()
+
+    def __len__(self):
+        return len(self.__messages)
+
+    def __iter__(self):
+        return iter(self.messages())
+
+    def messages(self, exchange=None, since=None):
+        """ messages oldest first, of an exchange and / or received after since
+            (epoch seconds)
+        """
+        with self.__lock:
+            entries = self.__messages if exchange is None else self.__by_exchange.get(exchange, ())
+            if since is None:
+                return [message for _, message in entries]
+            # newest first until since, then back in order
+            recent = []
+            for received_at, message in reversed(entries):
+                if received_at <= since:
+                    break
+                recent.append(message)
+        recent.reverse()
+        return recent
+
+    def latest(self, exchange=None):
+        """ latest message of an exchange, or {exchange: latest message} """
+        with self.__lock:
+            if exchange is not None:
+                entry = self.__latest.get(exchange)
+                return None if entry is None else entry[1]
+            return {exchange: message for exchange, (_, message) in self.__latest.items()}
+
+    def clear(self):
+        with self.__lock:
+            self.__messages.clear()
+            self.__by_exchange = {}
+            self.__latest = {}
+
+    def close(self):
+        self.set_spill_path(None)
+
+
+def _json_default(value):
+    if isinstance(value, bytes):
+        return value.decode('utf-8', 'replace')
+    return str(value)
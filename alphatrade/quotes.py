@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+"""
+    quotes.py
+
+    Latest value store fed by the live feed. The receive thread only swaps
+    the latest tick of a feed type into a per-token slot, which is a single
+    atomic assignment, so readers never take a lock. Quotes are composed from
+    the latest ticks when they are read.
+
+    :license: see LICENSE for details.
+"""
+from collections import namedtuple
+import itertools
+import time
+
+import numpy as np
+
+from alphatrade.decoder import WsFrameMode
+from alphatrade.ticks import EXCHANGE_NAMES
+
+Quote = namedtuple('Quote', ['exchange', 'token', 'ltp', 'volume',
+                             'best_bid_price', 'best_bid_quantity',
+                             'best_ask_price', 'best_ask_quantity',
+                             'open', 'high', 'low', 'close', 'atp',
+                             'open_interest',
+                             'bid_prices', 'bid_quantities', 'ask_prices', 'ask_quantities',
+                             'exchange_time_stamp', 'updated_at'])
+
+QUOTE_DTYPE = np.dtype([('exchange', 'u1'), ('token', 'u4'), ('ltp', 'f8'), ('volume', 'u8'),
+                        ('best_bid_price', 'f8'), ('best_bid_quantity', 'u8'),
+                        ('best_ask_price', 'f8'), ('best_ask_quantity', 'u8'),
+                        ('open', 'f8'), ('high', 'f8'), ('low', 'f8'), ('close', 'f8'),
+                        ('atp', 'f8'), ('open_interest', 'u8'),
+                        ('exchange_time_stamp', 'u4'), ('updated_at', 'f8')])
+
+# position of each feed type in the per-token slot list
+_SLOTS = {WsFrameMode.MARKETDATA: 0,
+          WsFrameMode.COMPACT_MARKETDATA: 1,
+          WsFrameMode.SNAPQUOTE: 2,
+          WsFrameMode.FULL_SNAPQUOTE: 3,
+          WsFrameMode.OI: 4}
+_NAN = float('nan')
+
+
+class QuoteStore(object):
+    """ Latest ticks per (exchange code, token), written by the feed and read
+        from any thread
+    """
+
+    def __init__(self):
+        self.__slots = {}
+        self.__sequence = itertools.count()
+
+    def update(self, tick):
+        """ keep tick as the latest of its feed type for its token """
+        index = _SLOTS.get(tick.mode)
+        if index is None:
+            return
+        key = (tick.exchange_code, tick.token)
+        slots = self.__slots.get(key)
+        if slots is None:
+            slots = self.__slots.setdefault(key, [None] * len(_SLOTS))
+        slots[index] = (next(self.__sequence), time.time(), tick)
+
+    def update_batch(self, mode, ticks):
+        """ keep the last row of every token of a structured array of ticks of
+            a mode, as delivered to ticks_batch_callback
+        """
+        index = _SLOTS.get(mode)
+        if index is None or not len(ticks):
+            return
+        now = time.time()
+        names = ticks.dtype.names
+        seen = set()
+        for record in reversed(ticks.tolist()):
+            key = (record[0], record[1])
+            if key in seen:
+                continue
+            seen.add(key)
+            slots = self.__slots.get(key)
+            if slots is None:
+                slots = self.__slots.setdefault(key, [None] * len(_SLOTS))
+            slots[index] = (next(self.__sequence), now, _BatchTick(mode, names, record))
+
+    def clear(self):
+        self.__slots = {}
+
+    def __len__(self):
+        return len(self.__slots)
+
+    def __contains__(self, key):
+        return key in self.__slots
+
+    def get_ltp(self, exchange_code, token):
+        """ last traded price or None if no tick was received yet """
+        slots = self.__slots.get((exchange_code, token))
+        if slots is None:
+            return None
+        market, compact = slots[0], slots[1]
+        if market is None and compact is None:
+            return None
+        if compact is None or (market is not None and market[0] > compact[0]):
+            return market[2].ltp
+        return compact[2].ltp
+
+    def get_quote(self, exchange_code, token):
+        """ Quote composed from the latest tick of every feed type, None if
+            no tick was received yet
+        """
+        slots = self.__slots.get((exchange_code, token))
+        if slots is None:
+            return None
+        return self.__compose(exchange_code, token, list(slots))
+
+    def get_quotes(self, keys):
+        """ structured array of QUOTE_DTYPE for a list of (exchange code, token),
+            prices of tokens without ticks are NaN
+        """
+        records = []
+        for exchange_code, token in keys:
+            slots = self.__slots.get((exchange_code, token))
+            if slots is None:
+                records.append((exchange_code, token, _NAN, 0, _NAN, 0, _NAN, 0,
+                                _NAN, _NAN, _NAN, _NAN, _NAN, 0, 0, _NAN))
+                continue
+            quote = self.__compose(exchange_code, token, list(slots))
+            records.append((exchange_code, token,
+                            _or_nan(quote.ltp), quote.volume or 0,
+                            _or_nan(quote.best_bid_price), quote.best_bid_quantity or 0,
+                            _or_nan(quote.best_ask_price), quote.best_ask_quantity or 0,
+                            _or_nan(quote.open), _or_nan(quote.high), _or_nan(quote.low),
+                            _or_nan(quote.close), _or_nan(quote.atp), quote.open_interest or 0,
+                            quote.exchange_time_stamp or 0, quote.updated_at))
+        return np.array(records, dtype=QUOTE_DTYPE)
+
+    @staticmethod
+    def __compose(exchange_code, token, slots):
+        market, compact, snap, full, oi = slots
+        values = dict.fromkeys(Quote._fields)
+        values['exchange'] = EXCHANGE_NAMES[exchange_code]
+        values['token'] = token
+        # oldest first, so fields carried by several feed types end up
+        # holding the value of the newest tick
+        for entry in sorted((e for e in slots if e is not None), key=lambda e: e[0]):
+            _, updated_at, tick = entry
+            values['updated_at'] = updated_at
+            if entry is oi:
+                values['open_interest'] = tick.current_open_interest
+            else:
+                values['exchange_time_stamp'] = getattr(
+                    tick, 'exchange_time_stamp', values['exchange_time_stamp'])
+            if entry is market or entry is compact:
+                values['ltp'] = tick.ltp
+                values['volume'] = tick.volume
+            if entry is market:
+                values['best_bid_price'] = tick.best_bid_price
+                values['best_bid_quantity'] = tick.best_bid_quantity
+                values['best_ask_price'] = tick.best_ask_price
+                values['best_ask_quantity'] = tick.best_ask_quantity
+            if entry is market or entry is full:
+                values['open'] = tick.open
+                values['high'] = tick.high
+                values['low'] = tick.low
+                values['close'] = tick.close
+                values['atp'] = tick.atp
+            if entry is full:
+                values['volume'] = tick.volume
+            if entry is snap or entry is full:
+                values['bid_prices'] = tick.bid_prices
+                values['bid_quantities'] = list(tick.bid_quantities)
+                values['ask_prices'] = tick.ask_prices
+                values['ask_quantities'] = list(tick.ask_quantities)
+                values['best_bid_price'] = values['bid_prices'][0]
+                values['best_bid_quantity'] = tick.bid_quantities[0]
+                values['best_ask_price'] = values['ask_prices'][0]
+                values['best_ask_quantity'] = tick.ask_quantities[0]
+        return Quote(**values)
+
+
+class _BatchTick(object):
+    """ a row of a tick batch read through the attributes of a Tick """
+    __slots__ = ('mode', '_values')
+
+    def __init__(self, mode, names, record):
+        self.mode = mode
+        self._values = {name: value.tolist() if isinstance(value, np.ndarray) else value
+                        for name, value in zip(names, record)}
+
+    def __getattr__(self, name):
+        try:
+            return self._values[name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+
+def _or_nan(value):
+    return _NAN if value is None else value
@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+"""
+    reconnect.py
+
+    Reconnect policy of the live feed and data-gap detection. The policy
+    retries quickly after a drop and backs off exponentially while the
+    endpoint stays down, with random jitter so many clients do not
+    reconnect in lockstep. `GapTracker` remembers the last exchange time
+    stamp of every token and reports, after a reconnect, the window each
+    token missed.
+
+    :license: see LICENSE for details.
+"""
+from collections import deque, namedtuple
+import enum
+import random
+
+from alphatrade.decoder import TICK_MODES
+from alphatrade.ticks import EXCHANGE_NAMES
+
+
+class ConnectionState(enum.Enum):
+    CONNECTED = 'connected'
+    DISCONNECTED = 'disconnected'
+    RECONNECTING = 'reconnecting'
+
+
+# attempt is the number of failed attempts so far, delay the seconds before
+# the next one and downtime the seconds since the connection was lost
+ConnectionEvent = namedtuple('ConnectionEvent', ['state', 'attempt', 'delay', 'downtime'])
+
+# last exchange time stamp of a token before a disconnect and the first after it
+Gap = namedtuple('Gap', ['exchange', 'token', 'instrument', 'last_before', 'first_after'])
+
+
+class ReconnectPolicy(object):
+    """ Exponential backoff with jitter
+
+        The n-th consecutive attempt waits initial_delay * multiplier ** n
+        seconds, at most max_delay, reduced by a random fraction of up to
+        `jitter`. The count of attempts starts over once a connection stayed
+        open for reset_after seconds, so a server accepting and dropping
+        connections right away is backed off too. After max_attempts
+        attempts (None for no limit) the feed stops reconnecting
+    """
+
+    def __init__(self, initial_delay=0.1, max_delay=30.0, multiplier=2.0, jitter=0.5,
+                 max_attempts=None, reset_after=5.0):
+        if initial_delay < 0 or max_delay < initial_delay:
+            raise ValueError('Delays should satisfy 0 <= initial_delay <= max_delay')
+        if not 0 <= jitter <= 1:
+            raise ValueError('jitter should be between 0 and 1')
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self.multiplier = multiplier
+        self.jitter = jitter
+        self.max_attempts = max_attempts
+        self.reset_after = reset_after
+        self.attempt = 0
+
+    def reset(self):
+        self.attempt = 0
+
+    def connection_lost(self, uptime):
+        """ a connection open for uptime seconds was lost """
+        if uptime >= self.reset_after:
+            self.reset()
+
+    def next_delay(self):
+        """ seconds to wait before the next attempt, None to give up """
+        if self.max_attempts is not None and self.attempt >= self.max_attempts:
+            return None
+        delay = min(self.max_delay, self.initial_delay * self.multiplier ** self.attempt)
+        self.attempt += 1
+        return delay * (1 - self.jitter * random.random())
+
+
+class GapTracker(object):
+    """ Last exchange time stamp per (exchange code, token), and the gaps
+        around a disconnect. Only market data ticks (TICK_MODES) count, DPR
+        and open interest records come too rarely to tell a gap
+    """
+
+    def __init__(self, history=10000):
+        self.__last = {}
+        self.__before = {}
+        self.gaps = deque(maxlen=history)
+
+    def update(self, tick):
+        """ record a tick, returns a Gap for the first tick of a token after a
+            reconnect, None otherwise
+        """
+        if tick.mode not in TICK_MODES:
+            return None
+        time_stamp = getattr(tick, 'exchange_time_stamp', None)
+        if not time_stamp:
+            return None
+        key = (tick.exchange_code, tick.token)
+        self.__last[key] = time_stamp
+        if self.__before:
+            last_before = self.__before.pop(key, None)
+            if last_before is not None:
+                gap = Gap(tick.exchange, tick.token, tick.instrument, last_before, time_stamp)
+                self.gaps.append(gap)
+                return gap
+        return None
+
+    def update_batch(self, mode, ticks):
+        """ record a structured array of ticks of mode as delivered to
+            ticks_batch_callback, returns the Gaps of the tokens back after a
+            reconnect, their instrument is None
+        """
+        gaps = []
+        if mode not in TICK_MODES or 'exchange_time_stamp' not in ticks.dtype.names:
+            return gaps
+        last = self.__last
+        before = self.__before
+        for exchange_code, token, time_stamp in zip(ticks['exchange'].tolist(),
+                                                    ticks['token'].tolist(),
+                                                    ticks['exchange_time_stamp'].tolist()):
+            if not time_stamp:
+                continue
+            key = (exchange_code, token)
+            last[key] = time_stamp
+            if before:
+                last_before = before.pop(key, None)
+                if last_before is not None:
+                    gap = Gap(EXCHANGE_NAMES[exchange_code], token, None, last_before, time_stamp)
+                    self.gaps.append(gap)
+                    gaps.append(gap)
+        return gaps
+
+    def disconnected(self):
+        """ the connection was lost, tokens seen so far are waiting for their
+            first tick after the reconnect
+        """
+        self.__before.update(self.__last)
+
+    def forget(self, keys):
+        """ drop the time stamps of (exchange code, token) keys, an
+            unsubscribed token is not waited for after a reconnect
+        """
+        for key in keys:
+            self.__last.pop(key, None)
+            self.__before.pop(key, None)
+
+    def pending(self):
+        """ {(exchange code, token): last exchange time stamp} of the tokens
+            without a tick since the reconnect
+        """
+        return dict(self.__before)
+
+    def clear(self):
+        self.__last = {}
+        self.__before = {}
+        self.gaps.clear()
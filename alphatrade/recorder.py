@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+"""
+    recorder.py
+
+    Raw websocket frame log. `FrameRecorder` appends every frame with its
+    receive time to a compact binary file, `FrameLog` memory-maps such a
+    file and `FrameReplayer` plays it back, in real time, scaled or as fast
+    as possible.
+
+    File layout: the 8 byte magic `MAGIC` followed by records of
+    (receive time as a big-endian double, frame length as a big-endian
+    unsigned int, frame bytes).
+
+    :license: see LICENSE for details.
+"""
+import mmap
+import struct
+import threading
+import time
+
+MAGIC = b'ATFRAME1'
+RECORD_HEADER = struct.Struct('>dI')
+
+
+class FrameRecorder(object):
+    """ Appends raw frames to a frame log, safe to call from several threads """
+
+    def __init__(self, path, buffering=1024 * 1024):
+        self.__file = open(path, 'ab', buffering=buffering)
+        if self.__file.tell() == 0:
+            self.__file.write(MAGIC)
+        self.__lock = threading.Lock()
+        self.frames = 0
+        self.bytes = 0
+
+    def record(self, message, received_at=None):
+        """ append a frame, received_at defaults to now """
+        if received_at is None:
+            received_at = time.time()
+        if isinstance(message, str):
+            message = message.encode('utf-8')
+        header = RECORD_HEADER.pack(received_at, len(message))
+        with self.__lock:
+            self.__file.write(header)
+            self.__file.write(message)
+            self.frames += 1
+            self.bytes += len(message)
+
+    def flush(self):
+        with self.__lock:
+            self.__file.flush()
+
+    def close(self):
+        with self.__lock:
+            if not self.__file.closed:
+                self.__file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class FrameLog(object):
+    """ Memory-mapped frame log, iterates (receive time, frame) without copying
+        the frames, each frame is a memoryview into the map
+    """
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self.__mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.__mmap[:len(MAGIC)] != MAGIC:
+            self.__mmap.close()
+            raise ValueError(f'{path} is not a frame log')
+        self.__view = memoryview(self.__mmap)
+
+    def __iter__(self):
+        view = self.__view
+        size = len(view)
+        offset = len(MAGIC)
+        unpack_from = RECORD_HEADER.unpack_from
+        header_size = RECORD_HEADER.size
+        while offset + header_size <= size:
+            received_at, length = unpack_from(view, offset)
+            offset += header_size
+            if offset + length > size:
+                # record cut short, the recorder was stopped while writing
+                return
+            yield received_at, view[offset:offset + length]
+            offset += length
+
+    def close(self):
+        try:
+            self.__view.release()
+            self.__mmap.close()
+        except BufferError:
+            # frames are still referenced, the map is closed once they are gone
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class FrameReplayer(object):
+    """ Plays a frame log back into `target`, a callable taking a frame """
+
+    def __init__(self, path):
+        self.__path = path
+
+    def replay(self, target, speed=1.0, copy=True):
+        """ feed every frame to target. speed 1.0 keeps the recorded pacing,
+            2.0 plays twice as fast and None (or 0) as fast as possible.
+            Frames are handed over as bytes, or as memoryviews into the map
+            with copy=False, which target should not keep. Returns a dictionary of replay statistics
+        """
+        if speed is not None and speed < 0:
+            raise ValueError('speed should not be negative')
+        frames = 0
+        total_bytes = 0
+        first_at = None
+        started = time.perf_counter()
+        with FrameLog(self.__path) as log:
+            for received_at, frame in log:
+                if speed:
+                    if first_at is None:
+                        first_at = received_at
+                    delay = (received_at - first_at) / speed - (time.perf_counter() - started)
+                    if delay > 0:
+                        time.sleep(delay)
+                target(bytes(frame) if copy else frame)
+                frames += 1
+                total_bytes += len(frame)
+                del frame
+        elapsed = time.perf_counter() - started
+        return {'frames': frames,
+                'bytes': total_bytes,
+                'seconds': elapsed,
+                'frames_per_second': frames / elapsed if elapsed else 0.0}
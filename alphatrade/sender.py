@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+"""
+    sender.py
+
+    Send path of the live feed. A single writer thread owns every write to
+    the websocket: queued messages, subscription changes and heartbeats. It
+    sleeps on a condition until the connection is open and there is work,
+    so nothing polls while idle and a subscription made right after connect
+    goes out at once. Pending subscription changes are coalesced into one
+    delta of the `SubscriptionManager`, heartbeats only run while connected.
+
+    :license: see LICENSE for details.
+"""
+from collections import deque
+import json
+import logging
+import threading
+import time
+
+import websocket
+
+logger = logging.getLogger(__name__)
+
+HEARTBEAT = json.dumps({"a": "h", "v": [], "m": ""})
+
+
+class WebSocketSender(object):
+    """ Writer thread of a websocket connection
+
+        on_open / on_close are called by the connection, send and
+        sync_subscriptions by anyone
+    """
+
+    def __init__(self, subscriptions, heartbeat_interval=5):
+        self.connected = threading.Event()
+        self.__subscriptions = subscriptions
+        self.__heartbeat_interval = heartbeat_interval
+        self.__condition = threading.Condition()
+        self.__queue = deque()
+        self.__sync_pending = False
+        self.__websocket = None
+        self.__next_heartbeat = None
+        self.__running = False
+        self.__thread = None
+        self.sent = 0
+        self.heartbeats = 0
+
+    def start(self):
+        """ start the writer thread, a second call does nothing """
+        with self.__condition:
+            if self.__running:
+                return
+            self.__running = True
+        self.__thread = threading.Thread(target=self.__run)
+        self.__thread.daemon = True
+        self.__thread.start()
+
+    def stop(self, timeout=None):
+        with self.__condition:
+            self.__running = False
+            self.__condition.notify_all()
+        if self.__thread is not None:
+            self.__thread.join(timeout)
+            self.__thread = None
+
+    def on_open(self, ws):
+        with self.__condition:
+            self.__websocket = ws
+            self.__next_heartbeat = time.monotonic() + self.__heartbeat_interval
+            # a new connection has no subscriptions, send them all
+            self.__subscriptions.reset()
+            self.__sync_pending = True
+            self.connected.set()
+            self.__condition.notify_all()
+
+    def on_close(self):
+        with self.__condition:
+            self.connected.clear()
+            self.__websocket = None
+
+    def send(self, data, opcode=websocket.ABNF.OPCODE_TEXT):
+        """ queue a message, sent as soon as the connection is open """
+        with self.__condition:
+            self.__queue.append((data, opcode))
+            self.__condition.notify_all()
+
+    def sync_subscriptions(self):
+        """ send the subscription changes, several calls before the writer
+            wakes up end up in one delta
+        """
+        with self.__condition:
+            if not self.__sync_pending:
+                self.__sync_pending = True
+                self.__condition.notify_all()
+
+    def __next(self):
+        # wait for work, returns (websocket, messages, paced) or None to stop
+        with self.__condition:
+            while self.__running:
+                if self.connected.is_set():
+                    if self.__queue:
+                        messages = list(self.__queue)
+                        self.__queue.clear()
+                        return self.__websocket, messages, False
+                    if self.__sync_pending:
+                        self.__sync_pending = False
+                        messages = [(data, websocket.ABNF.OPCODE_TEXT)
+                                    for data in self.__subscriptions.delta()]
+                        return self.__websocket, messages, True
+                    timeout = self.__next_heartbeat - time.monotonic()
+                    if timeout <= 0:
+                        self.__next_heartbeat += self.__heartbeat_interval
+                        return self.__websocket, [(HEARTBEAT, websocket.ABNF.OPCODE_PING)], False
+                    self.__condition.wait(timeout)
+                else:
+                    self.__condition.wait()
+            return None
+
+    def __run(self):
+        while True:
+            work = self.__next()
+            if work is None:
+                return
+            ws, messages, paced = work
+            for i, (data, opcode) in enumerate(messages):
+                if paced and i and self.__subscriptions.pace:
+                    time.sleep(self.__subscriptions.pace)
+                try:
+                    ws.send(data, opcode=opcode)
+                except Exception as exp:
+                    # the connection went away, queued messages wait for the next
+                    # one and on_open sends the subscriptions again
+                    logger.warning(f"websocket send failed, {exp}")
+                    if not paced and opcode != websocket.ABNF.OPCODE_PING:
+                        with self.__condition:
+                            self.__queue.extendleft(reversed(messages[i:]))
+                    break
+                if opcode == websocket.ABNF.OPCODE_PING:
+                    self.heartbeats += 1
+                else:
+                    self.sent += 1
@@ -0,0 +1,272 @@
+# -*- coding: utf-8 -*-
+"""
+    sharding.py
+
+    Live feed spread over several websocket connections. Every instrument is
+    assigned to one shard, each shard keeps its own connection, writer thread
+    and subscriptions and resubscribes on its own after a reconnect. Frames of
+    all shards are decoded by a single consumer thread, so the stores of the
+    client see one writer, and merged into a single callback or queue.
+
+    :license: see LICENSE for details.
+"""
+import copy
+import logging
+import queue as _queue
+import threading
+import time
+
+import websocket
+
+from alphatrade.alphatrade import LIVE_FEED_MODES
+from alphatrade.reconnect import ReconnectPolicy
+from alphatrade.sender import WebSocketSender
+from alphatrade.subscriptions import SubscriptionManager
+from alphatrade.ticks import EXCHANGE_CODES, Tick
+
+logger = logging.getLogger(__name__)
+
+
+class _Shard(object):
+    """ One websocket connection of a ShardedFeed """
+
+    def __init__(self, index, feed):
+        self.index = index
+        self.feed = feed
+        self.subscriptions = SubscriptionManager(feed._subscription_chunk_size,
+                                                 feed._subscription_pace)
+        self.sender = WebSocketSender(self.subscriptions, feed._heartbeat_interval)
+        self.connected = self.sender.connected
+        self.reconnect_policy = copy.copy(feed._reconnect_policy)
+        self.websocket = None
+        self.closed = threading.Event()
+        self.thread = None
+        self.frames = 0
+        self.bytes = 0
+        self.ticks = 0
+        self.connects = 0
+        self.disconnects = 0
+        self.errors = 0
+        self.started_at = None
+        self.connected_at = None
+        self.last_frame_at = None
+
+    def on_open(self, ws=None):
+        self.connects += 1
+        self.connected_at = time.time()
+        # sends every subscription again, chunked and paced
+        self.sender.on_open(self.websocket)
+
+    def on_close(self, ws=None, close_status_code=None, close_msg=None):
+        self.sender.on_close()
+        self.disconnects += 1
+
+    def on_error(self, ws=None, error=None):
+        self.errors += 1
+        logger.warning(f"shard {self.index} websocket error, {error}")
+
+    def on_data(self, ws=None, message=None, data_type=None, continue_flag=None):
+        self.frames += 1
+        self.bytes += len(message)
+        self.last_frame_at = time.time()
+        if isinstance(message, str):
+            return
+        self.feed._frames.put((self, message))
+
+    def run_forever(self):
+        while not self.closed.is_set():
+            self.websocket = websocket.WebSocketApp(self.feed._alpha_trade.websocket_url(),
+                                                    on_data=self.on_data,
+                                                    on_error=self.on_error,
+                                                    on_close=self.on_close,
+                                                    on_open=self.on_open)
+            try:
+                self.websocket.run_forever()
+            except Exception as exp:
+                logger.warning(
+                    f"shard {self.index} websocket run forever ended in exception, {exp}")
+            self.sender.on_close()
+            if self.connected_at is not None:
+                self.reconnect_policy.connection_lost(time.time() - self.connected_at)
+                self.connected_at = None
+            if self.closed.is_set():
+                return
+            delay = self.reconnect_policy.next_delay()
+            if delay is None:
+                logger.error(f"shard {self.index} not reconnected after "
+                             f"{self.reconnect_policy.attempt} attempts")
+                return
+            self.closed.wait(delay)
+
+    def start(self):
+        self.started_at = time.time()
+        self.reconnect_policy.reset()
+        self.closed.clear()
+        self.sender.start()
+        self.thread = threading.Thread(target=self.run_forever)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        self.closed.set()
+        self.sender.on_close()
+        if self.websocket is not None:
+            self.websocket.close()
+        if self.thread is not None:
+            self.thread.join(5)
+            self.thread = None
+        self.sender.stop(5)
+
+    def stats(self):
+        now = time.time()
+        connected = self.connected.is_set()
+        uptime = now - self.connected_at if (connected and self.connected_at) else 0.0
+        running = now - self.started_at if self.started_at else 0.0
+        return {'shard': self.index,
+                'connected': connected,
+                'subscriptions': len(self.subscriptions),
+                'frames': self.frames,
+                'bytes': self.bytes,
+                'ticks': self.ticks,
+                'frames_per_second': self.frames / running if running else 0.0,
+                'connects': self.connects,
+                'disconnects': self.disconnects,
+                'errors': self.errors,
+                'reconnect_attempts': self.reconnect_policy.attempt,
+                'uptime': uptime,
+                'seconds_since_last_frame': (now - self.last_frame_at) if self.last_frame_at else None}
+
+
+class ShardedFeed(object):
+    """ Live feed of an `AlphaTrade` object spread over `shards` websocket connections
+
+        Instruments are assigned to shards by a hash of (exchange code, token)
+        unless `grouping` is given, a callable returning the shard index of an
+        instrument, or a dictionary {instrument: shard index}. Every tick and
+        message of every shard is handed to `callback`, one at a time, and/or
+        put in `queue` (any object with a `put` method, like queue.Queue).
+        Every shard reconnects with its own copy of `reconnect_policy`
+        (ReconnectPolicy) and sends its subscriptions in messages of at most
+        `subscription_chunk_size` tokens, `subscription_pace` seconds apart.
+        Frames wait for the consumer thread in a queue of `frame_queue_size`,
+        the shards stop reading while it is full. Don't run start_websocket of
+        the same client next to a ShardedFeed, both write the quotes of the
+        client
+    """
+
+    def __init__(self, alpha_trade, shards=2, callback=None, queue=None, grouping=None,
+                 heartbeat_interval=5, reconnect_policy=None, subscription_chunk_size=500,
+                 subscription_pace=0.01, frame_queue_size=100000):
+        if shards <= 0:
+            raise ValueError('shards should be greater than 0')
+        if callback is None and queue is None:
+            raise TypeError('Either callback or queue is required')
+        self._alpha_trade = alpha_trade
+        self._heartbeat_interval = heartbeat_interval
+        self._reconnect_policy = reconnect_policy if reconnect_policy is not None else ReconnectPolicy()
+        self._subscription_chunk_size = subscription_chunk_size
+        self._subscription_pace = subscription_pace
+        self._frames = _queue.Queue(frame_queue_size)
+        self.__callback = callback
+        self.__queue = queue
+        self.__consumer = None
+        self.__grouping = grouping
+        self.__shards = [_Shard(i, self) for i in range(shards)]
+
+    def shard_of(self, instrument):
+        """ index of the shard carrying an instrument """
+        if self.__grouping is None:
+            code = EXCHANGE_CODES[instrument.exchange]
+            return (code * 1000003 + int(instrument.token)) % len(self.__shards)
+        if callable(self.__grouping):
+            index = self.__grouping(instrument)
+        else:
+            index = self.__grouping[instrument]
+        if not 0 <= index < len(self.__shards):
+            raise ValueError(f'Shard index {index} of {instrument} out of range')
+        return index
+
+    def __consume(self):
+        process = self._alpha_trade.process_frame
+        while True:
+            shard, message = self._frames.get()
+            if shard is None:
+                return
+            try:
+                _, res = process(message)
+                if res is None:
+                    continue
+                if isinstance(res, Tick):
+                    shard.ticks += 1
+                if self.__queue is not None:
+                    self.__queue.put(res)
+                if self.__callback is not None:
+                    self.__callback(res)
+            except Exception as exp:
+                logger.warning(f"sharded feed callback ended in exception, {exp}")
+
+    def start(self):
+        """ open every shard's connection in the background """
+        if self.__consumer is None:
+            self.__consumer = threading.Thread(target=self.__consume)
+            self.__consumer.daemon = True
+            self.__consumer.start()
+        for shard in self.__shards:
+            shard.start()
+
+    def stop(self):
+        """ close every shard's connection, frames already received are still
+            delivered
+        """
+        for shard in self.__shards:
+            shard.stop()
+        if self.__consumer is not None:
+            self._frames.put((None, None))
+            self.__consumer.join()
+            self.__consumer = None
+
+    def wait_connected(self, timeout=None):
+        """ wait till every shard is connected, returns False on timeout """
+        deadline = None if timeout is None else time.time() + timeout
+        for shard in self.__shards:
+            remaining = None if deadline is None else max(0, deadline - time.time())
+            if not shard.connected.wait(remaining):
+                return False
+        return True
+
+    def __by_shard(self, instrument, live_feed_type):
+        mode, entries = self._alpha_trade.subscription_entries(instrument, live_feed_type)
+        by_shard = {}
+        for key, _instrument in entries.items():
+            by_shard.setdefault(self.shard_of(_instrument), {})[key] = _instrument
+        return mode, by_shard
+
+    def subscribe(self, instrument, live_feed_type):
+        """ subscribe to the current feed of an instrument, or a list of instruments """
+        mode, by_shard = self.__by_shard(instrument, live_feed_type)
+        for index, entries in by_shard.items():
+            shard = self.__shards[index]
+            shard.subscriptions.add(mode, entries)
+            shard.sender.sync_subscriptions()
+
+    def unsubscribe(self, instrument, live_feed_type):
+        """ unsubscribe to the current feed of an instrument, or a list of instruments """
+        mode, by_shard = self.__by_shard(instrument, live_feed_type)
+        for index, entries in by_shard.items():
+            shard = self.__shards[index]
+            self._alpha_trade.forget_tokens(shard.subscriptions.remove(mode, entries))
+            shard.sender.sync_subscriptions()
+
+    def get_all_subscriptions(self):
+        """ get the all subscribed instruments of all shards """
+        subscriptions = {}
+        for shard in self.__shards:
+            desired = shard.subscriptions.desired()
+            for live_feed_type, mode in LIVE_FEED_MODES.items():
+                for _instrument in desired.get(mode, {}).values():
+                    subscriptions[_instrument] = live_feed_type
+        return subscriptions
+
+    def stats(self):
+        """ throughput and health of every shard """
+        return [shard.stats() for shard in self.__shards]
@@ -0,0 +1,303 @@
+# -*- coding: utf-8 -*-
+"""
+    shm.py
+
+    Tick fan-out over shared memory. One process owns the feed and writes
+    every decoded tick into a ring of fixed size records in a
+    `multiprocessing.shared_memory` block, any number of processes attach
+    to it by name and read the records as NumPy structured arrays, without
+    sockets or pickling.
+
+    Every record carries its sequence number, starting at 1. The writer
+    clears a slot's sequence before overwriting it and sets it once the
+    record is complete, readers check the sequence before and after copying
+    a record, so a reader that falls more than a ring behind sees the
+    overrun and counts the lost records instead of reading torn ones.
+
+    :license: see LICENSE for details.
+"""
+from multiprocessing import shared_memory
+import struct
+import time
+
+import numpy as np
+
+from alphatrade.batch import rupee_prices, tick_dtype
+from alphatrade.decoder import PRICE_FIELDS
+from alphatrade.ticks import PRICE_MULTIPLIERS, TICK_CLASSES
+
+MAGIC = 0x414c5054  # 'ALPT'
+VERSION = 1
+
+HEADER_DTYPE = np.dtype([('magic', 'u4'), ('version', 'u4'), ('capacity', 'u8'),
+                         ('record_size', 'u8'), ('write_sequence', 'u8')], align=True)
+HEADER_SIZE = 64
+
+
+def _record_dtype():
+    # union of the fields of every tick mode, the widest type wins
+    fields = {}
+    for mode in TICK_CLASSES:
+        for name, *kind in tick_dtype(mode).descr:
+            kind = np.dtype(kind[0]) if len(kind) == 1 else np.dtype((kind[0], kind[1]))
+            if name not in fields or kind.itemsize > fields[name].itemsize:
+                fields[name] = kind
+    return np.dtype([('sequence', 'u8'), ('received_at', 'f8'), ('mode', 'u1')] +
+                    [(name, kind) for name, kind in fields.items()], align=True)
+
+
+# fields of a mode's frame are filled, the others are 0, check `mode`
+RECORD_DTYPE = _record_dtype()
+
+
+_STRUCT_CODES = {'u1': 'B', 'u2': 'H', 'u4': 'I', 'u8': 'Q', 'f8': 'd'}
+
+
+def _record_struct():
+    # struct layout of RECORD_DTYPE, padding included, so a record is written
+    # with a single pack_into
+    parts = ['<']
+    position = 0
+    for name in RECORD_DTYPE.names:
+        kind, offset = RECORD_DTYPE.fields[name][:2]
+        if offset > position:
+            parts.append(f'{offset - position}x')
+        base, shape = (kind.subdtype if kind.subdtype else (kind, ()))
+        code = _STRUCT_CODES[base.str[1:]]
+        parts.append(f'{shape[0]}{code}' if shape else code)
+        position = offset + kind.itemsize
+    if RECORD_DTYPE.itemsize > position:
+        parts.append(f'{RECORD_DTYPE.itemsize - position}x')
+    return struct.Struct(''.join(parts))
+
+
+RECORD_STRUCT = _record_struct()
+
+
+def _record_builder(cls):
+    # generated like Tick.__init__, the flat values of a record in
+    # RECORD_DTYPE order straight from the tick slots
+    fields = set(tick_dtype(cls.mode).names)
+    values = []
+    for name in RECORD_DTYPE.names:
+        shape = RECORD_DTYPE[name].shape
+        if name == 'sequence':
+            values.append('0')
+        elif name == 'received_at':
+            values.append('received_at')
+        elif name == 'mode':
+            values.append(str(int(cls.mode)))
+        elif name not in fields:
+            values.extend(['0'] * (shape[0] if shape else 1))
+        elif name == 'exchange':
+            values.append('tick.exchange_code')
+        elif name in PRICE_FIELDS:
+            if shape:
+                values.append(f'*[p / m for p in tick.raw_{name}]')
+            else:
+                values.append(f'tick.raw_{name} / m')
+        else:
+            values.append(f'*tick.{name}' if shape else f'tick.{name}')
+    source = ('def build(buffer, offset, tick, received_at):\n'
+              '    m = PRICE_MULTIPLIERS[tick.exchange_code]\n'
+              f'    pack_into(buffer, offset, {", ".join(values)})\n')
+    namespace = {'PRICE_MULTIPLIERS': PRICE_MULTIPLIERS, 'pack_into': RECORD_STRUCT.pack_into}
+    exec(source, namespace)
+    return namespace['build']
+
+
+_BUILDERS = {mode: _record_builder(cls) for mode, cls in TICK_CLASSES.items()}
+
+
+def _attach(name):
+    # only the publisher owns the block, a subscriber registered with the
+    # resource tracker would have it unlinked when the subscriber exits
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:  # python < 3.13
+        pass
+    from multiprocessing import resource_tracker
+    register = resource_tracker.register
+
+    def skip_shared_memory(name, rtype):
+        if rtype != 'shared_memory':
+            register(name, rtype)
+
+    resource_tracker.register = skip_shared_memory
+    try:
+        return shared_memory.SharedMemory(name=name)
+    finally:
+        resource_tracker.register = register
+
+
+def _views(buffer, capacity):
+    header = np.ndarray((), dtype=HEADER_DTYPE, buffer=buffer)
+    records = np.ndarray((capacity,), dtype=RECORD_DTYPE, buffer=buffer, offset=HEADER_SIZE)
+    return header, records
+
+
+class TickPublisher(object):
+    """ Writes ticks into a shared memory ring of `capacity` records, one
+        writer per ring. `name` is what subscribers attach to, None picks one
+    """
+
+    def __init__(self, name=None, capacity=65536):
+        if capacity <= 0:
+            raise ValueError('capacity should be greater than 0')
+        self.capacity = capacity
+        self.__shm = shared_memory.SharedMemory(
+            name=name, create=True, size=HEADER_SIZE + capacity * RECORD_DTYPE.itemsize)
+        self.__buffer = self.__shm.buf
+        self.__header, self.__records = _views(self.__buffer, capacity)
+        self.__sequences = self.__records['sequence']
+        self.__header['capacity'] = capacity
+        self.__header['record_size'] = RECORD_DTYPE.itemsize
+        self.__header['version'] = VERSION
+        self.__header['write_sequence'] = 0
+        self.__header['magic'] = MAGIC
+        self.sequence = 0
+
+    @property
+    def name(self):
+        return self.__shm.name
+
+    def publish(self, tick, received_at=None):
+        """ append a tick, returns its sequence number, None for ticks of
+            modes without a record layout
+        """
+        build = _BUILDERS.get(tick.mode)
+        if build is None:
+            return None
+        if received_at is None:
+            received_at = time.time()
+        sequence = self.sequence + 1
+        slot = (sequence - 1) % self.capacity
+        sequences = self.__sequences
+        sequences[slot] = 0
+        build(self.__buffer, HEADER_SIZE + slot * RECORD_STRUCT.size, tick, received_at)
+        sequences[slot] = sequence
+        self.__header['write_sequence'] = self.sequence = sequence
+        return sequence
+
+    def publish_batch(self, mode, ticks, received_at=None):
+        """ append a structured array of ticks of a mode, as delivered to
+            ticks_batch_callback, returns the sequence of the last one
+        """
+        count = len(ticks)
+        if not count:
+            return self.sequence
+        if count > self.capacity:
+            # only the newest fit, the older ones count as overrun
+            self.sequence += count - self.capacity
+            ticks = ticks[-self.capacity:]
+            count = self.capacity
+        if received_at is None:
+            received_at = time.time()
+        records = np.zeros(count, dtype=RECORD_DTYPE)
+        records['received_at'] = received_at
+        records['mode'] = mode
+        for name in ticks.dtype.names:
+            records[name] = rupee_prices(ticks, name) if name in PRICE_FIELDS else ticks[name]
+        first = self.sequence + 1
+        records['sequence'] = np.arange(first, first + count, dtype='u8')
+        slots = (np.arange(first, first + count) - 1) % self.capacity
+        self.__sequences[slots] = 0
+        sequences = records['sequence'].copy()
+        records['sequence'] = 0
+        self.__records[slots] = records
+        self.__sequences[slots] = sequences
+        self.__header['write_sequence'] = self.sequence = first + count - 1
+        return self.sequence
+
+    def close(self, unlink=True):
+        """ detach, and with unlink remove the block once every subscriber
+            has detached too
+        """
+        self.__header = self.__records = self.__sequences = self.__buffer = None
+        self.__shm.close()
+        if unlink:
+            self.__shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class TickSubscriber(object):
+    """ Reads the ring of a TickPublisher attached by name
+
+        start='latest' reads ticks published from now on, 'oldest' begins with
+        the oldest tick still in the ring. `lost` counts the ticks overwritten
+        before they were read
+    """
+
+    def __init__(self, name, start='latest'):
+        if start not in ('latest', 'oldest'):
+            raise ValueError("start should be 'latest' or 'oldest'")
+        self.__shm = _attach(name)
+        header = np.ndarray((), dtype=HEADER_DTYPE, buffer=self.__shm.buf)
+        if header['magic'] != MAGIC or header['record_size'] != RECORD_DTYPE.itemsize:
+            self.__shm.close()
+            raise ValueError(f"{name} is not a tick ring of this version")
+        self.capacity = int(header['capacity'])
+        self.__header, self.__records = _views(self.__shm.buf, self.capacity)
+        self.__sequences = self.__records['sequence']
+        written = int(self.__header['write_sequence'])
+        self.sequence = written if start == 'latest' else max(0, written - self.capacity)
+        self.lost = 0
+
+    @property
+    def available(self):
+        """ ticks published and not read yet, overrun ones included """
+        return int(self.__header['write_sequence']) - self.sequence
+
+    def read(self, max_records=None):
+        """ structured array of RECORD_DTYPE with the ticks published since the
+            last read, oldest first, at most max_records
+        """
+        written = int(self.__header['write_sequence'])
+        first = self.sequence + 1
+        if written - first + 1 > self.capacity:
+            self.lost += written - self.capacity + 1 - first
+            first = written - self.capacity + 1
+        last = written if max_records is None else min(written, first + max_records - 1)
+        if last < first:
+            return np.empty(0, dtype=RECORD_DTYPE)
+        start = (first - 1) % self.capacity
+        count = last - first + 1
+        if start + count <= self.capacity:
+            slots = slice(start, start + count)
+        else:
+            slots = np.r_[start:self.capacity, 0:start + count - self.capacity]
+        records = self.__records[slots].copy()
+        # a slot whose sequence moved on during the copy was overwritten
+        expected = np.arange(first, last + 1, dtype='u8')
+        valid = (records['sequence'] == expected) & (self.__sequences[slots] == expected)
+        if not valid.all():
+            self.lost += int(count - valid.sum())
+            records = records[valid]
+        self.sequence = last
+        return records
+
+    def wait(self, timeout=None, interval=0.0005, max_records=None):
+        """ read, polling every interval seconds until there is at least one
+            tick or timeout seconds passed
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while int(self.__header['write_sequence']) == self.sequence:
+            if deadline is not None and time.monotonic() >= deadline:
+                break
+            time.sleep(interval)
+        return self.read(max_records)
+
+    def close(self):
+        self.__header = self.__records = self.__sequences = None
+        self.__shm.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -0,0 +1,500 @@
+# -*- coding: utf-8 -*-
+"""
+    simulator.py
+
+    Local stand-in for the broker: the REST routes used by `AlphaTrade` and
+    the hydrasocket websocket feed, served on one port from the standard
+    library only. Point a client at it to run benchmarks and soak tests
+    without an account:
+
+        sim = Simulator(tokens=1000, rate=5000).start()
+        sas = AlphaTrade('LOGIN', 'password', '123456', host=sim.url,
+                         master_contracts_to_download=['NSE'])
+
+    or from a shell, `python -m alphatrade.simulator --port 8080 --rate 5000`.
+
+    Each websocket connection streams binary frames of the subscribed feed
+    modes, cycling over its subscribed tokens at `rate` frames per second,
+    with prices on a random walk and the cumulative volume rising.
+
+    :license: see LICENSE for details.
+"""
+import argparse
+import base64
+import hashlib
+import itertools
+import json
+import logging
+import random
+import socket
+import struct
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from alphatrade.decoder import LAYOUTS, WsFrameMode
+from alphatrade.ticks import EXCHANGE_CODES, EXCHANGE_NAMES
+
+logger = logging.getLogger(__name__)
+
+WEBSOCKET_GUID = '258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+SOCKET_PATH = '/hydrasocket/v2/websocket'
+
+OPCODE_TEXT = 0x1
+OPCODE_BINARY = 0x2
+OPCODE_CLOSE = 0x8
+OPCODE_PING = 0x9
+OPCODE_PONG = 0xA
+
+FEED_MODES = {'marketdata': WsFrameMode.MARKETDATA,
+              'compact_marketdata': WsFrameMode.COMPACT_MARKETDATA,
+              'snapquote': WsFrameMode.SNAPQUOTE,
+              'full_snapquote': WsFrameMode.FULL_SNAPQUOTE}
+
+UNDERLYINGS = ('NIFTY', 'BANKNIFTY', 'RELIANCE', 'TCS', 'INFY', 'HDFCBANK', 'SBIN', 'ITC')
+DERIVATIVE_EXCHANGES = ('NFO', 'BFO', 'MCX', 'CDS')
+FIRST_TOKEN = 1000
+
+
+def make_scrips(exchange, count):
+    """ contracts.json scrips of an exchange, tokens start at FIRST_TOKEN """
+    scrips = []
+    expiry = int(time.time()) // 86400 * 86400 + 7 * 86400
+    for i in range(count):
+        underlying = UNDERLYINGS[i % len(UNDERLYINGS)]
+        scrip = {'code': str(FIRST_TOKEN + i), 'exchange': exchange,
+                 'company': f'{underlying} LIMITED'}
+        if exchange in DERIVATIVE_EXCHANGES:
+            series = i // len(UNDERLYINGS)
+            if series == 0:
+                scrip['symbol'] = f'{underlying} FUT'
+            else:
+                side = 'CE' if series % 2 else 'PE'
+                scrip['symbol'] = f'{underlying} {1000 + 50 * (series // 2)} {side}'
+            scrip['expiry'] = expiry
+            scrip['lotSize'] = 50
+        else:
+            scrip['symbol'] = underlying if i < len(UNDERLYINGS) else f'{underlying}{i}-EQ'
+            scrip['lotSize'] = 1
+        scrips.append(scrip)
+    return scrips
+
+
+class _TokenState(object):
+    """ random walk of one instrument, prices in paise """
+
+    __slots__ = ('exchange', 'token', 'price', 'open', 'high', 'low', 'close', 'volume')
+
+    def __init__(self, exchange, token):
+        self.exchange = exchange
+        self.token = token
+        self.price = self.open = self.high = self.low = self.close = \
+            random.randint(10000, 500000) // 5 * 5
+        self.volume = 0
+
+    def step(self):
+        self.price = max(5, self.price + random.choice((-10, -5, 0, 5, 10)))
+        if self.price > self.high:
+            self.high = self.price
+        elif self.price < self.low:
+            self.low = self.price
+        self.volume += random.randint(1, 20)
+
+    def frame(self, mode):
+        now = int(time.time())
+        price = self.price
+        if mode == WsFrameMode.COMPACT_MARKETDATA:
+            values = (self.exchange, self.token, price, abs(price - self.close), now, self.volume)
+        elif mode == WsFrameMode.MARKETDATA:
+            values = (self.exchange, self.token, price, now, 10, self.volume,
+                      price - 5, 100, price + 5, 100, 50000, 50000, price, now,
+                      self.open, self.high, self.low, self.close,
+                      self.high * 2, self.low // 2)
+        else:
+            bids = [price - 5 * (i + 1) for i in range(5)]
+            asks = [price + 5 * (i + 1) for i in range(5)]
+            values = [self.exchange, self.token, *[3] * 5, *bids, *[100] * 5,
+                      *[3] * 5, *asks, *[100] * 5]
+            if mode == WsFrameMode.SNAPQUOTE:
+                values.append(now)
+            else:
+                values.extend((price, self.open, self.high, self.low, self.close,
+                               50000, 50000, self.volume))
+        return bytes((mode,)) + LAYOUTS[mode].struct.pack(*values)
+
+
+class _WebSocketConnection(object):
+    """ server side of one websocket connection, a reader in the request
+        handler thread and a frame emitter thread
+    """
+
+    def __init__(self, simulator, rfile, wfile):
+        self.simulator = simulator
+        self.rfile = rfile
+        self.wfile = wfile
+        self.lock = threading.Lock()
+        self.closed = threading.Event()
+        # mode -> {(exchange code, token): _TokenState}
+        self.subscriptions = {}
+        self.frames = 0
+
+    def send(self, payload, opcode=OPCODE_BINARY):
+        length = len(payload)
+        if length < 126:
+            header = struct.pack('>BB', 0x80 | opcode, length)
+        elif length < 65536:
+            header = struct.pack('>BBH', 0x80 | opcode, 126, length)
+        else:
+            header = struct.pack('>BBQ', 0x80 | opcode, 127, length)
+        with self.lock:
+            self.wfile.write(header + payload)
+
+    def receive(self):
+        """ next (opcode, payload) from the client, None once it is gone """
+        header = self.rfile.read(2)
+        if len(header) < 2:
+            return None
+        opcode = header[0] & 0x0F
+        length = header[1] & 0x7F
+        if length == 126:
+            length, = struct.unpack('>H', self.rfile.read(2))
+        elif length == 127:
+            length, = struct.unpack('>Q', self.rfile.read(8))
+        mask = self.rfile.read(4) if header[1] & 0x80 else None
+        payload = self.rfile.read(length)
+        if mask:
+            payload = bytes(b ^ mask[i % 4] for i, b in enumerate(payload))
+        return opcode, payload
+
+    def handle_message(self, message):
+        request = json.loads(message)
+        action, values, mode = request.get('a'), request.get('v'), request.get('m')
+        if mode in FEED_MODES:
+            frame_mode = FEED_MODES[mode]
+            with self.lock:
+                subscribed = self.subscriptions.setdefault(frame_mode, {})
+                for exchange, token in values:
+                    if action == 'subscribe':
+                        subscribed[(exchange, token)] = self.simulator._token_state(exchange, token)
+                    elif action == 'unsubscribe':
+                        subscribed.pop((exchange, token), None)
+        elif mode == 'market_status' and action == 'subscribe':
+            for exchange in values:
+                market_type, status = b'NORMAL', b'The Normal market is open.'
+                self.send(bytes((WsFrameMode.MARKET_STATUS,)) +
+                          struct.pack('>BH', exchange, len(market_type)) + market_type +
+                          struct.pack('>H', len(status)) + status)
+        elif mode == 'exchange_messages' and action == 'subscribe':
+            for exchange in values:
+                text = f'{EXCHANGE_NAMES[exchange] or exchange} : simulated exchange message'.encode()
+                self.send(bytes((WsFrameMode.EXCHANGE_MESSAGES,)) +
+                          struct.pack('>BH', exchange, len(text)) + text +
+                          struct.pack('>I', int(time.time())))
+
+    def emit(self):
+        # sends rate frames per second in 10ms steps, round robin over the
+        # subscribed (mode, token) pairs
+        step = 0.01
+        per_step = self.simulator.rate * step
+        carry = 0.0
+        cursor = 0
+        next_at = time.perf_counter()
+        while not self.closed.is_set():
+            next_at += step
+            delay = next_at - time.perf_counter()
+            if delay > 0:
+                self.closed.wait(delay)
+            with self.lock:
+                pairs = [(mode, state) for mode, subscribed in self.subscriptions.items()
+                         for state in subscribed.values()]
+            if not pairs:
+                continue
+            carry += per_step
+            count = int(carry)
+            carry -= count
+            try:
+                for _ in range(count):
+                    mode, state = pairs[cursor % len(pairs)]
+                    cursor += 1
+                    state.step()
+                    self.send(state.frame(mode))
+                    self.frames += 1
+            except OSError:
+                self.closed.set()
+
+    def serve(self):
+        emitter = threading.Thread(target=self.emit)
+        emitter.daemon = True
+        emitter.start()
+        try:
+            while True:
+                received = self.receive()
+                if received is None:
+                    break
+                opcode, payload = received
+                if opcode == OPCODE_TEXT:
+                    self.handle_message(payload.decode('utf-8'))
+                elif opcode == OPCODE_PING:
+                    self.send(payload, OPCODE_PONG)
+                elif opcode == OPCODE_CLOSE:
+                    self.send(payload[:2], OPCODE_CLOSE)
+                    break
+        except (OSError, ValueError) as exp:
+            logger.debug(f"simulator websocket ended, {exp}")
+        finally:
+            self.closed.set()
+            emitter.join()
+            self.simulator.frames += self.frames
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+    def __reply(self, payload, status=200):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def __body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        if not length:
+            return None
+        return json.loads(self.rfile.read(length))
+
+    def __handle(self, method):
+        url = urlsplit(self.path)
+        if url.path == SOCKET_PATH and self.headers.get('Upgrade', '').lower() == 'websocket':
+            self.__upgrade()
+            return
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        self.server.simulator.requests += 1
+        status, payload = self.server.simulator._route(method, url.path, query, self.__body())
+        self.__reply(payload, status)
+
+    def __upgrade(self):
+        key = self.headers['Sec-WebSocket-Key']
+        accept = base64.b64encode(hashlib.sha1((key + WEBSOCKET_GUID).encode()).digest())
+        self.send_response(101, 'Switching Protocols')
+        self.send_header('Upgrade', 'websocket')
+        self.send_header('Connection', 'Upgrade')
+        self.send_header('Sec-WebSocket-Accept', accept.decode())
+        self.end_headers()
+        self.wfile.flush()
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        simulator = self.server.simulator
+        connection = _WebSocketConnection(simulator, self.rfile, self.wfile)
+        with simulator._lock:
+            simulator._connections.add(connection)
+            simulator.connections += 1
+        try:
+            connection.serve()
+        finally:
+            with simulator._lock:
+                simulator._connections.discard(connection)
+        self.close_connection = True
+
+    def do_GET(self):
+        self.__handle('GET')
+
+    def do_POST(self):
+        self.__handle('POST')
+
+    def do_PUT(self):
+        self.__handle('PUT')
+
+    def do_DELETE(self):
+        self.__handle('DELETE')
+
+
+class Simulator(object):
+    """ REST and websocket stand-in on host:port (0 picks a free port)
+
+        `tokens` contracts per exchange in `exchanges`, every websocket
+        connection sends `rate` frames per second over its subscriptions
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, exchanges=('NSE', 'NFO', 'MCX'), tokens=1000,
+                 rate=1000):
+        self.rate = rate
+        self.exchanges = tuple(exchanges)
+        self.contracts = {exchange: make_scrips(exchange, tokens) for exchange in self.exchanges}
+        self.requests = 0
+        self.connections = 0
+        self.frames = 0
+        self._lock = threading.Lock()
+        self._connections = set()
+        self.__token_states = {}
+        self.__orders = {}
+        self.__order_ids = itertools.count(1)
+        self.__server = ThreadingHTTPServer((host, port), _Handler)
+        self.__server.daemon_threads = True
+        self.__server.simulator = self
+        self.__thread = None
+
+    @property
+    def url(self):
+        host, port = self.__server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    @property
+    def socket_endpoint(self):
+        return 'ws' + self.url[len('http'):] + SOCKET_PATH + '?access_token={access_token}'
+
+    def start(self):
+        """ serve in a background thread, returns self """
+        self.__thread = threading.Thread(target=self.__server.serve_forever)
+        self.__thread.daemon = True
+        self.__thread.start()
+        return self
+
+    def stop(self):
+        self.__server.shutdown()
+        with self._lock:
+            connections = list(self._connections)
+        for connection in connections:
+            connection.closed.set()
+        self.__server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    def stats(self):
+        with self._lock:
+            live = sum(connection.frames for connection in self._connections)
+        return {'requests': self.requests,
+                'connections': self.connections,
+                'open_connections': len(self._connections),
+                'frames': self.frames + live}
+
+    def _token_state(self, exchange, token):
+        key = (exchange, token)
+        state = self.__token_states.get(key)
+        if state is None:
+            state = self.__token_states.setdefault(key, _TokenState(exchange, token))
+        return state
+
+    def __candles(self, query, minutes, paise):
+        end = int(query.get('endtime') or time.time())
+        start = int(query.get('starttime') or end - 86400)
+        minutes = int(minutes or 1)
+        price = random.randint(10000, 500000)
+        candles = []
+        for ts in range(start - start % (minutes * 60), end, minutes * 60):
+            high, low = price + random.randint(0, 50), price - random.randint(0, 50)
+            close = random.randint(low, high)
+            scale = 1 if paise else 0.01
+            candles.append([ts, price * scale, high * scale, low * scale, close * scale,
+                            random.randint(100, 10000)])
+            price = close
+        return candles
+
+    def _route(self, method, path, query, body):
+        """ (status, payload) of a REST call """
+        success = {'status': 'success', 'message': '', 'data': {}}
+        if path == '/api/v3/user/login':
+            return 200, {**success, 'data': {'twofa': {'twofa_token': 'simulated-twofa-token'}}}
+        if path == '/api/v3/user/validatetotp':
+            return 200, {**success, 'data': {'auth_token': 'simulated-' + 'x' * 118}}
+        if path == '/api/v1/user/profile':
+            return 200, {**success, 'data': {'login_id': 'SIMULATED',
+                                             'exchanges_subscribed': list(self.exchanges)}}
+        if path == '/api/v2/contracts.json':
+            exchange = query.get('exchanges', '')
+            if exchange not in self.contracts:
+                return 200, {}
+            return 200, {f'{exchange}-SEG': self.contracts[exchange]}
+        if path in ('/api/v1/orders', '/api/v1/orders/amo', '/api/v1/orders/bracket'):
+            if method == 'POST':
+                order_id = str(next(self.__order_ids))
+                self.__orders[order_id] = {**(body or {}), 'oms_order_id': order_id,
+                                           'order_status': 'open', 'product': (body or {}).get('product'),
+                                           'leg_order_indicator': None}
+                return 200, {**success, 'data': {'oms_order_id': order_id}}
+            if method == 'PUT':
+                order_id = str((body or {}).get('oms_order_id'))
+                if order_id in self.__orders:
+                    self.__orders[order_id].update(body)
+                return 200, {**success, 'data': {'oms_order_id': order_id}}
+            orders = list(self.__orders.values())
+            return 200, {**success, 'data': {
+                'pending_orders': [o for o in orders if o['order_status'] == 'open'],
+                'completed_orders': [o for o in orders if o['order_status'] != 'open']}}
+        if path == '/api/v1/orders/basket':
+            order_ids = []
+            for order in (body or {}).get('orders', []):
+                order_id = str(next(self.__order_ids))
+                self.__orders[order_id] = {**order, 'oms_order_id': order_id,
+                                           'order_status': 'open', 'leg_order_indicator': None}
+                order_ids.append(order_id)
+            return 200, {**success, 'data': [{'oms_order_id': order_id} for order_id in order_ids]}
+        if path in ('/api/v1/order', '/api/v1/order/bracket', '/api/v1/order/cover'):
+            order = self.__orders.get(query.get('oms_order_id'))
+            if order is None:
+                return 200, {'status': 'error', 'message': 'Order not found', 'data': {}}
+            order['order_status'] = 'cancelled'
+            return 200, {**success, 'data': {'oms_order_id': order['oms_order_id']}}
+        if path.startswith('/api/v1/order/') and path.endswith('/history'):
+            order = self.__orders.get(path.split('/')[4])
+            return 200, {**success, 'data': [order] if order else []}
+        if path == '/api/v1/trades':
+            return 200, {**success, 'data': {'trades': []}}
+        if path in ('/api/v1/positions', '/api/v1/holdings'):
+            return 200, {**success, 'data': {'positions': [], 'holdings': []}}
+        if path == '/api/v1/funds/view':
+            return 200, {**success, 'data': {'cash_positions': []}}
+        if path == '/api/v1/charts':
+            return 200, {**success, 'data': self.__candles(query, query.get('data_duration'), True)}
+        if path == '/api/v1/charts/tdv':
+            minutes = 60 if query.get('candletype') == '2' else query.get('data_duration')
+            if query.get('candletype') == '3':
+                minutes = 1440
+            return 200, {**success, 'data': {'candles': self.__candles(query, minutes, False)}}
+        if path == '/api/v1/search':
+            key = query.get('key', '').upper()
+            return 200, {**success, 'result': [
+                {'exchange': exchange, 'token': int(scrip['code']), 'trading_symbol': scrip['symbol'],
+                 'company': scrip['company']}
+                for exchange, scrips in self.contracts.items()
+                for scrip in scrips if key in scrip['symbol']][:50]}
+        if path.startswith('/api/v1/contract/'):
+            exchange = path.rsplit('/', 1)[1]
+            token = query.get('token')
+            for scrip in self.contracts.get(exchange, ()):
+                if scrip['code'] == token:
+                    return 200, {**success, 'data': scrip}
+            return 200, {**success, 'data': {}}
+        return 404, {'status': 'error', 'message': f'{method} {path} not simulated', 'data': {}}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Local AlphaTrade REST and websocket simulator')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--exchanges', default='NSE,NFO,MCX')
+    parser.add_argument('--tokens', type=int, default=1000, help='contracts per exchange')
+    parser.add_argument('--rate', type=int, default=1000,
+                        help='frames per second per websocket connection')
+    args = parser.parse_args(argv)
+    exchanges = [exchange for exchange in args.exchanges.split(',') if exchange in EXCHANGE_CODES]
+    simulator = Simulator(args.host, args.port, exchanges, args.tokens, args.rate).start()
+    print(f'serving on {simulator.url}, websocket {simulator.socket_endpoint}')
+    try:
+        while True:
+            time.sleep(10)
+            print(simulator.stats())
+    except KeyboardInterrupt:
+        simulator.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+"""
+    stats.py
+
+    Latency statistics of the live feed. Every frame records the time spent
+    decoding, converting (enrichment, quotes, human readable values) and in
+    the callbacks, plus the lag between the exchange time stamp and the
+    receive time, into log-linear (HDR style) histograms per frame type and
+    per token. Recording is a few integer operations and a dict increment,
+    percentiles are only worked out when the statistics are read.
+
+    :license: see LICENSE for details.
+"""
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+STAGES = ('decode', 'convert', 'callback', 'total', 'exchange_lag')
+TOKEN_STAGES = ('total', 'exchange_lag')
+
+
+class LatencyHistogram(object):
+    """ Histogram of non-negative integer values, microseconds here, with a
+        relative error of at most 2 / 2 ** significant_bits
+
+        Values below 2 ** significant_bits get a bucket each, above that
+        every power of two is split into 2 ** (significant_bits - 1) buckets
+    """
+
+    __slots__ = ('__bits', '__half', '__max_value', 'counts', 'count', 'total', 'min', 'max')
+
+    def __init__(self, significant_bits=7, max_value=3600 * 1000000):
+        self.__bits = significant_bits
+        self.__half = 1 << (significant_bits - 1)
+        self.__max_value = max_value
+        # sparse, {bucket index: count}, a token rarely fills more than a few buckets
+        self.counts = {}
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+
+    def __index(self, value):
+        exponent = value.bit_length() - self.__bits
+        if exponent <= 0:
+            return value
+        return exponent * self.__half + (value >> exponent)
+
+    def __lower_bound(self, index):
+        if index < 2 * self.__half:
+            return index
+        exponent = index // self.__half - 1
+        return (index - exponent * self.__half) << exponent
+
+    def record(self, value):
+        value = int(value)
+        if value < 0:
+            value = 0
+        elif value > self.__max_value:
+            value = self.__max_value
+        index = self.__index(value)
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def percentile(self, percent):
+        """ value at or below which percent of the recorded values are """
+        if not self.count:
+            return None
+        rank = max(1, int(self.count * percent / 100.0 + 0.5))
+        seen = 0
+        for index, count in sorted(self.counts.items()):
+            seen += count
+            if seen >= rank:
+                return min(max(self.__lower_bound(index), self.min), self.max)
+        return self.max
+
+    def summary(self):
+        """ count, min, mean, percentiles and max in a dictionary """
+        if not self.count:
+            return {'count': 0}
+        return {'count': self.count,
+                'min': self.min,
+                'mean': self.total / self.count,
+                'p50': self.percentile(50),
+                'p90': self.percentile(90),
+                'p99': self.percentile(99),
+                'p999': self.percentile(99.9),
+                'max': self.max}
+
+
+class FeedStats(object):
+    """ Per stage latency histograms of the live feed, in microseconds, per
+        frame type and, for the total and the exchange lag, per token
+    """
+
+    def __init__(self, per_token=True):
+        self.__per_token = per_token
+        self.__lock = threading.Lock()
+        self.__logger_stop = None
+        self.reset()
+
+    def reset(self):
+        with self.__lock:
+            self.frames = 0
+            self.started_at = time.time()
+            self.__by_mode = {}
+            self.__by_token = {}
+
+    def record(self, mode, key, decode, convert, callback, exchange_lag=None):
+        """ record a frame, times in seconds, key is (exchange code, token) or None """
+        self.frames += 1
+        histograms = self.__by_mode.get(mode)
+        if histograms is None:
+            with self.__lock:
+                histograms = self.__by_mode.setdefault(
+                    mode, {stage: LatencyHistogram() for stage in STAGES})
+        total = (decode + convert + callback) * 1e6
+        histograms['decode'].record(decode * 1e6)
+        histograms['convert'].record(convert * 1e6)
+        histograms['callback'].record(callback * 1e6)
+        histograms['total'].record(total)
+        if exchange_lag is not None:
+            histograms['exchange_lag'].record(exchange_lag * 1e6)
+        if key is not None and self.__per_token:
+            histograms = self.__by_token.get(key)
+            if histograms is None:
+                with self.__lock:
+                    histograms = self.__by_token.setdefault(
+                        key, {stage: LatencyHistogram() for stage in TOKEN_STAGES})
+            histograms['total'].record(total)
+            if exchange_lag is not None:
+                histograms['exchange_lag'].record(exchange_lag * 1e6)
+
+    def snapshot(self):
+        """ frame counts and histogram summaries by frame type name and by
+            (exchange code, token)
+        """
+        with self.__lock:
+            by_mode = list(self.__by_mode.items())
+            by_token = list(self.__by_token.items())
+        seconds = time.time() - self.started_at
+        return {'frames': self.frames,
+                'seconds': seconds,
+                'frames_per_second': self.frames / seconds if seconds else 0.0,
+                'by_frame_type': {getattr(mode, 'name', mode): {
+                    stage: histogram.summary() for stage, histogram in histograms.items()}
+                    for mode, histograms in by_mode},
+                'by_token': {key: {
+                    stage: histogram.summary() for stage, histogram in histograms.items()}
+                    for key, histograms in by_token}}
+
+    def start_logger(self, interval=60, level=logging.INFO):
+        """ log a summary per frame type every interval seconds """
+        self.stop_logger()
+        stop = self.__logger_stop = threading.Event()
+
+        def run():
+            while not stop.wait(interval):
+                self.log(level)
+
+        th = threading.Thread(target=run)
+        th.daemon = True
+        th.start()
+
+    def stop_logger(self):
+        if self.__logger_stop is not None:
+            self.__logger_stop.set()
+            self.__logger_stop = None
+
+    def log(self, level=logging.INFO):
+        stats = self.snapshot()
+        logger.log(level, f"feed {stats['frames']} frames, "
+                          f"{stats['frames_per_second']:.0f} frames/s")
+        for mode, stages in stats['by_frame_type'].items():
+            parts = []
+            for stage in STAGES:
+                summary = stages[stage]
+                if summary['count']:
+                    parts.append(f"{stage} p50 {summary['p50']}us p99 {summary['p99']}us")
+            logger.log(level, f"feed {mode}: " + ', '.join(parts))
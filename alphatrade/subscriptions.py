@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+"""
+    subscriptions.py
+
+    Desired feed subscriptions per mode next to what was sent on the current
+    connection. Changes only send the difference, split into messages of at
+    most `chunk_size` tokens, and a reconnect resends the whole desired state
+    the same way from prebuilt [exchange code, token] pairs.
+
+    :license: see LICENSE for details.
+"""
+import json
+import threading
+
+
+class SubscriptionManager(object):
+    """ Subscriptions of one websocket connection, keyed by (exchange code, token)
+        per feed mode string ('marketdata', 'compact_marketdata', ...)
+
+        `chunk_size` caps the tokens per message and `pace` is the number of
+        seconds the sender waits between two messages
+    """
+
+    def __init__(self, chunk_size=500, pace=0.01):
+        if chunk_size <= 0:
+            raise ValueError('chunk_size should be greater than 0')
+        self.chunk_size = chunk_size
+        self.pace = pace
+        self.__lock = threading.Lock()
+        # mode -> {(exchange code, token): subscribed object}
+        self.__desired = {}
+        # mode -> set of (exchange code, token) sent on this connection
+        self.__sent = {}
+
+    def add(self, mode, entries):
+        """ subscribe entries, a dictionary {(exchange code, token): object}, in mode """
+        with self.__lock:
+            self.__desired.setdefault(mode, {}).update(entries)
+
+    def remove(self, mode, keys):
+        """ unsubscribe keys from mode, returns the keys not subscribed in any
+            mode any more
+        """
+        with self.__lock:
+            desired = self.__desired.get(mode)
+            if desired:
+                for key in keys:
+                    desired.pop(key, None)
+            return [key for key in keys
+                    if not any(key in other for other in self.__desired.values())]
+
+    def switch(self, mode, entries):
+        """ move entries to mode, out of every other mode they are subscribed in """
+        with self.__lock:
+            for other, desired in self.__desired.items():
+                if other != mode:
+                    for key in entries:
+                        desired.pop(key, None)
+            self.__desired.setdefault(mode, {}).update(entries)
+
+    def clear(self):
+        """ unsubscribe everything """
+        with self.__lock:
+            self.__desired = {}
+
+    def reset(self):
+        """ forget what was sent, after a reconnect the server has no subscriptions """
+        with self.__lock:
+            self.__sent = {}
+
+    def desired(self):
+        """ {mode: {(exchange code, token): object}} of the wanted subscriptions """
+        with self.__lock:
+            return {mode: dict(desired) for mode, desired in self.__desired.items() if desired}
+
+    def __len__(self):
+        return sum(len(desired) for desired in self.__desired.values())
+
+    def delta(self):
+        """ messages turning the sent subscriptions into the desired ones,
+            unsubscriptions first, and record them as sent
+        """
+        unsubscribe = []
+        subscribe = []
+        with self.__lock:
+            for mode in set(self.__desired) | set(self.__sent):
+                desired = self.__desired.get(mode, {})
+                sent = self.__sent.setdefault(mode, set())
+                removed = [key for key in sent if key not in desired]
+                added = [key for key in desired if key not in sent]
+                if removed:
+                    sent.difference_update(removed)
+                    unsubscribe.extend(self.__messages('unsubscribe', mode, removed))
+                if added:
+                    sent.update(added)
+                    subscribe.extend(self.__messages('subscribe', mode, added))
+        return unsubscribe + subscribe
+
+    def __messages(self, action, mode, keys):
+        size = self.chunk_size
+        return [json.dumps({'a': action, 'v': keys[i:i + size], 'm': mode})
+                for i in range(0, len(keys), size)]
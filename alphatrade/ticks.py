@@ -0,0 +1,246 @@
+# -*- coding: utf-8 -*-
+"""
+    ticks.py
+
+    Compact tick objects for the live feed. Ticks keep the raw integer
+    fields of a frame in `__slots__` and only scale prices by the exchange
+    multiplier when a price attribute is read. Every tick also behaves like
+    the read only dictionary callbacks used to receive, so `tick['ltp']`,
+    `tick.get('volume')` and `tick.to_dict()` keep working.
+
+    The integer tick classes keep prices in the exchange's integer unit
+    (paise, or 1e-7 rupee on CDS), `price_multiplier` being the scale, so
+    comparisons and aggregation stay exact integer arithmetic.
+
+    :license: see LICENSE for details.
+"""
+from operator import attrgetter
+
+from alphatrade.decoder import WsFrameMode, LAYOUTS, PRICE_FIELDS
+
+EXCHANGE_CODES = {'NSE': 1,
+                  'NFO': 2,
+                  'CDS': 3,
+                  'MCX': 4,
+                  'BSE': 6,
+                  'BFO': 7}
+
+EXCHANGE_PRICE_MULTIPLIERS = {1: 100,
+                              2: 100,
+                              3: 10000000,
+                              4: 100,
+                              6: 100,
+                              7: 100}
+
+# lookup tables indexed by exchange code, unknown codes map to None / 1
+EXCHANGE_NAMES = tuple(
+    {code: name for name, code in EXCHANGE_CODES.items()}.get(code) for code in range(256))
+PRICE_MULTIPLIERS = tuple(
+    EXCHANGE_PRICE_MULTIPLIERS.get(code, 1) for code in range(256))
+
+
+def _price(raw_name):
+    def getter(self):
+        return getattr(self, raw_name) / PRICE_MULTIPLIERS[self.exchange_code]
+    return property(getter, doc=f'{raw_name[4:]} in rupees')
+
+
+def _prices(raw_name):
+    def getter(self):
+        multiplier = PRICE_MULTIPLIERS[self.exchange_code]
+        return [value / multiplier for value in getattr(self, raw_name)]
+    return property(getter, doc=f'{raw_name[4:]} in rupees')
+
+
+class Tick(object):
+    """ Base class of all ticks, subclasses set `mode` and list their
+        slots, the constructor is generated from the frame layout
+    """
+
+    __slots__ = ('exchange_code', 'token', 'instrument')
+    mode = None
+    _keys = ()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        layout = LAYOUTS[cls.mode]
+        # generated like namedtuple does, a plain attribute per slot is
+        # considerably faster than a setattr loop on every tick
+        lines = ['def __init__(self, values, instrument=None):']
+        index = 0
+        for name, _, count in layout.fields:
+            slot = 'exchange_code' if name == 'exchange' else (
+                f'raw_{name}' if name in PRICE_FIELDS else name)
+            if count is None:
+                lines.append(f'    self.{slot} = values[{index}]')
+                index += 1
+            else:
+                lines.append(f'    self.{slot} = values[{index}:{index + count}]')
+                index += count
+        lines.append('    self.instrument = instrument')
+        namespace = {}
+        exec('\n'.join(lines), namespace)
+        cls.__init__ = namespace['__init__']
+        cls._keys = layout.names + ('instrument',)
+        cls._struct = layout.struct
+
+    @classmethod
+    def from_frame(cls, message):
+        """ build a tick from a raw websocket frame """
+        return cls(cls._struct.unpack_from(message, 1))
+
+    @property
+    def exchange(self):
+        return EXCHANGE_NAMES[self.exchange_code]
+
+    @property
+    def price_multiplier(self):
+        return PRICE_MULTIPLIERS[self.exchange_code]
+
+    def __getitem__(self, key):
+        if key not in self._keys:
+            raise KeyError(key)
+        value = getattr(self, key)
+        # depth arrays are kept as tuples, the instrument namedtuple is not
+        return list(value) if type(value) is tuple else value
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __contains__(self, key):
+        return key in self._keys
+
+    def __iter__(self):
+        return iter(self._keys)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def keys(self):
+        return list(self._keys)
+
+    def values(self):
+        return [self[key] for key in self._keys]
+
+    def items(self):
+        return [(key, self[key]) for key in self._keys]
+
+    def to_dict(self):
+        """ the tick as the dictionary callbacks used to receive """
+        return {key: self[key] for key in self._keys}
+
+    def __eq__(self, other):
+        if isinstance(other, Tick):
+            return type(self) is type(other) and self.to_dict() == other.to_dict()
+        if isinstance(other, dict):
+            return self.to_dict() == other
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f'{type(self).__name__}({self.to_dict()})'
+
+
+class MarketDataTick(Tick):
+    """ tick of a MARKETDATA frame """
+    mode = WsFrameMode.MARKETDATA
+    __slots__ = ('raw_ltp', 'ltt', 'ltq', 'volume', 'raw_best_bid_price', 'best_bid_quantity',
+                 'raw_best_ask_price', 'best_ask_quantity', 'total_buy_quantity',
+                 'total_sell_quantity', 'raw_atp', 'exchange_time_stamp', 'raw_open',
+                 'raw_high', 'raw_low', 'raw_close', 'raw_yearly_high', 'raw_yearly_low')
+    ltp = _price('raw_ltp')
+    best_bid_price = _price('raw_best_bid_price')
+    best_ask_price = _price('raw_best_ask_price')
+    atp = _price('raw_atp')
+    open = _price('raw_open')
+    high = _price('raw_high')
+    low = _price('raw_low')
+    close = _price('raw_close')
+    yearly_high = _price('raw_yearly_high')
+    yearly_low = _price('raw_yearly_low')
+
+
+class CompactTick(Tick):
+    """ tick of a COMPACT_MARKETDATA frame """
+    mode = WsFrameMode.COMPACT_MARKETDATA
+    __slots__ = ('raw_ltp', 'change', 'exchange_time_stamp', 'volume')
+    ltp = _price('raw_ltp')
+
+
+class SnapQuoteTick(Tick):
+    """ tick of a SNAPQUOTE frame, five levels of depth on each side """
+    mode = WsFrameMode.SNAPQUOTE
+    __slots__ = ('buyers', 'raw_bid_prices', 'bid_quantities', 'sellers', 'raw_ask_prices',
+                 'ask_quantities', 'exchange_time_stamp')
+    bid_prices = _prices('raw_bid_prices')
+    ask_prices = _prices('raw_ask_prices')
+
+
+class FullSnapQuoteTick(Tick):
+    """ tick of a FULL_SNAPQUOTE frame, depth along with the day's statistics """
+    mode = WsFrameMode.FULL_SNAPQUOTE
+    __slots__ = ('buyers', 'raw_bid_prices', 'bid_quantities', 'sellers', 'raw_ask_prices',
+                 'ask_quantities', 'raw_atp', 'raw_open', 'raw_high', 'raw_low', 'raw_close',
+                 'total_buy_quantity', 'total_sell_quantity', 'volume')
+    bid_prices = _prices('raw_bid_prices')
+    ask_prices = _prices('raw_ask_prices')
+    atp = _price('raw_atp')
+    open = _price('raw_open')
+    high = _price('raw_high')
+    low = _price('raw_low')
+    close = _price('raw_close')
+
+
+class DPRTick(Tick):
+    """ daily price range of an instrument """
+    mode = WsFrameMode.DPR
+    __slots__ = ('exchange_time_stamp', 'raw_high', 'raw_low')
+    high = _price('raw_high')
+    low = _price('raw_low')
+
+
+class OpenInterestTick(Tick):
+    """ open interest of an instrument """
+    mode = WsFrameMode.OI
+    __slots__ = ('current_open_interest', 'initial_open_interest', 'exchange_time_stamp')
+
+
+TICK_CLASSES = {cls.mode: cls for cls in (MarketDataTick, CompactTick, SnapQuoteTick,
+                                          FullSnapQuoteTick, DPRTick, OpenInterestTick)}
+
+
+def _integer_class(cls):
+    # same slots and layout, price properties return the raw integers. The
+    # class is bound to a module level name below, so its ticks pickle
+    name = f'Integer{cls.__name__}'
+    namespace = {'__slots__': (), '__module__': __name__, '__qualname__': name,
+                 '__doc__': f'{cls.__doc__.strip()}, prices in integer exchange units'}
+    for field in PRICE_FIELDS:
+        if isinstance(cls.__dict__.get(field), property):
+            namespace[field] = property(attrgetter(f'raw_{field}'),
+                                        doc=f'{field} in units of 1 / price_multiplier rupee')
+    return type(name, (cls,), namespace)
+
+
+INTEGER_TICK_CLASSES = {mode: _integer_class(cls) for mode, cls in TICK_CLASSES.items()}
+globals().update((cls.__name__, cls) for cls in INTEGER_TICK_CLASSES.values())
+
+
+def decode_tick(message):
+    """ decode a raw websocket frame into a tick, None for frames that are not ticks """
+    cls = TICK_CLASSES.get(message[0])
+    if cls is None:
+        return None
+    return cls(cls._struct.unpack_from(message, 1))
+
+
+def decode_integer_tick(message):
+    """ decode_tick with prices kept in integer exchange units """
+    cls = INTEGER_TICK_CLASSES.get(message[0])
+    if cls is None:
+        return None
+    return cls(cls._struct.unpack_from(message, 1))
@@ -0,0 +1,49 @@
+"""
+    Bar building cost per tick, for one and for five intervals at once.
+
+        python -m benchmarks.bench_bars
+"""
+import timeit
+
+from alphatrade.bars import BarBuilder
+from alphatrade.ticks import CompactTick
+
+TOKENS = 200
+TICKS = 50000
+START = 1693539900  # 2023-09-01 09:15 IST
+
+
+def make_ticks(count=TICKS, tokens=TOKENS):
+    # a tick per token every few seconds, cumulative volume rising
+    return [CompactTick((1, 10000 + i % tokens, 1800000 + i % 97, 0,
+                         START + i // tokens * 3, 100 * (i // tokens + 1)))
+            for i in range(count)]
+
+
+def feed(builder, ticks):
+    update = builder.update
+    for tick in ticks:
+        update(tick)
+
+
+class Bars:
+    params = [(1,), (1, 3, 5, 15, '1H')]
+    param_names = ['intervals']
+
+    def setup(self, intervals):
+        self.ticks = make_ticks()
+
+    def time_update(self, intervals):
+        feed(BarBuilder(intervals), self.ticks)
+
+
+def main():
+    ticks = make_ticks()
+    for intervals in Bars.params:
+        best = min(timeit.repeat(lambda: feed(BarBuilder(intervals), ticks), number=1, repeat=5))
+        print(f'{len(intervals)} interval(s){len(ticks) / best:>14,.0f} ticks/s'
+              f'{best / len(ticks) * 1e9:>10,.0f} ns/tick')
+
+
+if __name__ == '__main__':
+    main()
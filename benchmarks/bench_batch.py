@@ -0,0 +1,41 @@
+"""
+    Vectorized batch decode against decoding frame by frame.
+
+        python -m benchmarks.bench_batch
+"""
+import timeit
+
+from alphatrade.batch import decode_batch, multiplier_table
+from alphatrade.decoder import TICK_MODES, decode_frame
+
+from .fixtures import make_frames
+
+MULTIPLIERS = multiplier_table({1: 100, 2: 100, 3: 10000000, 4: 100, 6: 100, 7: 100})
+FRAMES_PER_BATCH = 1000
+
+
+class DecodeBatch:
+    params = sorted(mode.name for mode in TICK_MODES)
+    param_names = ['mode']
+
+    def setup(self, mode):
+        self.mode = [m for m in TICK_MODES if m.name == mode][0]
+        self.frames = make_frames(self.mode, FRAMES_PER_BATCH)
+
+    def time_decode_batch(self, mode):
+        decode_batch(self.mode, self.frames, MULTIPLIERS)
+
+
+def main():
+    print(f"{'frame mode':<20}{'batch ticks/s':>18}{'per frame ticks/s':>20}")
+    for mode in sorted(TICK_MODES):
+        frames = make_frames(mode, FRAMES_PER_BATCH)
+        batch = min(timeit.repeat(lambda: decode_batch(mode, frames, MULTIPLIERS),
+                                  number=1, repeat=5))
+        single = min(timeit.repeat(lambda: [decode_frame(f) for f in frames],
+                                   number=1, repeat=5))
+        print(f'{mode.name:<20}{len(frames) / batch:>18,.0f}{len(frames) / single:>20,.0f}')
+
+
+if __name__ == '__main__':
+    main()
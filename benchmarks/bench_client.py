@@ -0,0 +1,192 @@
+"""
+    Client side hot paths outside the feed decoder: human readable message
+    values, master contract parsing, instrument search, candle formatting
+    and basket order validation.
+
+        python -m benchmarks.bench_client
+"""
+from datetime import date
+import contextlib
+import io
+import random
+import timeit
+
+from alphatrade import Instrument, OrderType, ProductType, TransactionType
+from alphatrade.decoder import WsFrameMode, decode_frame
+
+from .fixtures import EXPIRIES, make_contracts, make_frames, offline_client
+
+CONTRACTS = 50000
+CANDLES = 100000
+BASKET = 20
+MESSAGES = 1000
+
+
+def make_candles(count=CANDLES, start=1672544700, step=60):
+    """ a chart payload row list of [time, open, high, low, close, volume] """
+    rng = random.Random(1)
+    price = 1800000
+    rows = []
+    for i in range(count):
+        high = price + rng.randint(0, 500)
+        low = price - rng.randint(0, 500)
+        close = rng.randint(low, high)
+        rows.append([start + i * step, price, high, low, close, rng.randint(1, 100000)])
+        price = close
+    return rows
+
+
+def make_basket(instrument, count=BASKET):
+    orders = []
+    for i in range(count):
+        order = {'instrument': instrument,
+                 'order_type': OrderType.Limit if i % 2 else OrderType.StopLossLimit,
+                 'quantity': 50,
+                 'price': 1800.0,
+                 'transaction_type': TransactionType.Buy if i % 2 else TransactionType.Sell,
+                 'product_type': ProductType.Intraday}
+        if order['order_type'] == OrderType.StopLossLimit:
+            order['trigger_price'] = 1799.0
+        orders.append(order)
+    return orders
+
+
+def fno_queries(count=100):
+    """ (symbol, expiry, is_fut, strike, is_call) of contracts in make_contracts """
+    queries = []
+    for i in range(count):
+        underlying = ('NIFTY', 'BANKNIFTY', 'RELIANCE', 'TCS')[i % 4]
+        expiry = date.fromtimestamp(EXPIRIES[i % len(EXPIRIES)])
+        if i % 5 == 0:
+            queries.append((underlying, expiry, True, None, False))
+        else:
+            queries.append((underlying, expiry, False, 1000 + 50 * (i % 20), i % 2 == 0))
+    return queries
+
+
+class HumanReadable:
+    params = [WsFrameMode.MARKET_STATUS.name, WsFrameMode.EXCHANGE_MESSAGES.name]
+    param_names = ['mode']
+
+    def setup(self, mode):
+        self.client = offline_client({'NSE': make_contracts('NSE', 1000)})
+        self.decoded = [decode_frame(frame)[1]
+                        for frame in make_frames(WsFrameMode[mode], MESSAGES)]
+
+    def time_modify_human_readable_values(self, mode):
+        modify = self.client._AlphaTrade__modify_human_readable_values
+        for message in self.decoded:
+            modify(dict(message))
+
+
+class MasterContract:
+    timeout = 120
+
+    def setup(self):
+        self.client = offline_client({'NFO': make_contracts('NFO', CONTRACTS)})
+
+    def time_get_master_contract(self):
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.client._AlphaTrade__get_master_contract('NFO', refresh=True)
+
+
+class Search:
+    def setup(self):
+        # NSE has an underlying per contract, the worst case of the index
+        self.client = offline_client({'NFO': make_contracts('NFO', CONTRACTS),
+                                      'NSE': make_contracts('NSE', CONTRACTS)})
+        self.queries = fno_queries()
+        self.nfo = self.client.get_master_contract('NFO')
+        self.nse = self.client.get_master_contract('NSE')
+        self.nse.underlying_rows('TATA')
+
+    def time_search_instruments(self):
+        self.client.search_instruments('NFO', 'NIFTY')
+
+    def time_search_instruments_list(self):
+        self.client.search_instruments('NFO', ['TCS', 'INFY', 'SBIN'])
+
+    def time_search_instruments_fuzzy(self):
+        self.client.search_instruments('NFO', 'BANKNIFY', match='fuzzy')
+
+    def time_underlying_rows(self):
+        self.nfo.underlying_rows('NIFTY')
+
+    def time_underlying_rows_nse(self):
+        self.nse.underlying_rows('TATA')
+        self.nse.underlying_rows('TATA', match='prefix')
+
+    def time_get_instrument_for_fno(self):
+        for query in self.queries[:10]:
+            self.client.get_instrument_for_fno(*query)
+
+
+class Candles:
+    timeout = 120
+
+    def setup(self):
+        self.client = offline_client({'NSE': make_contracts('NSE', 100)})
+        self.rows = make_candles()
+
+    def time_format_candles(self):
+        self.client._AlphaTrade__format_candles({'data': self.rows})
+
+    def time_format_candles_history(self):
+        self.client._format_candles({'data': {'candles': self.rows}}, 1)
+
+
+class Basket:
+    def setup(self):
+        self.client = offline_client({'NSE': make_contracts('NSE', 100)})
+        self.instrument = Instrument('NSE', 10000, 'NIFTY', 'NIFTY LIMITED', None, 1)
+
+    def time_place_basket_order(self):
+        # validation rewrites the orders, so every round gets fresh ones
+        self.client.place_basket_order(make_basket(self.instrument))
+
+
+def best_of(func, repeat=5, number=1):
+    return min(timeit.repeat(func, number=number, repeat=repeat)) / number
+
+
+def main():
+    client = offline_client({'NFO': make_contracts('NFO', CONTRACTS),
+                             'NSE': make_contracts('NSE', CONTRACTS)})
+    modify = client._AlphaTrade__modify_human_readable_values
+    for mode in (WsFrameMode.MARKET_STATUS, WsFrameMode.EXCHANGE_MESSAGES):
+        decoded = [decode_frame(frame)[1] for frame in make_frames(mode, MESSAGES)]
+        best = best_of(lambda: [modify(dict(message)) for message in decoded])
+        print(f'human readable {mode.name:<20}{best / MESSAGES * 1e6:>12.2f} us/message')
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        best = best_of(lambda: client._AlphaTrade__get_master_contract('NFO', refresh=True), repeat=3)
+    print(f'master contract NFO {CONTRACTS:,} scrips{best * 1e3:>13.0f} ms')
+
+    best = best_of(lambda: client.search_instruments('NFO', 'NIFTY'))
+    print(f"{'search_instruments':<36}{best * 1e3:>12.2f} ms")
+    best = best_of(lambda: client.search_instruments('NFO', 'BANKNIFY', match='fuzzy'))
+    print(f"{'search_instruments fuzzy':<36}{best * 1e3:>12.2f} ms")
+    for exchange, query in (('NFO', 'NIFTY'), ('NSE', 'TATA')):
+        table = client.get_master_contract(exchange)
+        start = timeit.default_timer()
+        table.underlying_rows(query)
+        first = timeit.default_timer() - start
+        best = best_of(lambda: table.underlying_rows(query), number=100)
+        print(f"{'underlying_rows ' + exchange:<24}{first * 1e3:>8.1f} ms first{best * 1e6:>10.1f} us")
+    queries = fno_queries()
+    best = best_of(lambda: [client.get_instrument_for_fno(*query) for query in queries], repeat=1)
+    print(f"{'get_instrument_for_fno':<36}{best / len(queries) * 1e3:>12.2f} ms/call")
+
+    rows = make_candles()
+    for name, func in (('__format_candles', lambda: client._AlphaTrade__format_candles({'data': rows})),
+                       ('_format_candles', lambda: client._format_candles({'data': {'candles': rows}}, 1))):
+        best = best_of(func, repeat=3)
+        print(f'{name:<22}{CANDLES:,} rows{best * 1e3:>12.0f} ms')
+
+    instrument = client.get_instrument_by_token('NSE', 10000)
+    best = best_of(lambda: client.place_basket_order(make_basket(instrument)), number=100)
+    print(f'place_basket_order {BASKET} orders{best * 1e6:>16.0f} us')
+
+
+if __name__ == '__main__':
+    main()
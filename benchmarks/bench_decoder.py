@@ -0,0 +1,93 @@
+"""
+    Frame decode throughput, precompiled struct layouts against protlib.
+
+    Run directly for a ticks/s table:
+
+        python -m benchmarks.bench_decoder
+"""
+import timeit
+
+from alphatrade.alphatrade import (MarketData, CompactData, SnapQuote, FullSnapQuote,
+                                   DPR, OpenInterest, MarketStatus, ExchangeMessage)
+from alphatrade.decoder import WsFrameMode, decode_frame
+from alphatrade.ticks import TICK_CLASSES, decode_integer_tick, decode_tick
+
+from .fixtures import make_frames
+
+PROTLIB_CLASSES = {
+    WsFrameMode.MARKETDATA: MarketData,
+    WsFrameMode.COMPACT_MARKETDATA: CompactData,
+    WsFrameMode.SNAPQUOTE: SnapQuote,
+    WsFrameMode.FULL_SNAPQUOTE: FullSnapQuote,
+    WsFrameMode.DPR: DPR,
+    WsFrameMode.OI: OpenInterest,
+    WsFrameMode.MARKET_STATUS: MarketStatus,
+    WsFrameMode.EXCHANGE_MESSAGES: ExchangeMessage,
+}
+
+FRAMES_PER_ROUND = 1000
+
+
+def decode_struct(frames):
+    for frame in frames:
+        decode_frame(frame)
+
+
+def decode_ticks(frames):
+    for frame in frames:
+        decode_tick(frame)
+
+
+def decode_integer_ticks(frames):
+    for frame in frames:
+        decode_integer_tick(frame)
+
+
+def decode_protlib(cls, frames):
+    for frame in frames:
+        cls.parse(frame[1:]).__dict__
+
+
+class Decode:
+    params = [mode.name for mode in PROTLIB_CLASSES]
+    param_names = ['mode']
+
+    def setup(self, mode):
+        self.mode = WsFrameMode[mode]
+        self.frames = make_frames(self.mode, FRAMES_PER_ROUND)
+
+    def time_struct(self, mode):
+        decode_struct(self.frames)
+
+    def time_tick(self, mode):
+        if self.mode not in TICK_CLASSES:
+            raise NotImplementedError
+        decode_ticks(self.frames)
+
+    def time_integer_tick(self, mode):
+        if self.mode not in TICK_CLASSES:
+            raise NotImplementedError
+        decode_integer_ticks(self.frames)
+
+    def time_protlib(self, mode):
+        decode_protlib(PROTLIB_CLASSES[self.mode], self.frames)
+
+
+def ticks_per_second(func, frames, repeat=5):
+    best = min(timeit.repeat(lambda: func(frames), number=1, repeat=repeat))
+    return len(frames) / best
+
+
+def main():
+    print(f"{'frame mode':<20}{'struct ticks/s':>18}{'Tick ticks/s':>18}"
+          f"{'protlib ticks/s':>18}{'speedup':>10}")
+    for mode, cls in PROTLIB_CLASSES.items():
+        frames = make_frames(mode, FRAMES_PER_ROUND)
+        fast = ticks_per_second(decode_struct, frames)
+        tick = ticks_per_second(decode_ticks, frames) if mode in TICK_CLASSES else float('nan')
+        slow = ticks_per_second(lambda f: decode_protlib(cls, f), frames)
+        print(f'{mode.name:<20}{fast:>18,.0f}{tick:>18,.0f}{slow:>18,.0f}{fast / slow:>9.1f}x')
+
+
+if __name__ == '__main__':
+    main()
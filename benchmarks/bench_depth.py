@@ -0,0 +1,64 @@
+"""
+    Depth book updates per tick and per batch, and the vectorized queries
+    over a whole option chain.
+
+        python -m benchmarks.bench_depth
+"""
+import timeit
+
+from alphatrade import DepthBook
+from alphatrade.batch import decode_batch, multiplier_table
+from alphatrade.decoder import WsFrameMode
+from alphatrade.ticks import EXCHANGE_PRICE_MULTIPLIERS, decode_tick
+
+from .fixtures import make_frames
+
+TOKENS = 1000
+MULTIPLIERS = multiplier_table(EXCHANGE_PRICE_MULTIPLIERS)
+
+
+def feed(book, ticks):
+    update = book.update
+    for tick in ticks:
+        update(tick)
+
+
+class Depth:
+    params = [WsFrameMode.SNAPQUOTE.name, WsFrameMode.FULL_SNAPQUOTE.name]
+    param_names = ['mode']
+
+    def setup(self, mode):
+        frames = make_frames(WsFrameMode[mode], TOKENS, exchange=2)
+        self.ticks = [decode_tick(frame) for frame in frames]
+        self.batch = decode_batch(WsFrameMode[mode], frames, MULTIPLIERS)
+        self.book = DepthBook(TOKENS)
+        feed(self.book, self.ticks)
+
+    def time_update(self, mode):
+        feed(self.book, self.ticks)
+
+    def time_update_batch(self, mode):
+        self.book.update_batch(self.batch)
+
+    def time_queries(self, mode):
+        book = self.book
+        book.spread()
+        book.mid()
+        book.microprice()
+        book.imbalance()
+        book.cumulative_depth(side='bid')
+        book.cumulative_depth(side='ask')
+
+
+def main():
+    bench = Depth()
+    for mode in Depth.params:
+        bench.setup(mode)
+        for name in ('update', 'update_batch', 'queries'):
+            func = getattr(bench, f'time_{name}')
+            best = min(timeit.repeat(lambda: func(mode), number=1, repeat=5))
+            print(f'{mode:<16}{name:<14}{best / TOKENS * 1e9:>10,.0f} ns/token')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+"""
+    Per-tick instrument enrichment on its own, the (exchange code, token)
+    index lookup against the public get_instrument_by_token.
+
+        python -m benchmarks.bench_enrichment
+"""
+import timeit
+
+from alphatrade.ticks import decode_tick
+
+from .fixtures import make_contracts, make_frame, offline_client
+
+CONTRACTS = 50000
+TICKS = 10000
+
+
+def enrich(client, ticks):
+    lookup = client.get_instrument_by_token
+    for tick in ticks:
+        tick.instrument = lookup(tick.exchange_code, tick.token)
+
+
+def enrich_by_name(client, ticks):
+    lookup = client.get_instrument_by_token
+    for tick in ticks:
+        tick.instrument = lookup(tick.exchange, tick.token)
+
+
+def make_ticks():
+    # NFO ticks for tokens spread over the whole contract list
+    step = CONTRACTS // TICKS
+    return [decode_tick(make_frame(1, exchange=2, token=10000 + i * step)) for i in range(TICKS)]
+
+
+class Enrichment:
+    def setup(self):
+        self.client = offline_client({'NFO': make_contracts('NFO', CONTRACTS)})
+        self.ticks = make_ticks()
+
+    def time_enrich_by_code(self):
+        enrich(self.client, self.ticks)
+
+    def time_enrich_by_name(self):
+        enrich_by_name(self.client, self.ticks)
+
+
+def main():
+    client = offline_client({'NFO': make_contracts('NFO', CONTRACTS)})
+    ticks = make_ticks()
+    for name, func in (('exchange code', enrich), ('exchange name', enrich_by_name)):
+        best = min(timeit.repeat(lambda: func(client, ticks), number=1, repeat=5))
+        print(f'enrich by {name:<15}{len(ticks) / best:>14,.0f} ticks/s'
+              f'{best / len(ticks) * 1e9:>10,.0f} ns/tick')
+    assert all(tick.instrument is not None for tick in ticks)
+
+
+if __name__ == '__main__':
+    main()
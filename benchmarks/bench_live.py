@@ -0,0 +1,53 @@
+"""
+    Live feed throughput and latency over loopback against the local
+    simulator, the whole path from the socket to the callback.
+
+        python -m benchmarks.bench_live [seconds]
+"""
+import contextlib
+import io
+import sys
+import time
+
+from alphatrade import AlphaTrade, LiveFeedType
+from alphatrade.simulator import FIRST_TOKEN, Simulator
+
+TOKENS = 1000
+RATES = (5000, 20000, 50000)
+
+
+def run(rate, seconds=5):
+    with Simulator(exchanges=('NSE',), tokens=TOKENS, rate=rate) as simulator, \
+            contextlib.redirect_stdout(io.StringIO()):
+        client = AlphaTrade('LOGIN', 'password', '123456', access_token='x' * 128,
+                            host=simulator.url, master_contracts_to_download=['NSE'],
+                            contract_cache=None)
+        received = [0]
+
+        def on_tick(tick):
+            received[0] += 1
+
+        client.start_websocket(subscribe_callback=on_tick, run_in_background=True, feed_stats=True)
+        client.wait_connected(10)
+        client.subscribe([client.get_instrument_by_token('NSE', FIRST_TOKEN + i) for i in range(TOKENS)],
+                         LiveFeedType.COMPACT)
+        time.sleep(1)
+        client.reset_feed_stats()
+        start = received[0]
+        time.sleep(seconds)
+        count = received[0] - start
+        stats = client.get_feed_stats()
+    total = stats['by_frame_type']['COMPACT_MARKETDATA']['total']
+    return count / seconds, total
+
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 5
+    print(f"{'sent frames/s':>14}{'received ticks/s':>18}{'p50 us':>10}{'p99 us':>10}{'max us':>10}")
+    for rate in RATES:
+        ticks_per_second, total = run(rate, seconds)
+        print(f"{rate:>14,}{ticks_per_second:>18,.0f}{total['p50']:>10}{total['p99']:>10}{total['max']:>10}")
+
+
+if __name__ == '__main__':
+    main()
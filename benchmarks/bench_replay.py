@@ -0,0 +1,70 @@
+"""
+    End to end throughput of the feed pipeline, a recorded frame log replayed
+    as fast as possible through decoding, enrichment, the quote store and the
+    callback.
+
+        python -m benchmarks.bench_replay
+"""
+import os
+import tempfile
+import time
+
+from alphatrade.decoder import WsFrameMode
+from alphatrade.recorder import FrameRecorder
+
+from .fixtures import make_contracts, make_frames, offline_client
+
+CONTRACTS = 5000
+FRAMES = 20000
+MODES = (WsFrameMode.MARKETDATA, WsFrameMode.COMPACT_MARKETDATA,
+         WsFrameMode.SNAPQUOTE, WsFrameMode.FULL_SNAPQUOTE)
+
+
+def record(path, mode, count=FRAMES):
+    frames = make_frames(mode, count)
+    started = time.time()
+    with FrameRecorder(path) as recorder:
+        for i, frame in enumerate(frames):
+            recorder.record(frame, started + i * 1e-4)
+
+
+class Replay:
+    params = [mode.name for mode in MODES]
+    param_names = ['mode']
+
+    def setup(self, mode):
+        self.client = offline_client({'NSE': make_contracts('NSE', CONTRACTS)})
+        fd, self.path = tempfile.mkstemp(suffix='.frames')
+        os.close(fd)
+        os.remove(self.path)
+        record(self.path, WsFrameMode[mode])
+
+    def teardown(self, mode):
+        os.remove(self.path)
+
+    def time_replay(self, mode):
+        self.client.replay_frames(self.path, speed=None, subscribe_callback=lambda tick: None)
+
+    def time_replay_feed_stats(self, mode):
+        self.client.replay_frames(self.path, speed=None, subscribe_callback=lambda tick: None,
+                                  feed_stats=True)
+
+
+def main():
+    client = offline_client({'NSE': make_contracts('NSE', CONTRACTS)})
+    print(f"{'frame mode':<20}{'ticks/s':>14}{'dispatched ticks/s':>20}{'with feed_stats':>18}")
+    with tempfile.TemporaryDirectory() as directory:
+        for mode in MODES:
+            path = os.path.join(directory, f'{mode.name}.frames')
+            record(path, mode)
+            inline = client.replay_frames(path, speed=None, subscribe_callback=lambda tick: None)
+            dispatched = client.replay_frames(path, speed=None, subscribe_callback=lambda tick: None,
+                                              dispatch_threads=2)
+            timed = client.replay_frames(path, speed=None, subscribe_callback=lambda tick: None,
+                                         feed_stats=True)
+            print(f"{mode.name:<20}{inline['frames_per_second']:>14,.0f}"
+                  f"{dispatched['frames_per_second']:>20,.0f}{timed['frames_per_second']:>18,.0f}")
+
+
+if __name__ == '__main__':
+    main()
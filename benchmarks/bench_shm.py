@@ -0,0 +1,68 @@
+"""
+    Shared memory fan-out, publishing ticks one by one and in batches and
+    reading them back in another object attached to the same ring.
+
+        python -m benchmarks.bench_shm
+"""
+import timeit
+
+from alphatrade import TickPublisher, TickSubscriber
+from alphatrade.batch import decode_batch, multiplier_table
+from alphatrade.decoder import WsFrameMode
+from alphatrade.ticks import EXCHANGE_PRICE_MULTIPLIERS, decode_tick
+
+from .fixtures import make_frames
+
+TICKS = 10000
+MULTIPLIERS = multiplier_table(EXCHANGE_PRICE_MULTIPLIERS)
+MODES = (WsFrameMode.COMPACT_MARKETDATA, WsFrameMode.MARKETDATA, WsFrameMode.SNAPQUOTE,
+         WsFrameMode.FULL_SNAPQUOTE)
+
+
+def publish(publisher, ticks):
+    publish = publisher.publish
+    for tick in ticks:
+        publish(tick, 0.0)
+
+
+class SharedMemory:
+    params = [mode.name for mode in MODES]
+    param_names = ['mode']
+
+    def setup(self, mode):
+        frames = make_frames(WsFrameMode[mode], TICKS)
+        self.ticks = [decode_tick(frame) for frame in frames]
+        self.batch = decode_batch(WsFrameMode[mode], frames, MULTIPLIERS)
+        self.publisher = TickPublisher(capacity=TICKS * 2)
+        self.subscriber = TickSubscriber(self.publisher.name)
+
+    def teardown(self, mode):
+        self.subscriber.close()
+        self.publisher.close()
+
+    def time_publish(self, mode):
+        publish(self.publisher, self.ticks)
+
+    def time_publish_batch(self, mode):
+        self.publisher.publish_batch(WsFrameMode[mode], self.batch)
+
+    def time_publish_and_read(self, mode):
+        self.publisher.publish_batch(WsFrameMode[mode], self.batch)
+        self.subscriber.read()
+
+
+def main():
+    bench = SharedMemory()
+    print(f"{'frame mode':<20}{'publish ticks/s':>18}{'batch ticks/s':>18}{'batch + read':>16}")
+    for mode in SharedMemory.params:
+        bench.setup(mode)
+        rates = []
+        for func in (bench.time_publish, bench.time_publish_batch, bench.time_publish_and_read):
+            best = min(timeit.repeat(lambda: func(mode), number=1, repeat=5))
+            rates.append(TICKS / best)
+        bench.teardown(mode)
+        print(f'{mode:<20}{rates[0]:>18,.0f}{rates[1]:>18,.0f}{rates[2]:>16,.0f}')
+
+
+if __name__ == '__main__':
+    main()
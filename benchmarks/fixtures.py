@@ -0,0 +1,131 @@
+"""
+    Synthetic fixtures shared by the benchmarks, nothing here needs a
+    network connection or a logged in session.
+"""
+import contextlib
+import io
+import json
+import struct
+from unittest import mock
+
+from alphatrade import AlphaTrade
+from alphatrade.decoder import WsFrameMode, LAYOUTS
+
+
+def make_frame(mode, exchange=1, token=26000, seed=1):
+    """ build a binary websocket frame for a fixed size frame mode """
+    layout = LAYOUTS[mode]
+    values = []
+    for index, (name, code, count) in enumerate(layout.fields):
+        if name == 'exchange':
+            values.append(exchange)
+        elif name == 'token':
+            values.append(token)
+        elif code == 'B':
+            values.append((seed + index) % 256)
+        else:
+            values.extend([1800000 + seed * 100 + index] * (count or 1))
+    return bytes([mode]) + layout.struct.pack(*values)
+
+
+def make_market_status_frame(exchange=1, market_type=b'Normal', status=b'Open'):
+    return (bytes([WsFrameMode.MARKET_STATUS]) +
+            struct.pack('>BH', exchange, len(market_type)) + market_type +
+            struct.pack('>H', len(status)) + status)
+
+
+def make_exchange_message_frame(exchange=1, message=b'Trading halted', time_stamp=1600000000):
+    return (bytes([WsFrameMode.EXCHANGE_MESSAGES]) +
+            struct.pack('>BH', exchange, len(message)) + message +
+            struct.pack('>I', time_stamp))
+
+
+def make_frames(mode, count=1000, exchange=1):
+    """ build `count` frames of a mode spread over distinct tokens """
+    if mode == WsFrameMode.MARKET_STATUS:
+        return [make_market_status_frame(exchange) for _ in range(count)]
+    if mode == WsFrameMode.EXCHANGE_MESSAGES:
+        return [make_exchange_message_frame(exchange) for _ in range(count)]
+    return [make_frame(mode, exchange, 10000 + i, i) for i in range(count)]
+
+
+UNDERLYINGS = ('NIFTY', 'BANKNIFTY', 'FINNIFTY', 'RELIANCE', 'TCS', 'INFY', 'HDFCBANK',
+               'ICICIBANK', 'SBIN', 'TATASTEEL', 'ONGC', 'ACC', 'ITC', 'LT', 'WIPRO')
+EXPIRIES = (1695895200, 1696500000, 1697104800, 1698314400)
+
+
+def make_contracts(exchange, count):
+    """ a contracts.json payload with `count` scrips, derivatives exchanges
+        get futures and option chains spread over a few expiries
+    """
+    scrips = []
+    derivative = exchange in ('NFO', 'BFO', 'MCX', 'CDS')
+    for i in range(count):
+        underlying = UNDERLYINGS[i % len(UNDERLYINGS)]
+        scrip = {'code': str(10000 + i), 'exchange': exchange,
+                 'company': f'{underlying} LIMITED'}
+        if derivative:
+            expiry = EXPIRIES[(i // len(UNDERLYINGS)) % len(EXPIRIES)]
+            month = ('SEP', 'OCT', 'OCT', 'OCT')[EXPIRIES.index(expiry)]
+            series = i // (len(UNDERLYINGS) * len(EXPIRIES))
+            if series == 0:
+                scrip['symbol'] = f'{underlying} {expiry % 97:02d}{month}23 FUT'
+            else:
+                strike = 1000 + 50 * (series // 2)
+                side = 'CE' if series % 2 else 'PE'
+                scrip['symbol'] = f'{underlying} {expiry % 97:02d}{month}23 {strike} {side}'
+            scrip['expiry'] = expiry
+            scrip['lotSize'] = 50
+        else:
+            scrip['symbol'] = f'{underlying}{i}-EQ' if i >= len(UNDERLYINGS) else underlying
+            scrip['lotSize'] = 1
+        scrips.append(scrip)
+    return {f'{exchange}-SEG': scrips}
+
+
+class FakeResponse(object):
+    def __init__(self, payload, status_code=200):
+        self.status_code = status_code
+        self.text = payload if isinstance(payload, str) else json.dumps(payload)
+
+    def json(self):
+        return json.loads(self.text)
+
+    def iter_content(self, chunk_size=1):
+        content = self.text.encode()
+        for start in range(0, len(content), chunk_size):
+            yield content[start:start + chunk_size]
+
+    def close(self):
+        pass
+
+
+class FakeSession(object):
+    """ stands in for requests.Session, answers the calls made while an
+        AlphaTrade object is created
+    """
+
+    def __init__(self, contracts):
+        self.contracts = {exchange: json.dumps(payload) for exchange, payload in contracts.items()}
+
+    def get(self, url, params=None, headers=None, **kwargs):
+        if 'contracts.json' in url:
+            return FakeResponse(self.contracts[url.rsplit('=', 1)[1]])
+        return FakeResponse({'status': 'success', 'data': {}})
+
+    def post(self, url, data=None, json=None, headers=None, **kwargs):
+        return FakeResponse({'status': 'success', 'data': {}})
+
+    put = post
+    delete = get
+
+
+def offline_client(contracts):
+    """ an AlphaTrade object logged into nothing, `contracts` maps exchange
+        names to contracts.json payloads (see `make_contracts`)
+    """
+    session = FakeSession(contracts)
+    with mock.patch('alphatrade.alphatrade.requests.session', return_value=session), \
+            contextlib.redirect_stdout(io.StringIO()):
+        return AlphaTrade('LOGIN', 'password', '123456', access_token='x' * 128,
+                          master_contracts_to_download=list(contracts), contract_cache=None)
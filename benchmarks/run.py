@@ -0,0 +1,165 @@
+"""
+    Runs the asv style benchmarks in this directory without asv, appends the
+    timings to a history file per machine and compares them against the
+    previous run, so a slower hot path shows up before a release.
+
+        python -m benchmarks.run                      # everything
+        python -m benchmarks.run -b Decode -b Search  # names matching a regex
+        python -m benchmarks.run --check              # exit 1 on a regression
+
+    With asv installed the same classes run through `asv run` / `asv
+    continuous` and the configuration in asv.conf.json.
+"""
+import argparse
+import importlib
+import inspect
+import itertools
+import json
+import os
+import pkgutil
+import platform
+import re
+import subprocess
+import sys
+import time
+import timeit
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+
+
+def discover(patterns=()):
+    """ yields (name, class, method name, params) of every time_ method, name
+        being module.Class.method
+    """
+    package = os.path.dirname(os.path.abspath(__file__))
+    for info in sorted(pkgutil.iter_modules([package]), key=lambda info: info.name):
+        if not info.name.startswith('bench_'):
+            continue
+        module = importlib.import_module(f'{__package__}.{info.name}')
+        for cls_name, cls in inspect.getmembers(module, inspect.isclass):
+            if cls.__module__ != module.__name__:
+                continue
+            for method in sorted(name for name in vars(cls) if name.startswith('time_')):
+                name = f'{info.name}.{cls_name}.{method}'
+                if patterns and not any(re.search(pattern, name) for pattern in patterns):
+                    continue
+                yield name, cls, method, _param_combinations(cls)
+
+
+def _param_combinations(cls):
+    # asv semantics, a list of lists is a cartesian product
+    params = getattr(cls, 'params', None)
+    if not params:
+        return [()]
+    if isinstance(params[0], list):
+        return list(itertools.product(*params))
+    return [(param,) for param in params]
+
+
+def time_benchmark(cls, method, args, repeat=5, min_time=0.1):
+    """ best seconds per call, None when the benchmark skips this combination """
+    bench = cls()
+    try:
+        if hasattr(bench, 'setup'):
+            bench.setup(*args)
+        func = getattr(bench, method)
+        func(*args)
+        # calls per sample so a sample takes about min_time
+        number = 1
+        while True:
+            elapsed = timeit.timeit(lambda: func(*args), number=number)
+            if elapsed >= min_time or number >= 1000000:
+                break
+            number *= 10 if elapsed < min_time / 10 else 2
+        samples = [elapsed] + timeit.repeat(lambda: func(*args), number=number, repeat=repeat - 1)
+        return min(samples) / number
+    except NotImplementedError:
+        return None
+    finally:
+        if hasattr(bench, 'teardown'):
+            bench.teardown(*args)
+
+
+def machine():
+    return re.sub(r'[^\w.-]', '_', platform.node() or 'unknown')
+
+
+def commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def load_history(path):
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def previous_results(history):
+    """ latest timing of every benchmark over the earlier runs """
+    results = {}
+    for run in history:
+        results.update(run['results'])
+    return results
+
+
+def format_time(seconds):
+    for unit, scale in (('s', 1), ('ms', 1e-3), ('us', 1e-6)):
+        if seconds >= scale:
+            return f'{seconds / scale:.3g}{unit}'
+    return f'{seconds / 1e-9:.3g}ns'
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run the benchmarks and track their history')
+    parser.add_argument('-b', '--bench', action='append', default=[],
+                        help='regular expression of benchmark names to run, repeatable')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--threshold', type=float, default=1.2,
+                        help='ratio to the previous run reported as a regression')
+    parser.add_argument('--check', action='store_true', help='exit with 1 on a regression')
+    parser.add_argument('--no-save', action='store_true', help='do not append to the history')
+    parser.add_argument('--history', default=os.path.join(RESULTS_DIR, f'{machine()}.jsonl'))
+    args = parser.parse_args(argv)
+
+    previous = previous_results(load_history(args.history))
+    results = {}
+    regressions = []
+    for name, cls, method, combinations in discover(args.bench):
+        for params in combinations:
+            key = f"{name}({', '.join(map(str, params))})" if params else name
+            seconds = time_benchmark(cls, method, params, args.repeat)
+            if seconds is None:
+                continue
+            results[key] = seconds
+            line = f'{key:<80}{format_time(seconds):>10}'
+            if key in previous:
+                ratio = seconds / previous[key]
+                line += f'{ratio:>8.2f}x'
+                if ratio > args.threshold:
+                    regressions.append(key)
+                    line += '  slower'
+            print(line, flush=True)
+
+    if not args.no_save and results:
+        os.makedirs(os.path.dirname(os.path.abspath(args.history)), exist_ok=True)
+        with open(args.history, 'a', encoding='utf-8') as f:
+            f.write(json.dumps({'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                                'commit': commit(),
+                                'python': platform.python_version(),
+                                'results': results}) + '\n')
+    if regressions:
+        print(f'{len(regressions)} benchmark(s) more than {args.threshold}x slower than before:')
+        for key in regressions:
+            print(f'  {key}')
+        if args.check:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
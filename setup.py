@@ -13,10 +13,11 @@ setuptools.setup(
     long_description_content_type='text/markdown',  author='Algo 2 Trade',
     author_email='help@algo2.trade',
     url='https://github.com/algo2t/alphatrade',
-    install_requires=['setuptools==70.0.0','requests', 'websocket_client', 'protlib', 'pandas','pyotp'],
+    install_requires=['setuptools==70.0.0','requests', 'websocket_client', 'protlib', 'numpy', 'pandas','pyotp'],
+    extras_require={'asyncio': ['websockets']},
     keywords=['alphatrade', 'alpha-trade', 'sasonline',
               'python', 'sdk', 'trading', 'stock markets'],
-    python_requires='>=3.7',
+    python_requires='>=3.8',
     classifiers=[
         'Development Status :: 5 - Production/Stable',
         'Intended Audience :: Developers',
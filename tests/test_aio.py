@@ -0,0 +1,89 @@
+import asyncio
+import json
+
+import pytest
+
+from alphatrade import AsyncAlphaTrade, LiveFeedType, ReconnectPolicy
+from alphatrade.decoder import WsFrameMode
+
+websockets = pytest.importorskip('websockets')
+
+
+@pytest.fixture
+def client(offline_client, make_contracts):
+    return offline_client({'NSE': make_contracts('NSE', 5)})
+
+
+def feed_of(client, port, **kwargs):
+    # the websocket of the client points at a local server
+    client._AlphaTrade__socket_endpoint = f'ws://127.0.0.1:{port}/?token={{access_token}}'
+    kwargs.setdefault('reconnect_policy', ReconnectPolicy(initial_delay=0.01, jitter=0))
+    return AsyncAlphaTrade(client, **kwargs)
+
+
+def test_connect_timeout(client):
+    async def main():
+        # accepts the connection but never answers the handshake
+        server = await asyncio.start_server(lambda reader, writer: None, '127.0.0.1', 0)
+        port = server.sockets[0].getsockname()[1]
+        feed = feed_of(client, port)
+        try:
+            with pytest.raises(asyncio.TimeoutError):
+                await feed.connect(timeout=0.2)
+            assert not feed.connected
+        finally:
+            server.close()
+            await server.wait_closed()
+
+    asyncio.run(main())
+
+
+def test_connect_gives_up(client):
+    async def main():
+        server = await asyncio.start_server(lambda reader, writer: writer.close(), '127.0.0.1', 0)
+        port = server.sockets[0].getsockname()[1]
+        server.close()
+        await server.wait_closed()
+        feed = feed_of(client, port, reconnect_policy=ReconnectPolicy(
+            initial_delay=0.01, jitter=0, max_attempts=2))
+        with pytest.raises(ConnectionError):
+            await feed.connect(timeout=5)
+
+    asyncio.run(main())
+
+
+def test_chunked_resubscribe_and_market_data_ticks_only(client, make_frame):
+    instruments = [client.get_instrument_by_token('NSE', 10000 + i) for i in range(5)]
+    connections = []
+
+    async def handler(ws, *args):
+        messages = []
+        connections.append(messages)
+        async for message in ws:
+            messages.append(json.loads(message))
+            subscribed = sum(len(m['v']) for m in messages if m['a'] == 'subscribe')
+            if subscribed == len(instruments):
+                await ws.send(make_frame(WsFrameMode.DPR, token=10000))
+                await ws.send(make_frame(WsFrameMode.COMPACT_MARKETDATA, token=10000))
+                if len(connections) == 1:
+                    # drop the first connection once everything was subscribed
+                    await ws.close()
+
+    async def main():
+        async with websockets.serve(handler, '127.0.0.1', 0) as server:
+            port = server.sockets[0].getsockname()[1]
+            feed = feed_of(client, port, subscription_chunk_size=2, subscription_pace=0)
+            async with feed:
+                await feed.subscribe(instruments, LiveFeedType.COMPACT)
+                ticks = feed.ticks()
+                received = [await asyncio.wait_for(ticks.__anext__(), 5) for _ in range(2)]
+                await ticks.aclose()
+        return received
+
+    received = asyncio.run(main())
+    assert [tick.mode for tick in received] == [WsFrameMode.COMPACT_MARKETDATA] * 2
+    assert len(connections) == 2
+    for messages in connections:
+        assert [len(m['v']) for m in messages] == [2, 2, 1]
+        assert sorted(token for m in messages for _, token in m['v']) == [
+            10000 + i for i in range(5)]
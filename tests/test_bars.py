@@ -0,0 +1,69 @@
+import numpy as np
+
+from alphatrade.bars import BAR_DTYPE, INTEGER_BAR_DTYPE, BarBuilder
+from alphatrade.decoder import LAYOUTS, WsFrameMode
+from alphatrade.ticks import decode_integer_tick, decode_tick
+
+# 2023-09-25 09:15:00 IST
+SESSION_START = 1695613500
+
+
+def compact_frame(time_stamp, ltp, volume, token=26000, exchange=1):
+    # exchange, token, ltp, change, exchange_time_stamp, volume
+    return (bytes([WsFrameMode.COMPACT_MARKETDATA]) +
+            LAYOUTS[WsFrameMode.COMPACT_MARKETDATA].struct.pack(
+                exchange, token, ltp, 0, time_stamp, volume))
+
+
+def test_integer_bars_keep_int64_prices():
+    bars = BarBuilder(intervals=(1,), integer_prices=True)
+    for offset, ltp, volume in ((0, 182550, 10), (20, 182600, 15), (59, 182500, 30),
+                                (60, 182575, 31)):
+        bars.update(decode_integer_tick(compact_frame(SESSION_START + offset, ltp, volume)))
+    array = bars.get_bars_array('NSE', 26000, 1)
+    assert array.dtype == INTEGER_BAR_DTYPE
+    assert array.tolist() == [(SESSION_START, 182550, 182600, 182500, 182500, 20)]
+    df = bars.get_bars('NSE', 26000, 1, include_current=True)
+    assert df.attrs['price_multiplier'] == 100
+    assert df['open'].dtype == np.int64 and df['close'].tolist() == [182500, 182575]
+
+
+def test_scaled_bars_keep_float_prices():
+    bars = BarBuilder(intervals=(1,))
+    bars.update(decode_tick(compact_frame(SESSION_START, 182550, 10)))
+    array = bars.get_bars_array('NSE', 26000, 1, include_current=True)
+    assert array.dtype == BAR_DTYPE and array['open'].tolist() == [1825.5]
+    assert 'price_multiplier' not in bars.get_bars('NSE', 26000, 1).attrs
+
+
+def test_bars_are_anchored_to_the_session_start():
+    closed = []
+    bars = BarBuilder(intervals=(5, 15, '1H'), callback=closed.append)
+    # 09:14:59, 09:15:00, 09:19:59, 09:20:00, 10:14:59 and 10:15:00 IST
+    for offset, ltp, volume in ((-1, 100, 5), (0, 101, 10), (299, 103, 12), (300, 102, 20),
+                                (3599, 104, 21), (3600, 105, 25)):
+        bars.update(decode_tick(compact_frame(SESSION_START + offset, ltp * 100, volume)))
+    five = bars.get_bars_array('NSE', 26000, 5)
+    assert five['time'].tolist() == [SESSION_START - 300, SESSION_START, SESSION_START + 300,
+                                     SESSION_START + 3300]
+    assert five[1][['open', 'high', 'low', 'close', 'volume']].tolist() == (101, 103, 101, 103, 7)
+    hour = bars.get_bars_array('NSE', 26000, '1H')
+    assert hour['time'].tolist() == [SESSION_START - 3600, SESSION_START]
+    assert hour[1][['open', 'high', 'low', 'close', 'volume']].tolist() == (101, 104, 101, 104, 16)
+    assert [bar.interval for bar in closed].count('1H') == 2
+    df = bars.get_bars('NSE', 26000, 15)
+    assert df.index[1] == '2023-09-25 09:15:00'
+
+
+def test_advance_closes_bars_without_ticks():
+    closed = []
+    bars = BarBuilder(intervals=(1,), callback=closed.append)
+    bars.update(decode_tick(compact_frame(SESSION_START + 10, 10000, 1)))
+    bars.advance(SESSION_START + 59)
+    assert closed == []
+    bars.advance(SESSION_START + 60)
+    assert [(bar.time, bar.close) for bar in closed] == [(SESSION_START, 100.0)]
+    # the next tick opens a new bar, the closed one is not stored twice
+    bars.update(decode_tick(compact_frame(SESSION_START + 61, 10100, 2)))
+    assert len(bars.get_bars_array('NSE', 26000, 1)) == 1
+    assert len(bars.get_bars_array('NSE', 26000, 1, include_current=True)) == 2
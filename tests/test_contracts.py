@@ -0,0 +1,116 @@
+from datetime import date
+import json
+
+import pytest
+
+from alphatrade.contracts import ContractCache, contract_rows, stream_contract_rows
+
+
+@pytest.fixture
+def body(make_contracts):
+    payload = make_contracts('NFO', 60)
+    # multi byte characters, escapes and whitespace across chunk borders
+    payload['NFO-SEG'].append({'code': '1', 'exchange': 'NFO', 'symbol': 'NIFTY FUT',
+                               'company': 'Société Générale "SG" ₹'})
+    payload['NFO-IDX'] = [{'code': str(900000 + i), 'exchange': 'NFO', 'symbol': f'INDEX{i}',
+                           'company': f'Index {i}'} for i in range(5)]
+    payload['EMPTY'] = []
+    return payload
+
+
+def chunks(data, size):
+    return [data[start:start + size] for start in range(0, len(data), size)]
+
+
+@pytest.mark.parametrize('size', [1, 2, 3, 7, 64, 1000, 1 << 20])
+@pytest.mark.parametrize('indent', [None, 2])
+def test_stream_contract_rows_of_split_chunks(body, size, indent):
+    data = json.dumps(body, indent=indent, ensure_ascii=False).encode('utf-8')
+    assert list(stream_contract_rows(chunks(data, size))) == list(contract_rows(body))
+
+
+def test_stream_contract_rows_of_empty_responses():
+    assert list(stream_contract_rows([b'{}'])) == []
+    assert list(stream_contract_rows([b' { "NSE-SEG" : [ ] } '])) == []
+
+
+def test_stream_contract_rows_of_truncated_response(body):
+    data = json.dumps(body).encode('utf-8')
+    with pytest.raises(ValueError):
+        list(stream_contract_rows(chunks(data[:len(data) // 2], 100)))
+
+
+def test_stream_contract_rows_of_wrong_document():
+    with pytest.raises(ValueError):
+        list(stream_contract_rows([b'[1, 2]']))
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = ContractCache(str(tmp_path / 'contracts.sqlite'))
+    yield cache
+    cache.close()
+
+
+def test_cache_round_trip(cache, body):
+    rows = list(contract_rows(body))
+    day = date(2023, 9, 25)
+    assert cache.load('NFO', 'host', day) is None
+    cache.store('NFO', 'host', iter(rows), day)
+    assert cache.load('NFO', 'host', day) == rows
+    info = cache.info('NFO')
+    assert info['trading_date'] == day and info['host'] == 'host'
+    assert info['contracts'] == len(rows)
+
+
+def test_cache_freshness(cache, make_contracts):
+    rows = list(contract_rows(make_contracts('NSE', 5)))
+    day = date(2023, 9, 25)
+    cache.store('NSE', 'host', rows, day)
+    assert cache.is_fresh('NSE', 'host', day)
+    # stale the next trading day, for another host or exchange
+    assert not cache.is_fresh('NSE', 'host', date(2023, 9, 26))
+    assert cache.load('NSE', 'host', date(2023, 9, 26)) is None
+    assert cache.load('NSE', 'other host', day) is None
+    assert cache.load('NFO', 'host', day) is None
+    cache.invalidate('NSE')
+    assert cache.load('NSE', 'host', day) is None
+
+
+def test_cache_store_replaces_previous_download(cache, make_contracts):
+    day = date(2023, 9, 25)
+    cache.store('NSE', 'host', contract_rows(make_contracts('NSE', 10)), day)
+    rows = list(contract_rows(make_contracts('NSE', 3)))
+    cache.store('NSE', 'host', rows, day)
+    assert cache.load('NSE', 'host', day) == rows
+
+
+def test_cache_is_shared_through_the_file(cache, make_contracts):
+    day = date(2023, 9, 25)
+    rows = list(contract_rows(make_contracts('NSE', 5)))
+    cache.store('NSE', 'host', rows, day)
+    other = ContractCache(cache.path)
+    try:
+        assert other.load('NSE', 'host', day) == rows
+    finally:
+        other.close()
+
+
+def test_client_downloads_without_an_unusable_cache(offline_client, make_contracts, tmp_path, caplog):
+    # a directory where the cache file should be cannot be opened by SQLite
+    path = tmp_path / 'master_contracts.db'
+    path.mkdir()
+    client = offline_client({'NSE': make_contracts('NSE', 5)}, contract_cache=str(path))
+    assert client.get_instrument_by_token('NSE', 10000).symbol == 'NIFTY'
+    assert 'not usable' in caplog.text
+
+
+def test_cache_creates_its_directory(make_contracts, tmp_path):
+    cache = ContractCache(str(tmp_path / 'cache' / 'alphatrade' / 'contracts.sqlite'))
+    try:
+        day = date(2023, 9, 25)
+        rows = list(contract_rows(make_contracts('NSE', 5)))
+        cache.store('NSE', 'host', rows, day)
+        assert cache.load('NSE', 'host', day) == rows
+    finally:
+        cache.close()
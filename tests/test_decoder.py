@@ -0,0 +1,106 @@
+import numpy as np
+import pytest
+
+from alphatrade.alphatrade import (MarketData, CompactData, SnapQuote, FullSnapQuote,
+                                   DPR, OpenInterest, MarketStatus, ExchangeMessage)
+from alphatrade.batch import decode_batch, multiplier_table
+from alphatrade.decoder import TICK_MODES, WsFrameMode, decode_frame
+from alphatrade.ticks import (EXCHANGE_PRICE_MULTIPLIERS, INTEGER_TICK_CLASSES, TICK_CLASSES,
+                              Tick, decode_integer_tick, decode_tick)
+
+PROTLIB_CLASSES = {
+    WsFrameMode.MARKETDATA: MarketData,
+    WsFrameMode.COMPACT_MARKETDATA: CompactData,
+    WsFrameMode.SNAPQUOTE: SnapQuote,
+    WsFrameMode.FULL_SNAPQUOTE: FullSnapQuote,
+    WsFrameMode.DPR: DPR,
+    WsFrameMode.OI: OpenInterest,
+    WsFrameMode.MARKET_STATUS: MarketStatus,
+    WsFrameMode.EXCHANGE_MESSAGES: ExchangeMessage,
+}
+
+
+@pytest.mark.parametrize('mode', list(PROTLIB_CLASSES))
+@pytest.mark.parametrize('exchange', [1, 2, 3])
+def test_decode_frame_matches_protlib(make_frames, mode, exchange):
+    for frame in make_frames(mode, 5, exchange=exchange):
+        decoded_mode, decoded = decode_frame(frame)
+        assert decoded_mode == mode
+        assert decoded == PROTLIB_CLASSES[mode].parse(frame[1:]).__dict__
+
+
+def test_decode_frame_unknown_mode():
+    assert decode_frame(bytes([99, 1, 2, 3])) == (99, None)
+
+
+
+@pytest.mark.parametrize('mode', list(TICK_CLASSES))
+def test_tick_matches_decoded_frame(make_frame, mode):
+    frame = make_frame(mode, exchange=3, token=1234, seed=7)
+    _, expected = decode_frame(frame)
+    tick = decode_tick(frame)
+    assert isinstance(tick, Tick) and tick.mode == mode
+    assert tick.exchange == 'CDS' and tick.exchange_code == 3 and tick.token == 1234
+    multiplier = EXCHANGE_PRICE_MULTIPLIERS[3]
+    assert tick.price_multiplier == multiplier
+    for name, value in expected.items():
+        if name == 'exchange':
+            continue
+        if hasattr(tick, f'raw_{name}'):
+            assert getattr(tick, f'raw_{name}') == (tuple(value) if isinstance(value, list) else value)
+            scaled = getattr(tick, name)
+            if isinstance(value, list):
+                assert scaled == pytest.approx([v / multiplier for v in value])
+            else:
+                assert scaled == pytest.approx(value / multiplier)
+        else:
+            assert tick[name] == value
+
+
+def test_tick_reads_like_a_dictionary(make_frame):
+    tick = decode_tick(make_frame(WsFrameMode.SNAPQUOTE, exchange=1, token=26000))
+    assert 'bid_prices' in tick and 'nope' not in tick
+    assert tick['bid_prices'] == tick.bid_prices and isinstance(tick['bid_quantities'], list)
+    assert tick.get('nope', 1) == 1
+    with pytest.raises(KeyError):
+        tick['nope']
+    as_dict = tick.to_dict()
+    assert list(as_dict) == tick.keys() and len(tick) == len(as_dict)
+    assert as_dict['instrument'] is None
+    assert tick == as_dict and tick == decode_tick(make_frame(WsFrameMode.SNAPQUOTE, token=26000))
+
+
+def test_decode_tick_of_other_frames(make_frames):
+    assert decode_tick(make_frames(WsFrameMode.MARKET_STATUS, 1)[0]) is None
+    assert decode_integer_tick(make_frames(WsFrameMode.EXCHANGE_MESSAGES, 1)[0]) is None
+
+
+@pytest.mark.parametrize('mode', list(TICK_CLASSES))
+def test_integer_ticks_keep_raw_prices(make_frame, mode):
+    frame = make_frame(mode, exchange=2, token=42)
+    tick = decode_integer_tick(frame)
+    scaled = decode_tick(frame)
+    assert type(tick) is INTEGER_TICK_CLASSES[mode]
+    assert isinstance(tick, TICK_CLASSES[mode])
+    assert not hasattr(tick, '__dict__')
+    for name in ('ltp', 'open', 'high', 'low', 'close', 'atp', 'best_bid_price'):
+        if hasattr(scaled, name):
+            assert getattr(tick, name) == getattr(tick, f'raw_{name}')
+            assert isinstance(getattr(tick, name), int)
+            assert getattr(tick, name) / tick.price_multiplier == pytest.approx(getattr(scaled, name))
+    if hasattr(scaled, 'bid_prices'):
+        assert list(tick.bid_prices) == list(tick.raw_bid_prices)
+
+@pytest.mark.parametrize('mode', sorted(TICK_MODES))
+@pytest.mark.parametrize('integer', [False, True])
+def test_decode_batch_matches_ticks(make_frames, mode, integer):
+    frames = make_frames(mode, 20, exchange=3)
+    batch = decode_batch(mode, frames, multiplier_table(EXCHANGE_PRICE_MULTIPLIERS), integer)
+    decode = decode_integer_tick if integer else decode_tick
+    for row, frame in zip(batch, frames):
+        tick = decode(frame)
+        assert row['token'] == tick.token and row['exchange'] == tick.exchange_code
+        for name in ('ltp', 'volume', 'bid_prices', 'ask_quantities'):
+            if hasattr(tick, name):
+                assert np.asarray(row[name]).tolist() == pytest.approx(
+                    list(getattr(tick, name)) if name.endswith('s') else getattr(tick, name))
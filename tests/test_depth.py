@@ -0,0 +1,70 @@
+import numpy as np
+import pytest
+
+from alphatrade.batch import decode_batch, multiplier_table
+from alphatrade.decoder import LAYOUTS, WsFrameMode
+from alphatrade.depth import DepthBook
+from alphatrade.ticks import EXCHANGE_PRICE_MULTIPLIERS, decode_tick
+
+
+def snapquote_frame(token, bids, asks, exchange=1, time_stamp=1695613500):
+    """ bids and asks are up to five (paise, quantity) levels, best first """
+    bids = list(bids) + [(0, 0)] * (5 - len(bids))
+    asks = list(asks) + [(0, 0)] * (5 - len(asks))
+    values = [exchange, token]
+    values += [1] * 5 + [price for price, _ in bids] + [quantity for _, quantity in bids]
+    values += [2] * 5 + [price for price, _ in asks] + [quantity for _, quantity in asks]
+    values.append(time_stamp)
+    return bytes([WsFrameMode.SNAPQUOTE]) + LAYOUTS[WsFrameMode.SNAPQUOTE].struct.pack(*values)
+
+
+@pytest.fixture
+def book():
+    book = DepthBook(capacity=1)
+    book.update(decode_tick(snapquote_frame(1, [(10000, 30), (9995, 70)], [(10010, 10), (10020, 5)])))
+    book.update(decode_tick(snapquote_frame(2, [(5000, 10)], [])))
+    return book
+
+
+def test_spread_mid_and_microprice(book):
+    assert len(book) == 2 and book.capacity == 2
+    assert book.spread()[0] == pytest.approx(0.10)
+    assert book.mid()[0] == pytest.approx(100.05)
+    # weighted toward the ask, the side with less quantity
+    assert book.microprice()[0] == pytest.approx((100.0 * 10 + 100.1 * 30) / 40)
+    # an empty ask side
+    assert np.isnan(book.spread()[1]) and np.isnan(book.microprice()[1])
+
+
+def test_selected_rows(book):
+    rows = book.rows([(1, 2), (1, 3), (1, 1)])
+    assert rows.tolist() == [1, -1, 0]
+    spread = book.spread(rows)
+    assert np.isnan(spread[0]) and np.isnan(spread[1]) and spread[2] == pytest.approx(0.10)
+    assert book.imbalance(rows).tolist()[2] == pytest.approx((100 - 15) / 115)
+    assert book.cumulative_depth(rows, side='ask')[2].tolist() == [10, 15, 15, 15, 15]
+    with pytest.raises(ValueError):
+        book.cumulative_depth(side='both')
+
+
+def test_empty_levels_are_nan(book):
+    depth = book.book(1, 2)
+    assert depth['bid_prices'][0] == 50.0 and np.isnan(depth['bid_prices'][1:]).all()
+    assert np.isnan(depth['ask_prices']).all() and depth['ask_quantities'] == [0] * 5
+    assert book.book(1, 3) is None
+
+
+@pytest.mark.parametrize('integer', [False, True])
+def test_batch_updates_match_single_ticks(integer):
+    frames = [snapquote_frame(1, [(10000, 30)], [(10010, 10)]),
+              snapquote_frame(2, [(5000, 10)], [(5005, 20)]),
+              snapquote_frame(1, [(10005, 40)], [(10015, 20)])]
+    single, batched = DepthBook(), DepthBook()
+    for frame in frames:
+        single.update(decode_tick(frame))
+    batched.update_batch(decode_batch(WsFrameMode.SNAPQUOTE, frames,
+                                      multiplier_table(EXCHANGE_PRICE_MULTIPLIERS), integer))
+    assert batched.keys() == single.keys() == [(1, 1), (1, 2)]
+    np.testing.assert_allclose(batched.microprice(), single.microprice())
+    for name in ('bid_prices', 'ask_prices', 'bid_quantities', 'ask_orders'):
+        np.testing.assert_array_equal(getattr(batched, name)[:2], getattr(single, name)[:2])
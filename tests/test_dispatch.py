@@ -0,0 +1,161 @@
+import threading
+
+import pytest
+
+from alphatrade.decoder import WsFrameMode
+from alphatrade.dispatch import OverflowPolicy, TickDispatcher
+from alphatrade.recorder import FrameRecorder
+from alphatrade.ticks import decode_tick
+
+
+class Gate(object):
+    """ callback holding the dispatcher thread until released """
+
+    def __init__(self):
+        self.release = threading.Event()
+        self.entered = threading.Event()
+        self.received = []
+
+    def __call__(self, message):
+        self.entered.set()
+        self.release.wait(5)
+        self.received.append(message)
+
+
+def blocked_dispatcher(policy, maxsize):
+    # the first message is taken by the dispatcher thread and held there,
+    # what follows stays queued
+    gate = Gate()
+    dispatcher = TickDispatcher(maxsize=maxsize, threads=1, policy=policy)
+    dispatcher.start()
+    dispatcher.put(gate, 'first', 'held')
+    assert gate.entered.wait(5)
+    return dispatcher, gate
+
+
+def test_block_delivers_everything_in_order():
+    received = []
+    dispatcher = TickDispatcher(maxsize=2, threads=1, policy=OverflowPolicy.BLOCK)
+    dispatcher.start()
+    for i in range(1000):
+        dispatcher.put(received.append, i, 'token')
+    dispatcher.stop()
+    assert received == list(range(1000))
+    stats = dispatcher.stats()
+    assert stats['dispatched'] == 1000 and stats['dropped'] == 0
+
+
+def test_drop_oldest():
+    dispatcher, gate = blocked_dispatcher(OverflowPolicy.DROP_OLDEST, 3)
+    for i in range(5):
+        dispatcher.put(gate, i, ('token', i))
+    gate.release.set()
+    dispatcher.stop()
+    assert gate.received == ['first', 2, 3, 4]
+    assert dispatcher.stats()['dropped'] == 2
+
+
+def test_conflate_delivers_every_tick_below_capacity():
+    dispatcher, gate = blocked_dispatcher(OverflowPolicy.CONFLATE, 10)
+    for i in range(5):
+        dispatcher.put(gate, i, 'token')
+    gate.release.set()
+    dispatcher.stop()
+    assert gate.received == ['first', 0, 1, 2, 3, 4]
+    assert dispatcher.stats()['conflated'] == 0
+
+
+def test_conflate_replaces_queued_tick_of_a_token_when_full():
+    dispatcher, gate = blocked_dispatcher(OverflowPolicy.CONFLATE, 3)
+    dispatcher.put(gate, 'a0', 'a')
+    dispatcher.put(gate, 'b0', 'b')
+    dispatcher.put(gate, 'c0', 'c')
+    # full, a is queued and gets replaced in place
+    dispatcher.put(gate, 'a1', 'a')
+    gate.release.set()
+    dispatcher.stop()
+    assert gate.received == ['first', 'a1', 'b0', 'c0']
+    stats = dispatcher.stats()
+    assert stats['conflated'] == 1 and stats['dropped'] == 0
+
+
+def test_conflate_compacts_superseded_ticks_when_full():
+    dispatcher, gate = blocked_dispatcher(OverflowPolicy.CONFLATE, 3)
+    for message in ('a0', 'a1', 'b0'):
+        dispatcher.put(gate, message, message[0])
+    # full, c is new, the older tick of a makes room
+    dispatcher.put(gate, 'c0', 'c')
+    # full of distinct tokens, the oldest goes
+    dispatcher.put(gate, 'd0', 'd')
+    gate.release.set()
+    dispatcher.stop()
+    assert gate.received == ['first', 'b0', 'c0', 'd0']
+    stats = dispatcher.stats()
+    assert stats['conflated'] == 1 and stats['dropped'] == 1
+
+
+def test_same_key_goes_to_one_thread_in_order():
+    received = {}
+    lock = threading.Lock()
+
+    def callback(message):
+        key, value = message
+        with lock:
+            received.setdefault(key, []).append((value, threading.get_ident()))
+
+    dispatcher = TickDispatcher(maxsize=100, threads=4)
+    dispatcher.start()
+    for i in range(2000):
+        dispatcher.put(callback, (i % 10, i), i % 10)
+    dispatcher.stop()
+    for key, values in received.items():
+        assert [value for value, _ in values] == list(range(key, 2000, 10))
+        assert len({thread for _, thread in values}) == 1
+
+
+def test_callback_errors_are_counted():
+    errors = []
+    dispatcher = TickDispatcher(threads=1, on_error=errors.append)
+    dispatcher.start()
+    dispatcher.put(lambda message: 1 / message, 0)
+    dispatcher.stop()
+    assert dispatcher.stats()['errors'] == 1
+    assert isinstance(errors[0], ZeroDivisionError)
+
+
+def test_invalid_arguments():
+    with pytest.raises(TypeError):
+        TickDispatcher(policy='block')
+    with pytest.raises(ValueError):
+        TickDispatcher(maxsize=0)
+    with pytest.raises(ValueError):
+        TickDispatcher(threads=0)
+
+
+
+def test_client_conflates_market_data_ticks_only(offline_client, make_contracts, make_frame, tmp_path):
+    client = offline_client({'NSE': make_contracts('NSE', 5)})
+    path = str(tmp_path / 'frames.log')
+    ltps = [decode_tick(make_frame(WsFrameMode.COMPACT_MARKETDATA, token=10000, seed=seed)).raw_ltp
+            for seed in (1, 2, 3)]
+    with FrameRecorder(path) as recorder:
+        recorder.record(make_frame(WsFrameMode.DPR, token=10000, seed=1), 100.0)
+        # recorded later, the dispatcher is blocked in the first DPR by then
+        for seed in (1, 2, 3):
+            recorder.record(make_frame(WsFrameMode.COMPACT_MARKETDATA, token=10000, seed=seed), 100.2)
+        for seed in (2, 3):
+            recorder.record(make_frame(WsFrameMode.DPR, token=10000, seed=seed), 100.2)
+    ticks, dprs = [], []
+    gate = threading.Event()
+
+    def on_dpr(dpr):
+        if not dprs:
+            gate.wait(1)
+        dprs.append(dpr.raw_high)
+
+    client.replay_frames(path, speed=1.0, subscribe_callback=lambda tick: ticks.append(tick.raw_ltp),
+                         dpr_callback=on_dpr, dispatch_threads=1, dispatch_queue_size=4,
+                         dispatch_policy=OverflowPolicy.CONFLATE)
+    # compacting the superseded ticks made room, no DPR record was conflated
+    assert len(dprs) == 3 and len(set(dprs)) == 3
+    assert ticks == ltps[-1:]
@@ -0,0 +1,112 @@
+from collections import OrderedDict
+from datetime import date
+
+import pytest
+
+from alphatrade.contracts import contract_rows
+from alphatrade.instruments import Instrument, InstrumentTable
+
+
+@pytest.fixture(scope='module', params=['NFO', 'NSE'])
+def rows(request, make_contracts):
+    exchange = request.param
+    body = make_contracts(exchange, 3000)
+    body[f'{exchange}-SEG'] += [
+        {'code': '1', 'exchange': exchange, 'symbol': 'Nifty X', 'company': 'mixed case'},
+        {'code': '2', 'exchange': exchange, 'symbol': 'ÉLAN 1 FUT', 'company': 'non ascii'},
+        # a symbol listed twice maps to its last contract
+        {'code': '3', 'exchange': exchange, 'symbol': 'TWICE', 'company': 'first'},
+        {'code': '4', 'exchange': exchange, 'symbol': 'TWICE', 'company': 'second'}]
+    return list(contract_rows(body))
+
+
+@pytest.fixture(scope='module')
+def table(rows):
+    return InstrumentTable.from_rows(rows)
+
+
+def by_token_and_symbol(rows):
+    # the dictionaries the table replaces
+    by_token, by_symbol = OrderedDict(), OrderedDict()
+    for row in rows:
+        instrument = Instrument._make(row)
+        by_token[instrument.token] = instrument
+        by_symbol[instrument.symbol] = instrument
+    return by_token, by_symbol
+
+
+def test_lookups_match_dictionaries(rows, table):
+    by_token, by_symbol = by_token_and_symbol(rows)
+    assert len(table) == len(by_symbol)
+    assert list(table) == list(by_symbol)
+    for symbol, instrument in by_symbol.items():
+        assert symbol in table
+        assert table[symbol] == instrument
+    for token, instrument in by_token.items():
+        assert table.by_token(token) == instrument
+    assert table.values() == list(by_symbol.values())
+    assert table['TWICE'].name == 'second'
+
+
+def test_missing_contracts(table):
+    assert table.by_token(999999999) is None
+    assert table.by_token(-1) is None
+    assert table.row_of_symbol('NOPE') == -1
+    assert 'NOPE' not in table and 5 not in table
+    with pytest.raises(KeyError):
+        table['NOPE']
+
+
+def test_instrument_values(table):
+    instrument = table.by_token(2)
+    assert instrument == Instrument(instrument.exchange, 2, 'ÉLAN 1 FUT', 'non ascii', None, None)
+    assert all(isinstance(i.expiry, (date, type(None))) for i in table.instruments())
+
+
+def test_empty_table():
+    table = InstrumentTable.from_rows([])
+    assert len(table) == 0 and table.by_token(1) is None
+    assert table.underlying_rows('NIFTY').tolist() == []
+
+
+def scan(rows, query, matches):
+    # the linear scan search_instruments used to do, one result per matching query
+    queries = query if isinstance(query, list) else [query]
+    underlyings = [row[2].split(' ')[0].lower() for row in rows]
+    found = []
+    for index, underlying in enumerate(underlyings):
+        for item in queries:
+            if matches(item.lower(), underlying):
+                found.append(index)
+    return found
+
+
+QUERIES = ['NIFTY', 'nifty', 'Nif', 'FTY', 'tcs', 'I', '', 'zzz', 'élan', 'BANKNIFTY',
+           ['TCS', 'INFY', 'SBIN'], ['NIFTY', 'BANKNIFTY', 'nifty'], [], ['ZZ'], ['e', 'E']]
+
+
+@pytest.mark.parametrize('query', QUERIES, ids=repr)
+def test_underlying_rows_contains(rows, table, query):
+    expected = scan(rows, query, lambda item, underlying: item in underlying)
+    assert table.underlying_rows(query).tolist() == expected
+    assert table.underlying_rows(query, 'contains').tolist() == expected
+
+
+@pytest.mark.parametrize('query', QUERIES, ids=repr)
+def test_underlying_rows_prefix_and_exact(rows, table, query):
+    assert table.underlying_rows(query, 'prefix').tolist() == scan(
+        rows, query, lambda item, underlying: underlying.startswith(item))
+    assert table.underlying_rows(query, 'exact').tolist() == scan(
+        rows, query, lambda item, underlying: underlying == item)
+
+
+def test_underlying_rows_fuzzy(table):
+    rows = table.underlying_rows('BANKNIFY', 'fuzzy')
+    assert len(rows)
+    assert table.instrument(rows[0]).symbol.startswith('BANKNIFTY')
+    assert table.underlying_rows('qqqqqqqq', 'fuzzy').tolist() == []
+
+
+def test_underlying_rows_unknown_match(table):
+    with pytest.raises(ValueError):
+        table.underlying_rows('NIFTY', 'regex')
@@ -0,0 +1,67 @@
+import pickle
+
+import numpy as np
+import pytest
+
+from alphatrade import OrderType, ProductType, TransactionType
+from alphatrade.ticks import TICK_CLASSES, decode_integer_tick
+
+
+@pytest.fixture
+def client(offline_client, make_contracts):
+    return offline_client({'NSE': make_contracts('NSE', 5), 'CDS': make_contracts('CDS', 5)},
+                          integer_prices=True)
+
+
+@pytest.mark.parametrize('mode', list(TICK_CLASSES))
+def test_integer_ticks_pickle(make_frame, mode):
+    tick = decode_integer_tick(make_frame(mode, exchange=3, token=42))
+    copy = pickle.loads(pickle.dumps(tick))
+    assert type(copy) is type(tick) and copy == tick
+    assert copy.price_multiplier == tick.price_multiplier
+
+
+@pytest.mark.parametrize('price', [182550, np.int64(182550), np.int32(182550), np.uint32(182550)])
+def test_integer_order_prices_are_sent_in_rupees(client, price):
+    instrument = client.get_instrument_by_token('NSE', 10000)
+    client.place_order(TransactionType.Buy, instrument, 1, OrderType.StopLossLimit,
+                       ProductType.Intraday, price=price, trigger_price=price - 50)
+    _, order = client.session.posts[-1]
+    assert order['price'] == 1825.5 and order['trigger_price'] == 1825.0
+
+
+def test_integer_order_prices_of_cds(client):
+    instrument = client.get_instrument_by_token('CDS', 10000)
+    client.place_order(TransactionType.Sell, instrument, 1, OrderType.Limit,
+                       ProductType.Intraday, price=np.int64(832512500))
+    _, order = client.session.posts[-1]
+    assert order['price'] == pytest.approx(83.25125)
+
+
+def test_float_and_bool_order_prices(client):
+    instrument = client.get_instrument_by_token('NSE', 10000)
+    client.place_order(TransactionType.Buy, instrument, 1, OrderType.Limit,
+                       ProductType.Intraday, price=1825.5)
+    assert client.session.posts[-1][1]['price'] == 1825.5
+    with pytest.raises(TypeError):
+        client.place_order(TransactionType.Buy, instrument, 1, OrderType.Limit,
+                           ProductType.Intraday, price=True)
+
+
+def candles(*rows):
+    return {'data': {'candles': [list(row) for row in rows]}}
+
+
+def test_integer_candles(client):
+    data = candles((1695613500, 1825.5, 1830.25, 1820.05, 1829.95, 100),
+                   (1695613800, 1829.95, 1831.0, 1829.0, 1830.1, 50))
+    df = client._format_candles(data, 5, price_multiplier=100)
+    assert df.attrs['price_multiplier'] == 100
+    assert all(df[column].dtype == np.int64 for column in ('open', 'high', 'low', 'close'))
+    assert df['open'].tolist() == [182550, 182995]
+    assert df['low'].tolist() == [182005, 182900]
+    assert df['volume'].tolist() == [100, 50]
+    scaled = client._format_candles(data, 5)
+    assert 'price_multiplier' not in scaled.attrs
+    assert scaled['close'].tolist() == [1829.95, 1830.1]
+    assert df.index.tolist() == scaled.index.tolist()
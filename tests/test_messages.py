@@ -0,0 +1,32 @@
+import json
+
+from alphatrade.decoder import WsFrameMode
+from alphatrade.messages import MessageStore
+from alphatrade.recorder import FrameRecorder
+
+
+def test_store_keeps_the_newest_messages_per_exchange():
+    store = MessageStore(maxlen=2)
+    for i, exchange in enumerate(['NSE', 'NSE', 'NFO', 'NSE']):
+        store.append({'exchange': exchange, 'i': i}, received_at=100 + i)
+    assert [m['i'] for m in store.messages()] == [2, 3]
+    assert [m['i'] for m in store.messages('NSE')] == [1, 3]
+    assert [m['i'] for m in store.messages(since=102)] == [3]
+    assert store.latest('NFO')['i'] == 2 and store.latest()['NSE']['i'] == 3
+    store.configure(maxlen=1)
+    assert [m['i'] for m in store.messages()] == [3]
+
+
+def test_replay_keeps_the_message_store_configuration(offline_client, make_contracts, make_frames,
+                                                      tmp_path):
+    client = offline_client({'NSE': make_contracts('NSE', 5)})
+    path = str(tmp_path / 'frames.log')
+    with FrameRecorder(path) as recorder:
+        for frame in make_frames(WsFrameMode.MARKET_STATUS, 5):
+            recorder.record(frame, 100.0)
+    client.replay_frames(path, speed=None, messages_maxlen=3, messages_log_dir=str(tmp_path))
+    client.replay_frames(path, speed=None)
+    assert len(client.get_market_status_messages()) == 3
+    with open(tmp_path / 'market_status.jsonl', encoding='utf-8') as spill:
+        lines = [json.loads(line) for line in spill]
+    assert len(lines) == 10 and lines[-1]['status'] == 'Open'
@@ -0,0 +1,77 @@
+import math
+
+import numpy as np
+import pytest
+
+from alphatrade.batch import decode_batch, multiplier_table
+from alphatrade.decoder import WsFrameMode
+from alphatrade.quotes import QUOTE_DTYPE, QuoteStore
+from alphatrade.ticks import EXCHANGE_PRICE_MULTIPLIERS, decode_tick
+
+
+def test_ltp_of_the_newest_market_data_or_compact_tick(make_frame):
+    quotes = QuoteStore()
+    assert quotes.get_ltp(1, 26000) is None
+    compact = decode_tick(make_frame(WsFrameMode.COMPACT_MARKETDATA, token=26000, seed=1))
+    market = decode_tick(make_frame(WsFrameMode.MARKETDATA, token=26000, seed=2))
+    quotes.update(compact)
+    assert quotes.get_ltp(1, 26000) == compact.ltp
+    quotes.update(market)
+    assert quotes.get_ltp(1, 26000) == market.ltp
+    quotes.update(compact)
+    assert quotes.get_ltp(1, 26000) == compact.ltp
+    assert (1, 26000) in quotes and len(quotes) == 1
+
+
+def test_quote_combines_feed_types(make_frame):
+    quotes = QuoteStore()
+    compact = decode_tick(make_frame(WsFrameMode.COMPACT_MARKETDATA, token=7, seed=1))
+    snap = decode_tick(make_frame(WsFrameMode.SNAPQUOTE, token=7, seed=2))
+    oi = decode_tick(make_frame(WsFrameMode.OI, token=7, seed=3))
+    dpr = decode_tick(make_frame(WsFrameMode.DPR, token=7, seed=4))
+    for tick in (compact, snap, oi, dpr):
+        quotes.update(tick)
+    quote = quotes.get_quote(1, 7)
+    assert quote.exchange == 'NSE' and quote.token == 7
+    assert quote.ltp == compact.ltp and quote.volume == compact.volume
+    assert quote.bid_prices == snap.bid_prices and quote.ask_quantities == list(snap.ask_quantities)
+    assert quote.best_bid_price == snap.bid_prices[0]
+    assert quote.best_ask_quantity == snap.ask_quantities[0]
+    assert quote.open_interest == oi.current_open_interest
+    assert quote.open is None
+    assert quotes.get_quote(1, 8) is None
+
+
+def test_quotes_array(make_frame):
+    quotes = QuoteStore()
+    tick = decode_tick(make_frame(WsFrameMode.MARKETDATA, exchange=2, token=5))
+    quotes.update(tick)
+    array = quotes.get_quotes([(2, 5), (2, 6)])
+    assert array.dtype == QUOTE_DTYPE
+    assert array['token'].tolist() == [5, 6]
+    assert array['ltp'][0] == pytest.approx(tick.ltp) and math.isnan(array['ltp'][1])
+    assert array['best_ask_price'][0] == pytest.approx(tick.best_ask_price)
+    assert array['volume'].tolist() == [tick.volume, 0]
+
+
+@pytest.mark.parametrize('mode', [WsFrameMode.MARKETDATA, WsFrameMode.COMPACT_MARKETDATA,
+                                  WsFrameMode.SNAPQUOTE, WsFrameMode.FULL_SNAPQUOTE])
+def test_batch_updates_match_single_ticks(make_frame, mode):
+    # token 1 three times, token 2 once, the batch keeps the last of each
+    frames = [make_frame(mode, token=token, seed=seed)
+              for token, seed in ((1, 1), (2, 2), (1, 3), (1, 4))]
+    single, batched = QuoteStore(), QuoteStore()
+    for frame in frames:
+        single.update(decode_tick(frame))
+    batched.update_batch(mode, decode_batch(mode, frames, multiplier_table(EXCHANGE_PRICE_MULTIPLIERS)))
+    for token in (1, 2):
+        expected, quote = single.get_quote(1, token), batched.get_quote(1, token)
+        for name in expected._fields:
+            if name == 'updated_at':
+                continue
+            value = getattr(quote, name)
+            assert (value == pytest.approx(getattr(expected, name))
+                    if value is not None else getattr(expected, name) is None), name
+    keys = [(1, 1), (1, 2)]
+    for name in ('ltp', 'volume', 'best_bid_price'):
+        np.testing.assert_array_equal(single.get_quotes(keys)[name], batched.get_quotes(keys)[name])
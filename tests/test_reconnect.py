@@ -0,0 +1,118 @@
+import pytest
+
+from alphatrade.batch import decode_batch, multiplier_table
+from alphatrade.decoder import LAYOUTS, WsFrameMode
+from alphatrade.reconnect import Gap, GapTracker, ReconnectPolicy
+from alphatrade.ticks import EXCHANGE_PRICE_MULTIPLIERS, decode_tick
+
+
+def test_backoff_doubles_up_to_max_delay():
+    policy = ReconnectPolicy(initial_delay=0.1, max_delay=1.0, multiplier=2, jitter=0)
+    assert [policy.next_delay() for _ in range(6)] == pytest.approx([0.1, 0.2, 0.4, 0.8, 1.0, 1.0])
+    assert policy.attempt == 6
+
+
+def test_jitter_only_shortens_the_delay():
+    policy = ReconnectPolicy(initial_delay=1.0, max_delay=1.0, jitter=0.5)
+    delays = [policy.next_delay() for _ in range(200)]
+    assert all(0.5 <= delay <= 1.0 for delay in delays)
+    assert len(set(delays)) > 1
+
+
+def test_max_attempts():
+    policy = ReconnectPolicy(jitter=0, max_attempts=2)
+    assert policy.next_delay() is not None
+    assert policy.next_delay() is not None
+    assert policy.next_delay() is None
+    policy.reset()
+    assert policy.next_delay() == pytest.approx(0.1)
+
+
+def test_reset_after_a_connection_stayed_up():
+    policy = ReconnectPolicy(initial_delay=0.1, jitter=0, reset_after=5.0)
+    policy.next_delay()
+    policy.next_delay()
+    policy.connection_lost(1.0)
+    assert policy.next_delay() == pytest.approx(0.4)
+    policy.connection_lost(5.0)
+    assert policy.next_delay() == pytest.approx(0.1)
+
+
+def test_invalid_policy():
+    with pytest.raises(ValueError):
+        ReconnectPolicy(initial_delay=2, max_delay=1)
+    with pytest.raises(ValueError):
+        ReconnectPolicy(jitter=1.5)
+
+
+def compact_frame(token, time_stamp):
+    # exchange, token, ltp, change, exchange_time_stamp, volume
+    return (bytes([WsFrameMode.COMPACT_MARKETDATA]) +
+            LAYOUTS[WsFrameMode.COMPACT_MARKETDATA].struct.pack(1, token, 10000, 0, time_stamp, 1))
+
+
+def compact_tick(token, time_stamp):
+    tick = decode_tick(compact_frame(token, time_stamp))
+    assert tick.exchange_time_stamp == time_stamp
+    return tick
+
+
+def test_gap_after_reconnect():
+    gaps = GapTracker()
+    assert gaps.update(compact_tick(1, 100)) is None
+    assert gaps.update(compact_tick(2, 105)) is None
+    assert gaps.update(compact_tick(1, 110)) is None
+    gaps.disconnected()
+    assert gaps.pending() == {(1, 1): 110, (1, 2): 105}
+    gap = gaps.update(compact_tick(1, 200))
+    assert gap == Gap('NSE', 1, None, 110, 200)
+    # only the first tick after the reconnect
+    assert gaps.update(compact_tick(1, 201)) is None
+    assert gaps.pending() == {(1, 2): 105}
+    assert list(gaps.gaps) == [gap]
+
+
+def test_no_gap_without_disconnect_or_time_stamp():
+    gaps = GapTracker()
+    gaps.update(compact_tick(1, 100))
+    assert gaps.update(compact_tick(1, 300)) is None
+    gaps.disconnected()
+    assert gaps.update(compact_tick(1, 0)) is None
+    assert gaps.pending() == {(1, 1): 300}
+
+
+def test_gaps_of_a_batch():
+    gaps = GapTracker()
+    gaps.update(compact_tick(1, 100))
+    gaps.update(compact_tick(2, 100))
+    gaps.disconnected()
+    frames = [compact_frame(1, 150), compact_frame(1, 151), compact_frame(3, 150)]
+    batch = decode_batch(WsFrameMode.COMPACT_MARKETDATA, frames,
+                         multiplier_table(EXCHANGE_PRICE_MULTIPLIERS))
+    assert gaps.update_batch(WsFrameMode.COMPACT_MARKETDATA, batch) == [Gap('NSE', 1, None, 100, 150)]
+    assert gaps.pending() == {(1, 2): 100}
+
+
+@pytest.mark.parametrize('mode', [WsFrameMode.DPR, WsFrameMode.OI])
+def test_no_gaps_of_dpr_and_open_interest(make_frame, mode):
+    gaps = GapTracker()
+    gaps.update(decode_tick(make_frame(mode, token=1)))
+    gaps.disconnected()
+    assert gaps.pending() == {}
+    gaps.update(compact_tick(1, 100))
+    gaps.disconnected()
+    assert gaps.update(decode_tick(make_frame(mode, token=1))) is None
+    assert gaps.pending() == {(1, 1): 100}
+
+
+def test_forget_unsubscribed_tokens():
+    gaps = GapTracker()
+    gaps.update(compact_tick(1, 100))
+    gaps.update(compact_tick(2, 100))
+    gaps.disconnected()
+    gaps.forget([(1, 1), (1, 3)])
+    assert gaps.pending() == {(1, 2): 100}
+    assert gaps.update(compact_tick(1, 200)) is None
+    gaps.forget([(1, 1)])
+    gaps.disconnected()
+    assert gaps.pending() == {(1, 2): 100}
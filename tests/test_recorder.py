@@ -0,0 +1,86 @@
+import pytest
+
+from alphatrade.decoder import TICK_MODES, WsFrameMode
+from alphatrade.recorder import MAGIC, FrameLog, FrameRecorder, FrameReplayer
+from alphatrade.ticks import decode_tick
+
+
+@pytest.fixture
+def frames(make_frames):
+    return (make_frames(WsFrameMode.COMPACT_MARKETDATA, 3) + make_frames(WsFrameMode.MARKET_STATUS, 1) +
+            make_frames(WsFrameMode.SNAPQUOTE, 2))
+
+
+def record(path, frames, start=100.0, step=0.1):
+    with FrameRecorder(path) as recorder:
+        for i, frame in enumerate(frames):
+            recorder.record(frame, start + i * step)
+    return recorder
+
+
+def test_round_trip(tmp_path, frames):
+    path = str(tmp_path / 'frames.log')
+    recorder = record(path, frames)
+    assert recorder.frames == len(frames) and recorder.bytes == sum(map(len, frames))
+    with FrameLog(path) as log:
+        records = [(received_at, bytes(frame)) for received_at, frame in log]
+    assert [frame for _, frame in records] == frames
+    assert [received_at for received_at, _ in records] == pytest.approx(
+        [100.0 + i * 0.1 for i in range(len(frames))])
+
+
+def test_append_to_an_existing_log(tmp_path, frames):
+    path = str(tmp_path / 'frames.log')
+    record(path, frames[:2])
+    record(path, frames[2:])
+    with open(path, 'rb') as f:
+        assert f.read().count(MAGIC) == 1
+    with FrameLog(path) as log:
+        assert [bytes(frame) for _, frame in log] == frames
+
+
+def test_record_cut_short_ends_the_log(tmp_path, frames):
+    path = tmp_path / 'frames.log'
+    record(str(path), frames)
+    path.write_bytes(path.read_bytes()[:-3])
+    with FrameLog(str(path)) as log:
+        assert [bytes(frame) for _, frame in log] == frames[:-1]
+
+
+def test_not_a_frame_log(tmp_path):
+    path = tmp_path / 'other.bin'
+    path.write_bytes(b'not a frame log')
+    with pytest.raises(ValueError):
+        FrameLog(str(path))
+
+
+def test_replay_pacing(tmp_path, frames):
+    path = str(tmp_path / 'frames.log')
+    record(path, frames, step=0.05)
+    received = []
+    stats = FrameReplayer(path).replay(received.append, speed=None)
+    assert received == frames and stats['frames'] == len(frames)
+    assert stats['bytes'] == sum(map(len, frames))
+    # 0.25 recorded seconds played five times as fast
+    stats = FrameReplayer(path).replay(lambda frame: None, speed=5.0)
+    assert stats['seconds'] >= 0.045
+    with pytest.raises(ValueError):
+        FrameReplayer(path).replay(received.append, speed=-1)
+
+
+def test_client_replays_through_the_tick_pipeline(offline_client, make_contracts, tmp_path, frames):
+    client = offline_client({'NSE': make_contracts('NSE', 5)})
+    path = str(tmp_path / 'frames.log')
+    record(path, frames)
+    ticks, statuses = [], []
+    stats = client.replay_frames(path, speed=None, subscribe_callback=ticks.append,
+                                 market_status_messages_callback=statuses.append)
+    assert stats['frames'] == len(frames)
+    expected = [decode_tick(frame) for frame in frames if frame[0] in TICK_MODES]
+    assert [(tick.mode, tick.token) for tick in ticks] == [(t.mode, t.token) for t in expected]
+    assert len(statuses) == 1
+    instrument = client.get_instrument_by_token('NSE', 10000)
+    assert ticks[0].instrument == instrument
+    # replayed ticks went into the quotes of the client
+    assert client.get_ltp(instrument) == expected[0].ltp
+    assert client.get_quote(instrument).bid_prices == expected[3].bid_prices
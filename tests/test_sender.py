@@ -0,0 +1,106 @@
+import json
+import threading
+import time
+
+import pytest
+import websocket
+
+from alphatrade.sender import HEARTBEAT, WebSocketSender
+from alphatrade.subscriptions import SubscriptionManager
+
+
+class FakeWebSocket(object):
+    """ records what is sent, fails the sends numbered in `fail_at` """
+
+    def __init__(self, sender=None, fail_at=()):
+        self.sender = sender
+        self.fail_at = set(fail_at)
+        self.calls = 0
+        self.sent = []
+        self.lock = threading.Lock()
+
+    def send(self, data, opcode=websocket.ABNF.OPCODE_TEXT):
+        with self.lock:
+            self.calls += 1
+            if self.calls in self.fail_at:
+                # the connection drops while sending
+                self.sender.on_close()
+                raise websocket.WebSocketConnectionClosedException('closed')
+            self.sent.append((data, opcode))
+
+    def texts(self):
+        with self.lock:
+            return [data for data, opcode in self.sent if opcode == websocket.ABNF.OPCODE_TEXT]
+
+
+def wait_for(condition, timeout=2):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError('timed out')
+        time.sleep(0.001)
+
+
+@pytest.fixture
+def subscriptions():
+    return SubscriptionManager(chunk_size=2, pace=0)
+
+
+@pytest.fixture
+def sender(subscriptions):
+    sender = WebSocketSender(subscriptions, heartbeat_interval=60)
+    sender.start()
+    yield sender
+    sender.stop(1)
+
+
+def test_messages_wait_for_the_connection(sender):
+    sender.send('a')
+    sender.send('b')
+    time.sleep(0.01)
+    ws = FakeWebSocket(sender)
+    sender.on_open(ws)
+    wait_for(lambda: ws.texts() == ['a', 'b'])
+    assert sender.sent == 2
+
+
+def test_failed_send_requeues_the_rest(sender):
+    first = FakeWebSocket(sender, fail_at={2})
+    sender.on_open(first)
+    for data in ('a', 'b', 'c'):
+        sender.send(data)
+    wait_for(lambda: not sender.connected.is_set())
+    assert first.texts() == ['a']
+    second = FakeWebSocket(sender)
+    sender.on_open(second)
+    wait_for(lambda: second.texts() == ['b', 'c'])
+
+
+def test_subscriptions_are_coalesced_and_resent_on_reconnect(sender, subscriptions):
+    first = FakeWebSocket(sender)
+    sender.on_open(first)
+    subscriptions.add('marketdata', {(1, token): None for token in (1, 2, 3)})
+    sender.sync_subscriptions()
+    sender.sync_subscriptions()
+    wait_for(lambda: len(first.texts()) == 2)
+    assert [len(json.loads(data)['v']) for data in first.texts()] == [2, 1]
+    sender.on_close()
+    second = FakeWebSocket(sender)
+    sender.on_open(second)
+    wait_for(lambda: len(second.texts()) == 2)
+    tokens = sorted(token for data in second.texts() for _, token in json.loads(data)['v'])
+    assert tokens == [1, 2, 3]
+
+
+def test_heartbeats_only_while_connected():
+    sender = WebSocketSender(SubscriptionManager(), heartbeat_interval=0.01)
+    sender.start()
+    try:
+        time.sleep(0.03)
+        assert sender.heartbeats == 0
+        ws = FakeWebSocket(sender)
+        sender.on_open(ws)
+        wait_for(lambda: sender.heartbeats >= 2)
+        assert ws.sent[0] == (HEARTBEAT, websocket.ABNF.OPCODE_PING)
+    finally:
+        sender.stop(1)
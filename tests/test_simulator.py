@@ -0,0 +1,74 @@
+import contextlib
+import io
+import threading
+
+import pytest
+
+from alphatrade import (AlphaTrade, LiveFeedType, OrderType, ProductType, ReconnectPolicy,
+                        TransactionType)
+from alphatrade.simulator import FIRST_TOKEN, Simulator
+
+
+@pytest.fixture
+def simulator():
+    with Simulator(exchanges=('NSE',), tokens=20, rate=200) as sim:
+        yield sim
+
+
+@pytest.fixture
+def client(simulator):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return AlphaTrade('LOGIN', 'password', '123456', access_token='x' * 128,
+                          host=simulator.url, master_contracts_to_download=['NSE'],
+                          contract_cache=None)
+
+
+def test_contracts_from_the_simulator(client):
+    instrument = client.get_instrument_by_token('NSE', FIRST_TOKEN)
+    assert instrument.symbol == 'NIFTY'
+    assert client.get_instrument_by_symbol('NSE', 'TCS').token == FIRST_TOKEN + 3
+
+
+def test_basket_order(client):
+    orders = [{'instrument': client.get_instrument_by_token('NSE', FIRST_TOKEN + i),
+               'order_type': OrderType.Market,
+               'quantity': 1 + i,
+               'transaction_type': TransactionType.Buy,
+               'product_type': ProductType.Intraday} for i in range(3)]
+    placed = client.place_basket_order(orders)
+    assert [order['oms_order_id'] for order in placed['data']] == ['1', '2', '3']
+    pending = client.orders('pending')['data']['pending_orders']
+    assert [(order['instrument_token'], order['quantity']) for order in pending] == \
+        [(FIRST_TOKEN, 1), (FIRST_TOKEN + 1, 2), (FIRST_TOKEN + 2, 3)]
+
+
+def test_place_and_cancel_order(client):
+    instrument = client.get_instrument_by_token('NSE', FIRST_TOKEN + 1)
+    placed = client.place_order(TransactionType.Buy, instrument, 5, OrderType.Limit,
+                                ProductType.Delivery, price=100.0)
+    order_id = placed['data']['oms_order_id']
+    client.cancel_order(order_id)
+    completed = client.orders()['data']['completed_orders']
+    assert [(order['oms_order_id'], order['order_status']) for order in completed] == \
+        [(order_id, 'cancelled')]
+
+
+def test_websocket_ticks(simulator, client):
+    instrument = client.get_instrument_by_token('NSE', FIRST_TOKEN + 2)
+    ticks = []
+    received = threading.Event()
+
+    def on_tick(tick):
+        ticks.append(tick)
+        if len(ticks) >= 5:
+            received.set()
+
+    # the feed thread gives up once the simulator stops
+    client.start_websocket(subscribe_callback=on_tick, run_in_background=True,
+                           reconnect_policy=ReconnectPolicy(max_attempts=1))
+    assert client.wait_connected(5)
+    client.subscribe(instrument, LiveFeedType.COMPACT)
+    assert received.wait(5)
+    assert {(tick.exchange, tick.token) for tick in ticks} == {('NSE', FIRST_TOKEN + 2)}
+    assert all(tick.ltp > 0 for tick in ticks)
+    assert simulator.stats()['connections'] == 1
@@ -0,0 +1,49 @@
+import pytest
+
+from alphatrade.stats import LatencyHistogram
+
+
+def test_small_values_get_a_bucket_each():
+    histogram = LatencyHistogram(significant_bits=7)
+    for value in range(128):
+        histogram.record(value)
+    assert len(histogram.counts) == 128
+    assert histogram.percentile(50) == 63
+    assert histogram.percentile(100) == 127
+
+
+@pytest.mark.parametrize('value', [128, 129, 1000, 12345, 999999, 3600 * 1000000])
+def test_relative_error_of_large_values(value):
+    histogram = LatencyHistogram(significant_bits=7)
+    histogram.record(1)
+    histogram.record(value)
+    # the lower bound of the bucket, within 2 / 2 ** 7 of the value
+    assert value * (1 - 2 / 128) <= histogram.percentile(100) <= value
+    assert histogram.max == value
+
+
+def test_buckets_split_each_power_of_two():
+    histogram = LatencyHistogram(significant_bits=3)
+    for value in range(8, 32):
+        histogram.record(value)
+    # 8..15 and 16..31 both get 2 ** (3 - 1) buckets
+    assert len(histogram.counts) == 8
+
+
+def test_values_are_clamped():
+    histogram = LatencyHistogram(max_value=1000)
+    histogram.record(-5)
+    histogram.record(10 ** 9)
+    assert histogram.min == 0 and histogram.max == 1000
+
+
+def test_summary():
+    histogram = LatencyHistogram()
+    assert histogram.summary() == {'count': 0}
+    assert histogram.percentile(50) is None
+    for value in range(1, 101):
+        histogram.record(value)
+    summary = histogram.summary()
+    assert summary['count'] == 100 and summary['min'] == 1 and summary['max'] == 100
+    assert summary['mean'] == pytest.approx(50.5)
+    assert summary['p50'] == 50 and summary['p90'] == 90 and summary['p99'] == 99
@@ -0,0 +1,83 @@
+import json
+
+import pytest
+
+from alphatrade.subscriptions import SubscriptionManager
+
+
+def decoded(messages):
+    return [json.loads(message) for message in messages]
+
+
+def entries(tokens, exchange=1):
+    return {(exchange, token): f'instrument {token}' for token in tokens}
+
+
+def test_delta_is_chunked():
+    subscriptions = SubscriptionManager(chunk_size=100)
+    subscriptions.add('marketdata', entries(range(250)))
+    messages = decoded(subscriptions.delta())
+    assert [len(message['v']) for message in messages] == [100, 100, 50]
+    assert {message['a'] for message in messages} == {'subscribe'}
+    assert {message['m'] for message in messages} == {'marketdata'}
+    assert [pair for message in messages for pair in message['v']] == [[1, token] for token in range(250)]
+
+
+def test_delta_only_sends_changes():
+    subscriptions = SubscriptionManager(chunk_size=100)
+    subscriptions.add('marketdata', entries(range(10)))
+    subscriptions.delta()
+    assert subscriptions.delta() == []
+    subscriptions.add('marketdata', entries(range(5, 15)))
+    subscriptions.remove('marketdata', [(1, 0), (1, 1), (1, 99)])
+    messages = decoded(subscriptions.delta())
+    # unsubscriptions go first, in no particular order
+    messages[0]['v'].sort()
+    assert messages == [{'a': 'unsubscribe', 'v': [[1, 0], [1, 1]], 'm': 'marketdata'},
+                        {'a': 'subscribe', 'v': [[1, token] for token in range(10, 15)],
+                         'm': 'marketdata'}]
+
+
+def test_add_and_remove_before_sending_cancel_out():
+    subscriptions = SubscriptionManager()
+    subscriptions.add('marketdata', entries([1, 2]))
+    subscriptions.remove('marketdata', [(1, 1), (1, 2)])
+    assert subscriptions.delta() == []
+
+
+def test_reset_resends_everything():
+    subscriptions = SubscriptionManager(chunk_size=3)
+    subscriptions.add('marketdata', entries(range(4)))
+    subscriptions.add('snapquote', entries(range(2), exchange=2))
+    first = decoded(subscriptions.delta())
+    subscriptions.reset()
+    again = decoded(subscriptions.delta())
+    key = lambda message: (message['m'], message['v'])
+    assert sorted(again, key=key) == sorted(first, key=key)
+    assert len(again) == 3
+
+
+def test_switch_moves_tokens_between_modes():
+    subscriptions = SubscriptionManager()
+    subscriptions.add('marketdata', entries([1, 2]))
+    subscriptions.delta()
+    subscriptions.switch('compact_marketdata', entries([1]))
+    assert subscriptions.desired() == {'marketdata': entries([2]),
+                                       'compact_marketdata': entries([1])}
+    messages = decoded(subscriptions.delta())
+    assert messages == [{'a': 'unsubscribe', 'v': [[1, 1]], 'm': 'marketdata'},
+                        {'a': 'subscribe', 'v': [[1, 1]], 'm': 'compact_marketdata'}]
+    assert len(subscriptions) == 2
+
+
+def test_chunk_size_must_be_positive():
+    with pytest.raises(ValueError):
+        SubscriptionManager(chunk_size=0)
+
+
+def test_remove_returns_tokens_left_without_subscription():
+    manager = SubscriptionManager()
+    manager.add('marketdata', entries([1, 2, 3]))
+    manager.add('snapquote', entries([3]))
+    assert manager.remove('marketdata', [(1, 1), (1, 3), (1, 9)]) == [(1, 1), (1, 9)]
+    assert manager.remove('snapquote', [(1, 3)]) == [(1, 3)]